@@ -0,0 +1,322 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Interface used by provider and requirer of the 5G AMF.
+
+The provider writes a single versioned JSON document in its application databag, under
+the `fiveg_amf` key, listing one or more AMFs:
+
+    {"version": 1, "amfs": [{"ipv4_address": "1.2.3.4", "fqdn": "amf.example.com",
+     "port": 80, "api_version": "v1"}]}
+
+Each unit of an AMF set may also advertise its own endpoint, with the same document in
+its unit databag. The requirer gathers the AMFs of the application and of every unit,
+without duplicates, parses the documents once per change and validates them against
+`SCHEMA`. Data written by v0 providers, one databag key per field, is read as a single
+AMF.
+"""
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ops.charm import CharmBase, CharmEvents, RelationBrokenEvent, RelationChangedEvent
+from ops.framework import EventBase, EventSource, Handle, Object
+from ops.model import Relation
+
+# The unique Charmhub library identifier, never change it
+LIBID = "ff1717f64ab7465e8a725ec1cd6f5095"
+
+# Increment this major API version when introducing breaking changes
+LIBAPI = 1
+
+# Increment this PATCH version before using `charmcraft publish-lib` or reset
+# to 0 if you are raising the major API version
+LIBPATCH = 3
+
+
+logger = logging.getLogger(__name__)
+
+DATA_KEY = "fiveg_amf"
+DATA_VERSION = 1
+SCHEMA = {
+    "type": "object",
+    "required": ["version", "amfs"],
+    "properties": {
+        "version": {"type": "integer", "const": DATA_VERSION},
+        "amfs": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["ipv4_address", "fqdn", "port", "api_version"],
+                "properties": {
+                    "ipv4_address": {"type": "string", "minLength": 1},
+                    "fqdn": {"type": "string", "minLength": 1},
+                    "port": {"type": "integer"},
+                    "api_version": {"type": "string", "minLength": 1},
+                },
+            },
+        },
+    },
+}
+V0_KEYS = ("amf_ipv4_address", "amf_fqdn", "amf_port", "amf_api_version")
+
+
+class DataValidationError(Exception):
+    """Raised when relation data does not match `SCHEMA`."""
+
+
+@dataclass(frozen=True)
+class AMFInformation:
+    """Endpoint of an AMF."""
+
+    ipv4_address: str
+    fqdn: str
+    port: int
+    api_version: str
+
+
+def validate(instance: object, schema: dict, path: str = "$") -> None:
+    """Validates an instance against the subset of JSON Schema used by `SCHEMA`.
+
+    Args:
+        instance: Decoded JSON document
+        schema: Schema with type, const, minLength, minItems, required, properties
+            and items keywords
+        path: Path of the instance in the document, for error messages
+
+    Raises:
+        DataValidationError: If the instance does not match the schema
+    """
+    types = {"object": dict, "array": list, "string": str, "integer": int}
+    expected_type = types[schema["type"]]
+    if not isinstance(instance, expected_type) or isinstance(instance, bool):
+        raise DataValidationError(f"{path} must be of type {schema['type']}")
+    if "const" in schema and instance != schema["const"]:
+        raise DataValidationError(f"{path} must be {schema['const']!r}")
+    minimum_length = schema.get("minLength", schema.get("minItems"))
+    if minimum_length is not None and len(instance) < minimum_length:  # type: ignore
+        raise DataValidationError(f"{path} is too short")
+    for key in schema.get("required", []):
+        if key not in instance:  # type: ignore[operator]
+            raise DataValidationError(f"{path} is missing {key}")
+    for key, property_schema in schema.get("properties", {}).items():
+        if key in instance:  # type: ignore[operator]
+            validate(instance[key], property_schema, f"{path}.{key}")  # type: ignore[index]
+    for index, item in enumerate(instance if "items" in schema else []):  # type: ignore
+        validate(item, schema["items"], f"{path}[{index}]")
+
+
+def parse(data: Dict[str, str]) -> List[AMFInformation]:
+    """Parses the AMFs of an application databag, in the v1 or v0 format.
+
+    Args:
+        data: Application databag of the provider
+
+    Returns:
+        list: AMFs, empty when the provider did not publish them yet
+
+    Raises:
+        DataValidationError: If the data is malformed
+    """
+    if DATA_KEY in data:
+        try:
+            document = json.loads(data[DATA_KEY])
+        except json.JSONDecodeError as e:
+            raise DataValidationError(f"{DATA_KEY} is not valid JSON: {e.msg}")
+        validate(document, SCHEMA)
+        return [AMFInformation(**amf) for amf in document["amfs"]]
+    if not all(data.get(key) for key in V0_KEYS):
+        return []
+    if not data["amf_port"].isdigit():
+        raise DataValidationError("amf_port must be an integer")
+    return [
+        AMFInformation(
+            ipv4_address=data["amf_ipv4_address"],
+            fqdn=data["amf_fqdn"],
+            port=int(data["amf_port"]),
+            api_version=data["amf_api_version"],
+        )
+    ]
+
+
+class AMFAvailableEvent(EventBase):
+    """Charm event emitted when AMFs are available."""
+
+    def __init__(self, handle: Handle, amfs: List[dict]):
+        """Init."""
+        super().__init__(handle)
+        self.amfs = [AMFInformation(**amf) for amf in amfs]
+
+    def snapshot(self) -> dict:
+        """Returns snapshot."""
+        return {"amfs": [asdict(amf) for amf in self.amfs]}
+
+    def restore(self, snapshot: dict) -> None:
+        """Restores snapshot."""
+        self.amfs = [AMFInformation(**amf) for amf in snapshot["amfs"]]
+
+
+class FiveGAMFRequirerCharmEvents(CharmEvents):
+    """List of events that the 5G AMF requirer charm can leverage."""
+
+    amf_available = EventSource(AMFAvailableEvent)
+
+
+class FiveGAMFRequires(Object):
+    """Class to be instantiated by the charm requiring the 5G AMF Interface."""
+
+    on = FiveGAMFRequirerCharmEvents()
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.charm = charm
+        self.relationship_name = relationship_name
+        self._parsed: Dict[int, Tuple[Dict[str, str], List[str], List[AMFInformation]]] = {}
+        self._broken_relation_id: Optional[int] = None
+        self.framework.observe(
+            charm.on[relationship_name].relation_changed, self._on_relation_changed
+        )
+        self.framework.observe(
+            charm.on[relationship_name].relation_broken, self._on_relation_broken
+        )
+
+    def _on_relation_changed(self, event: RelationChangedEvent) -> None:
+        """Handler triggered on relation changed event.
+
+        Args:
+            event: Juju event (RelationChangedEvent)
+
+        Returns:
+            None
+        """
+        amfs = self._relation_amfs(event.relation)
+        if not amfs:
+            logger.info("No valid AMF in relation data - Not triggering amf_available event")
+            return
+        self.on.amf_available.emit(amfs=[asdict(amf) for amf in amfs])
+
+    def _on_relation_broken(self, event: RelationBrokenEvent) -> None:
+        """Leaves the broken relation out, as ops lists it until the end of its hook.
+
+        Args:
+            event: Juju event (RelationBrokenEvent)
+
+        Returns:
+            None
+        """
+        self._broken_relation_id = event.relation.id
+
+    @property
+    def relations(self) -> List[Relation]:
+        """Returns the relations of the endpoint, without the one being broken."""
+        return [
+            relation
+            for relation in self.model.relations[self.relationship_name]
+            if relation.id != self._broken_relation_id
+        ]
+
+    @property
+    def amfs(self) -> List[AMFInformation]:
+        """Returns the valid AMFs of every related application and unit, without duplicates."""
+        return list(
+            dict.fromkeys(
+                amf for relation in self.relations for amf in self._relation_amfs(relation)
+            )
+        )
+
+    @property
+    def amf(self) -> Optional[AMFInformation]:
+        """Returns the first AMF, None when no AMF is available."""
+        return next(iter(self.amfs), None)
+
+    def _relation_amfs(self, relation: Relation) -> List[AMFInformation]:
+        """Returns the AMFs of a relation, parsed once per change of its data."""
+        if not relation.app:
+            return []
+        data = {key: relation.data[relation.app].get(key, "") for key in (DATA_KEY, *V0_KEYS)}
+        data = {key: value for key, value in data.items() if value}
+        units = sorted(relation.units, key=lambda unit: unit.name)
+        unit_documents = [relation.data[unit].get(DATA_KEY, "") for unit in units]
+        cached = self._parsed.get(relation.id)
+        if cached and cached[0] == data and cached[1] == unit_documents:
+            return cached[2]
+        amfs = self._parse(data, relation.app.name)
+        for unit, document in zip(units, unit_documents):
+            if document:
+                amfs.extend(self._parse({DATA_KEY: document}, unit.name))
+        self._parsed[relation.id] = (data, unit_documents, amfs)
+        return amfs
+
+    @staticmethod
+    def _parse(data: Dict[str, str], source: str) -> List[AMFInformation]:
+        """Returns the AMFs of a databag, none when its data is invalid."""
+        try:
+            return parse(data)
+        except DataValidationError as e:
+            logger.warning("Invalid AMF data from %s: %s", source, e)
+            return []
+
+
+class FiveGAMFProvides(Object):
+    """Class to be instantiated by the AMF charm providing the 5G AMF Interface."""
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.relationship_name = relationship_name
+        self.charm = charm
+
+    def set_amf_information(
+        self, amfs: List[AMFInformation], relation_id: int, write_v0: bool = True
+    ) -> None:
+        """Sets AMF information in relation data.
+
+        Args:
+            amfs: AMFs
+            relation_id: Relation ID
+            write_v0: Also write the first AMF in the v0 format, for requirers still
+                using v0 of this library. When False, the v0 keys are removed, which
+                only suits relations without v0 requirers left
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
+        if not relation:
+            raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
+        document = {"version": DATA_VERSION, "amfs": [asdict(amf) for amf in amfs]}
+        validate(document, SCHEMA)
+        data = {DATA_KEY: json.dumps(document, separators=(",", ":"))}
+        if write_v0:
+            data.update(
+                {
+                    "amf_ipv4_address": amfs[0].ipv4_address,
+                    "amf_fqdn": amfs[0].fqdn,
+                    "amf_port": str(amfs[0].port),
+                    "amf_api_version": amfs[0].api_version,
+                }
+            )
+        else:
+            data.update({key: "" for key in V0_KEYS})
+        relation.data[self.charm.app].update(data)
+
+    def set_unit_amf_information(self, amf: AMFInformation, relation_id: int) -> None:
+        """Sets the AMF of this unit in its unit relation data, for AMF sets.
+
+        Args:
+            amf: AMF served by this unit
+            relation_id: Relation ID
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
+        if not relation:
+            raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
+        document = {"version": DATA_VERSION, "amfs": [asdict(amf)]}
+        validate(document, SCHEMA)
+        relation.data[self.charm.unit][DATA_KEY] = json.dumps(document, separators=(",", ":"))
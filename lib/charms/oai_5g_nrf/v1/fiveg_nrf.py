@@ -0,0 +1,288 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Interface used by provider and requirer of the 5G NRF.
+
+The provider writes a single versioned JSON document in its application databag, under
+the `fiveg_nrf` key, listing one or more NRFs:
+
+    {"version": 1, "nrfs": [{"ipv4_address": "1.2.3.4", "fqdn": "nrf.example.com",
+     "port": 80, "api_version": "v1"}]}
+
+The requirer parses the document once per change and validates it against `SCHEMA`.
+Data written by v0 providers, one databag key per field, is read as a single NRF.
+"""
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ops.charm import CharmBase, CharmEvents, RelationBrokenEvent, RelationChangedEvent
+from ops.framework import EventBase, EventSource, Handle, Object
+from ops.model import Relation
+
+# The unique Charmhub library identifier, never change it
+LIBID = "491530841b444e289ba34d2e948e5669"
+
+# Increment this major API version when introducing breaking changes
+LIBAPI = 1
+
+# Increment this PATCH version before using `charmcraft publish-lib` or reset
+# to 0 if you are raising the major API version
+LIBPATCH = 2
+
+
+logger = logging.getLogger(__name__)
+
+DATA_KEY = "fiveg_nrf"
+DATA_VERSION = 1
+SCHEMA = {
+    "type": "object",
+    "required": ["version", "nrfs"],
+    "properties": {
+        "version": {"type": "integer", "const": DATA_VERSION},
+        "nrfs": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["ipv4_address", "fqdn", "port", "api_version"],
+                "properties": {
+                    "ipv4_address": {"type": "string", "minLength": 1},
+                    "fqdn": {"type": "string", "minLength": 1},
+                    "port": {"type": "integer"},
+                    "api_version": {"type": "string", "minLength": 1},
+                },
+            },
+        },
+    },
+}
+V0_KEYS = ("nrf_ipv4_address", "nrf_fqdn", "nrf_port", "nrf_api_version")
+
+
+class DataValidationError(Exception):
+    """Raised when relation data does not match `SCHEMA`."""
+
+
+@dataclass(frozen=True)
+class NRFInformation:
+    """Endpoint of an NRF."""
+
+    ipv4_address: str
+    fqdn: str
+    port: int
+    api_version: str
+
+
+def validate(instance: object, schema: dict, path: str = "$") -> None:
+    """Validates an instance against the subset of JSON Schema used by `SCHEMA`.
+
+    Args:
+        instance: Decoded JSON document
+        schema: Schema with type, const, minLength, minItems, required, properties
+            and items keywords
+        path: Path of the instance in the document, for error messages
+
+    Raises:
+        DataValidationError: If the instance does not match the schema
+    """
+    types = {"object": dict, "array": list, "string": str, "integer": int}
+    expected_type = types[schema["type"]]
+    if not isinstance(instance, expected_type) or isinstance(instance, bool):
+        raise DataValidationError(f"{path} must be of type {schema['type']}")
+    if "const" in schema and instance != schema["const"]:
+        raise DataValidationError(f"{path} must be {schema['const']!r}")
+    minimum_length = schema.get("minLength", schema.get("minItems"))
+    if minimum_length is not None and len(instance) < minimum_length:  # type: ignore
+        raise DataValidationError(f"{path} is too short")
+    for key in schema.get("required", []):
+        if key not in instance:  # type: ignore[operator]
+            raise DataValidationError(f"{path} is missing {key}")
+    for key, property_schema in schema.get("properties", {}).items():
+        if key in instance:  # type: ignore[operator]
+            validate(instance[key], property_schema, f"{path}.{key}")  # type: ignore[index]
+    for index, item in enumerate(instance if "items" in schema else []):  # type: ignore
+        validate(item, schema["items"], f"{path}[{index}]")
+
+
+def parse(data: Dict[str, str]) -> List[NRFInformation]:
+    """Parses the NRFs of an application databag, in the v1 or v0 format.
+
+    Args:
+        data: Application databag of the provider
+
+    Returns:
+        list: NRFs, empty when the provider did not publish them yet
+
+    Raises:
+        DataValidationError: If the data is malformed
+    """
+    if DATA_KEY in data:
+        try:
+            document = json.loads(data[DATA_KEY])
+        except json.JSONDecodeError as e:
+            raise DataValidationError(f"{DATA_KEY} is not valid JSON: {e.msg}")
+        validate(document, SCHEMA)
+        return [NRFInformation(**nrf) for nrf in document["nrfs"]]
+    if not all(data.get(key) for key in V0_KEYS):
+        return []
+    if not data["nrf_port"].isdigit():
+        raise DataValidationError("nrf_port must be an integer")
+    return [
+        NRFInformation(
+            ipv4_address=data["nrf_ipv4_address"],
+            fqdn=data["nrf_fqdn"],
+            port=int(data["nrf_port"]),
+            api_version=data["nrf_api_version"],
+        )
+    ]
+
+
+class NRFAvailableEvent(EventBase):
+    """Charm event emitted when NRFs are available."""
+
+    def __init__(self, handle: Handle, nrfs: List[dict]):
+        """Init."""
+        super().__init__(handle)
+        self.nrfs = [NRFInformation(**nrf) for nrf in nrfs]
+
+    def snapshot(self) -> dict:
+        """Returns snapshot."""
+        return {"nrfs": [asdict(nrf) for nrf in self.nrfs]}
+
+    def restore(self, snapshot: dict) -> None:
+        """Restores snapshot."""
+        self.nrfs = [NRFInformation(**nrf) for nrf in snapshot["nrfs"]]
+
+
+class FiveGNRFRequirerCharmEvents(CharmEvents):
+    """List of events that the 5G NRF requirer charm can leverage."""
+
+    nrf_available = EventSource(NRFAvailableEvent)
+
+
+class FiveGNRFRequires(Object):
+    """Class to be instantiated by the charm requiring the 5G NRF Interface."""
+
+    on = FiveGNRFRequirerCharmEvents()
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.charm = charm
+        self.relationship_name = relationship_name
+        self._parsed: Dict[int, Tuple[Dict[str, str], List[NRFInformation]]] = {}
+        self._broken_relation_id: Optional[int] = None
+        self.framework.observe(
+            charm.on[relationship_name].relation_changed, self._on_relation_changed
+        )
+        self.framework.observe(
+            charm.on[relationship_name].relation_broken, self._on_relation_broken
+        )
+
+    def _on_relation_changed(self, event: RelationChangedEvent) -> None:
+        """Handler triggered on relation changed event.
+
+        Args:
+            event: Juju event (RelationChangedEvent)
+
+        Returns:
+            None
+        """
+        nrfs = self._relation_nrfs(event.relation)
+        if not nrfs:
+            logger.info("No valid NRF in relation data - Not triggering nrf_available event")
+            return
+        self.on.nrf_available.emit(nrfs=[asdict(nrf) for nrf in nrfs])
+
+    def _on_relation_broken(self, event: RelationBrokenEvent) -> None:
+        """Leaves the broken relation out, as ops lists it until the end of its hook.
+
+        Args:
+            event: Juju event (RelationBrokenEvent)
+
+        Returns:
+            None
+        """
+        self._broken_relation_id = event.relation.id
+
+    @property
+    def relations(self) -> List[Relation]:
+        """Returns the relations of the endpoint, without the one being broken."""
+        return [
+            relation
+            for relation in self.model.relations[self.relationship_name]
+            if relation.id != self._broken_relation_id
+        ]
+
+    @property
+    def nrfs(self) -> List[NRFInformation]:
+        """Returns the valid NRFs of every related application."""
+        return [nrf for relation in self.relations for nrf in self._relation_nrfs(relation)]
+
+    @property
+    def nrf(self) -> Optional[NRFInformation]:
+        """Returns the first NRF, None when no NRF is available."""
+        return next(iter(self.nrfs), None)
+
+    def _relation_nrfs(self, relation: Relation) -> List[NRFInformation]:
+        """Returns the NRFs of a relation, parsed once per change of its data."""
+        if not relation.app:
+            return []
+        data = {key: relation.data[relation.app].get(key, "") for key in (DATA_KEY, *V0_KEYS)}
+        data = {key: value for key, value in data.items() if value}
+        cached = self._parsed.get(relation.id)
+        if cached and cached[0] == data:
+            return cached[1]
+        try:
+            nrfs = parse(data)
+        except DataValidationError as e:
+            logger.warning("Invalid NRF data from %s: %s", relation.app.name, e)
+            nrfs = []
+        self._parsed[relation.id] = (data, nrfs)
+        return nrfs
+
+
+class FiveGNRFProvides(Object):
+    """Class to be instantiated by the NRF charm providing the 5G NRF Interface."""
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.relationship_name = relationship_name
+        self.charm = charm
+
+    def set_nrf_information(
+        self, nrfs: List[NRFInformation], relation_id: int, write_v0: bool = True
+    ) -> None:
+        """Sets NRF information in relation data.
+
+        Args:
+            nrfs: NRFs
+            relation_id: Relation ID
+            write_v0: Also write the first NRF in the v0 format, for requirers still
+                using v0 of this library. When False, the v0 keys are removed, which
+                only suits relations without v0 requirers left
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
+        if not relation:
+            raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
+        document = {"version": DATA_VERSION, "nrfs": [asdict(nrf) for nrf in nrfs]}
+        validate(document, SCHEMA)
+        data = {DATA_KEY: json.dumps(document, separators=(",", ":"))}
+        if write_v0:
+            data.update(
+                {
+                    "nrf_ipv4_address": nrfs[0].ipv4_address,
+                    "nrf_fqdn": nrfs[0].fqdn,
+                    "nrf_port": str(nrfs[0].port),
+                    "nrf_api_version": nrfs[0].api_version,
+                }
+            )
+        else:
+            data.update({key: "" for key in V0_KEYS})
+        relation.data[self.charm.app].update(data)
@@ -0,0 +1,278 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Interface used by provider and requirer of the 5G UPF.
+
+The provider writes a single versioned JSON document in its application databag, under
+the `fiveg_upf` key, listing one or more UPFs:
+
+    {"version": 1, "upfs": [{"ipv4_address": "1.2.3.4", "fqdn": "upf-0.example.com"},
+     {"ipv4_address": "1.2.3.5", "fqdn": "upf-1.example.com"}]}
+
+The requirer parses the document once per change and validates it against `SCHEMA`.
+Data written by v0 providers, one databag key per field, is read as a single UPF.
+"""
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ops.charm import CharmBase, CharmEvents, RelationBrokenEvent, RelationChangedEvent
+from ops.framework import EventBase, EventSource, Handle, Object
+from ops.model import Relation
+
+# The unique Charmhub library identifier, never change it
+LIBID = "ed9606f2aaa64099937b7f57add2c42d"
+
+# Increment this major API version when introducing breaking changes
+LIBAPI = 1
+
+# Increment this PATCH version before using `charmcraft publish-lib` or reset
+# to 0 if you are raising the major API version
+LIBPATCH = 2
+
+
+logger = logging.getLogger(__name__)
+
+DATA_KEY = "fiveg_upf"
+DATA_VERSION = 1
+SCHEMA = {
+    "type": "object",
+    "required": ["version", "upfs"],
+    "properties": {
+        "version": {"type": "integer", "const": DATA_VERSION},
+        "upfs": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["ipv4_address", "fqdn"],
+                "properties": {
+                    "ipv4_address": {"type": "string", "minLength": 1},
+                    "fqdn": {"type": "string", "minLength": 1},
+                },
+            },
+        },
+    },
+}
+V0_KEYS = ("upf_ipv4_address", "upf_fqdn")
+
+
+class DataValidationError(Exception):
+    """Raised when relation data does not match `SCHEMA`."""
+
+
+@dataclass(frozen=True)
+class UPFInformation:
+    """Endpoint of an UPF."""
+
+    ipv4_address: str
+    fqdn: str
+
+
+def validate(instance: object, schema: dict, path: str = "$") -> None:
+    """Validates an instance against the subset of JSON Schema used by `SCHEMA`.
+
+    Args:
+        instance: Decoded JSON document
+        schema: Schema with type, const, minLength, minItems, required, properties
+            and items keywords
+        path: Path of the instance in the document, for error messages
+
+    Raises:
+        DataValidationError: If the instance does not match the schema
+    """
+    types = {"object": dict, "array": list, "string": str, "integer": int}
+    expected_type = types[schema["type"]]
+    if not isinstance(instance, expected_type) or isinstance(instance, bool):
+        raise DataValidationError(f"{path} must be of type {schema['type']}")
+    if "const" in schema and instance != schema["const"]:
+        raise DataValidationError(f"{path} must be {schema['const']!r}")
+    minimum_length = schema.get("minLength", schema.get("minItems"))
+    if minimum_length is not None and len(instance) < minimum_length:  # type: ignore
+        raise DataValidationError(f"{path} is too short")
+    for key in schema.get("required", []):
+        if key not in instance:  # type: ignore[operator]
+            raise DataValidationError(f"{path} is missing {key}")
+    for key, property_schema in schema.get("properties", {}).items():
+        if key in instance:  # type: ignore[operator]
+            validate(instance[key], property_schema, f"{path}.{key}")  # type: ignore[index]
+    for index, item in enumerate(instance if "items" in schema else []):  # type: ignore
+        validate(item, schema["items"], f"{path}[{index}]")
+
+
+def parse(data: Dict[str, str]) -> List[UPFInformation]:
+    """Parses the UPFs of an application databag, in the v1 or v0 format.
+
+    Args:
+        data: Application databag of the provider
+
+    Returns:
+        list: UPFs, empty when the provider did not publish them yet
+
+    Raises:
+        DataValidationError: If the data is malformed
+    """
+    if DATA_KEY in data:
+        try:
+            document = json.loads(data[DATA_KEY])
+        except json.JSONDecodeError as e:
+            raise DataValidationError(f"{DATA_KEY} is not valid JSON: {e.msg}")
+        validate(document, SCHEMA)
+        return [UPFInformation(**upf) for upf in document["upfs"]]
+    if not all(data.get(key) for key in V0_KEYS):
+        return []
+    return [
+        UPFInformation(
+            ipv4_address=data["upf_ipv4_address"],
+            fqdn=data["upf_fqdn"],
+        )
+    ]
+
+
+class UPFAvailableEvent(EventBase):
+    """Charm event emitted when UPFs are available."""
+
+    def __init__(self, handle: Handle, upfs: List[dict]):
+        """Init."""
+        super().__init__(handle)
+        self.upfs = [UPFInformation(**upf) for upf in upfs]
+
+    def snapshot(self) -> dict:
+        """Returns snapshot."""
+        return {"upfs": [asdict(upf) for upf in self.upfs]}
+
+    def restore(self, snapshot: dict) -> None:
+        """Restores snapshot."""
+        self.upfs = [UPFInformation(**upf) for upf in snapshot["upfs"]]
+
+
+class FiveGUPFRequirerCharmEvents(CharmEvents):
+    """List of events that the 5G UPF requirer charm can leverage."""
+
+    upf_available = EventSource(UPFAvailableEvent)
+
+
+class FiveGUPFRequires(Object):
+    """Class to be instantiated by the charm requiring the 5G UPF Interface."""
+
+    on = FiveGUPFRequirerCharmEvents()
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.charm = charm
+        self.relationship_name = relationship_name
+        self._parsed: Dict[int, Tuple[Dict[str, str], List[UPFInformation]]] = {}
+        self._broken_relation_id: Optional[int] = None
+        self.framework.observe(
+            charm.on[relationship_name].relation_changed, self._on_relation_changed
+        )
+        self.framework.observe(
+            charm.on[relationship_name].relation_broken, self._on_relation_broken
+        )
+
+    def _on_relation_changed(self, event: RelationChangedEvent) -> None:
+        """Handler triggered on relation changed event.
+
+        Args:
+            event: Juju event (RelationChangedEvent)
+
+        Returns:
+            None
+        """
+        upfs = self._relation_upfs(event.relation)
+        if not upfs:
+            logger.info("No valid UPF in relation data - Not triggering upf_available event")
+            return
+        self.on.upf_available.emit(upfs=[asdict(upf) for upf in upfs])
+
+    def _on_relation_broken(self, event: RelationBrokenEvent) -> None:
+        """Leaves the broken relation out, as ops lists it until the end of its hook.
+
+        Args:
+            event: Juju event (RelationBrokenEvent)
+
+        Returns:
+            None
+        """
+        self._broken_relation_id = event.relation.id
+
+    @property
+    def relations(self) -> List[Relation]:
+        """Returns the relations of the endpoint, without the one being broken."""
+        return [
+            relation
+            for relation in self.model.relations[self.relationship_name]
+            if relation.id != self._broken_relation_id
+        ]
+
+    @property
+    def upfs(self) -> List[UPFInformation]:
+        """Returns the valid UPFs of every related application."""
+        return [upf for relation in self.relations for upf in self._relation_upfs(relation)]
+
+    @property
+    def upf(self) -> Optional[UPFInformation]:
+        """Returns the first UPF, None when no UPF is available."""
+        return next(iter(self.upfs), None)
+
+    def _relation_upfs(self, relation: Relation) -> List[UPFInformation]:
+        """Returns the UPFs of a relation, parsed once per change of its data."""
+        if not relation.app:
+            return []
+        data = {key: relation.data[relation.app].get(key, "") for key in (DATA_KEY, *V0_KEYS)}
+        data = {key: value for key, value in data.items() if value}
+        cached = self._parsed.get(relation.id)
+        if cached and cached[0] == data:
+            return cached[1]
+        try:
+            upfs = parse(data)
+        except DataValidationError as e:
+            logger.warning("Invalid UPF data from %s: %s", relation.app.name, e)
+            upfs = []
+        self._parsed[relation.id] = (data, upfs)
+        return upfs
+
+
+class FiveGUPFProvides(Object):
+    """Class to be instantiated by the UPF charm providing the 5G UPF Interface."""
+
+    def __init__(self, charm: CharmBase, relationship_name: str):
+        """Init."""
+        super().__init__(charm, relationship_name)
+        self.relationship_name = relationship_name
+        self.charm = charm
+
+    def set_upf_information(
+        self, upfs: List[UPFInformation], relation_id: int, write_v0: bool = True
+    ) -> None:
+        """Sets UPF information in relation data.
+
+        Args:
+            upfs: UPFs
+            relation_id: Relation ID
+            write_v0: Also write the first UPF in the v0 format, for requirers still
+                using v0 of this library. When False, the v0 keys are removed, which
+                only suits relations without v0 requirers left
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(self.relationship_name, relation_id=relation_id)
+        if not relation:
+            raise RuntimeError(f"Relation {self.relationship_name} not created yet.")
+        document = {"version": DATA_VERSION, "upfs": [asdict(upf) for upf in upfs]}
+        validate(document, SCHEMA)
+        data = {DATA_KEY: json.dumps(document, separators=(",", ":"))}
+        if write_v0:
+            data.update(
+                {
+                    "upf_ipv4_address": upfs[0].ipv4_address,
+                    "upf_fqdn": upfs[0].fqdn,
+                }
+            )
+        else:
+            data.update({key: "" for key in V0_KEYS})
+        relation.data[self.charm.app].update(data)
@@ -0,0 +1,187 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""UE address pool capacity of the DNNs.
+
+The SMF hands out one IPv4 address of the DNN range per IPv4 PDU session, except the
+X.Y.Z.1 addresses which are reserved for the GTP device of the UPF. IPv6 PDU sessions are
+each delegated a /64 of the DNN prefix (3GPP TS 23.501, 5.8.2.2.3). IPv4v6 sessions need
+both.
+"""
+
+import ipaddress
+import itertools
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+IPV6_DELEGATED_PREFIX_LENGTH = 64
+
+
+@dataclass
+class DNNPool:
+    """Address pools of a DNN."""
+
+    name: str
+    sst: str
+    sd: str
+    pdu_session_type: str
+    ipv4_range: str
+    ipv6_prefix: str
+
+    @property
+    def ipv4_capacity(self) -> int:
+        """Returns the number of IPv4 addresses the range can hand out."""
+        return ipv4_range_capacity(self.ipv4_range)
+
+    @property
+    def ipv6_capacity(self) -> int:
+        """Returns the number of /64 prefixes the IPv6 prefix can delegate."""
+        return ipv6_prefix_capacity(self.ipv6_prefix)
+
+    @property
+    def session_capacity(self) -> int:
+        """Returns the number of concurrent PDU sessions the pools can hold."""
+        if self.pdu_session_type == "IPv4":
+            return self.ipv4_capacity
+        if self.pdu_session_type == "IPv6":
+            return self.ipv6_capacity
+        return min(self.ipv4_capacity, self.ipv6_capacity)
+
+
+def parse_ipv4_range(ipv4_range: str) -> Tuple[ipaddress.IPv4Address, ipaddress.IPv4Address]:
+    """Parses an IPv4 range like "12.1.1.2 - 12.1.1.40".
+
+    Args:
+        ipv4_range: First and last address, separated by a hyphen
+
+    Returns:
+        tuple: First and last address
+
+    Raises:
+        ValueError: If the range is malformed or reversed
+    """
+    first, separator, last = ipv4_range.partition("-")
+    if not separator:
+        raise ValueError(f"expected first - last, got {ipv4_range!r}")
+    first_address = ipaddress.IPv4Address(first.strip())
+    last_address = ipaddress.IPv4Address(last.strip())
+    if last_address < first_address:
+        raise ValueError(f"reversed IPv4 range {ipv4_range!r}")
+    return first_address, last_address
+
+
+def ipv4_range_capacity(ipv4_range: str) -> int:
+    """Returns the number of addresses of an IPv4 range, without the reserved X.Y.Z.1.
+
+    Args:
+        ipv4_range: First and last address, separated by a hyphen
+
+    Returns:
+        int: Number of assignable addresses
+
+    Raises:
+        ValueError: If the range is malformed or reversed
+    """
+    first, last = parse_ipv4_range(ipv4_range)
+    first_value, last_value = int(first), int(last)
+    reserved = _count_congruent(first_value, last_value, modulus=256, remainder=1)
+    return last_value - first_value + 1 - reserved
+
+
+def ipv6_prefix_capacity(ipv6_prefix: str) -> int:
+    """Returns the number of /64 prefixes an IPv6 prefix can delegate.
+
+    Args:
+        ipv6_prefix: IPv6 prefix, e.g. 2001:1:2::/48
+
+    Returns:
+        int: Number of /64 prefixes, 0 for prefixes longer than /64
+
+    Raises:
+        ValueError: If the prefix is malformed
+    """
+    network = ipaddress.IPv6Network(ipv6_prefix.strip(), strict=False)
+    if network.prefixlen > IPV6_DELEGATED_PREFIX_LENGTH:
+        return 0
+    return 2 ** (IPV6_DELEGATED_PREFIX_LENGTH - network.prefixlen)
+
+
+def overlapping_ipv4_ranges(pools: Iterable[DNNPool]) -> List[Tuple[str, str]]:
+    """Returns the pairs of DNNs whose IPv4 ranges overlap.
+
+    Args:
+        pools: DNN pools with valid IPv4 ranges
+
+    Returns:
+        list: Names of the DNNs of each overlapping pair
+    """
+    ranges = [(pool.name, parse_ipv4_range(pool.ipv4_range)) for pool in pools]
+    return [
+        (name, other_name)
+        for (name, (first, last)), (other_name, (other_first, other_last)) in (
+            itertools.combinations(ranges, 2)
+        )
+        if first <= other_last and other_first <= last
+    ]
+
+
+def slice_capacities(pools: Iterable[DNNPool]) -> Dict[Tuple[str, str], int]:
+    """Returns the session capacity of each slice, summed over its DNNs.
+
+    Args:
+        pools: DNN pools
+
+    Returns:
+        dict: Session capacity by (SST, SD)
+    """
+    capacities: Dict[Tuple[str, str], int] = {}
+    for pool in pools:
+        key = (pool.sst, pool.sd)
+        capacities[key] = capacities.get(key, 0) + pool.session_capacity
+    return capacities
+
+
+def hours_to_exhaustion(capacity: int, sessions: int, growth_per_hour: float) -> Optional[float]:
+    """Returns the hours left before a pool is exhausted at a constant session growth.
+
+    Args:
+        capacity: Session capacity of the pool
+        sessions: Current number of sessions
+        growth_per_hour: Sessions added per hour
+
+    Returns:
+        float: Hours left, 0 when exhausted, None when the sessions do not grow
+    """
+    if sessions >= capacity:
+        return 0.0
+    if growth_per_hour <= 0:
+        return None
+    return (capacity - sessions) / growth_per_hour
+
+
+def parse_session_counts(value: str) -> Dict[str, int]:
+    """Parses comma-separated dnn=count session counts.
+
+    Args:
+        value: Session counts, e.g. "internet=120,ims=4"
+
+    Returns:
+        dict: Number of sessions by DNN
+
+    Raises:
+        ValueError: If a count is not a dnn=count pair with a non-negative integer count
+    """
+    counts = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        dnn, _, count = entry.partition("=")
+        if not dnn.strip() or not count.strip().isdigit():
+            raise ValueError(f"expected dnn=count, got {entry.strip()!r}")
+        counts[dnn.strip()] = int(count)
+    return counts
+
+
+def _count_congruent(first: int, last: int, modulus: int, remainder: int) -> int:
+    """Returns how many integers of [first, last] are congruent to remainder modulo modulus."""
+    return (last - remainder) // modulus - (first - 1 - remainder) // modulus
@@ -4,117 +4,1979 @@
 
 """Charmed Operator for the OpenAirInterface 5G Core SMF component."""
 
-
+import datetime
+import difflib
+import hashlib
+import json
 import logging
+import os
+import re
+import shlex
+import socket
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    cast,
+)
 
-from charms.oai_5g_amf.v0.fiveg_amf import FiveGAMFRequires  # type: ignore[import]
-from charms.oai_5g_nrf.v0.fiveg_nrf import FiveGNRFRequires  # type: ignore[import]
-from charms.oai_5g_udm.v0.oai_5g_udm import FiveGUDMRequires  # type: ignore[import]
-from charms.oai_5g_upf.v0.fiveg_upf import FiveGUPFRequires  # type: ignore[import]
-from charms.observability_libs.v1.kubernetes_service_patch import (  # type: ignore[import]
-    KubernetesServicePatch,
-    ServicePort,
+import yaml
+from charms.oai_5g_amf.v1.fiveg_amf import (  # type: ignore[import]
+    AMFInformation,
+    FiveGAMFRequires,
 )
-from jinja2 import Environment, FileSystemLoader
-from ops.charm import CharmBase, ConfigChangedEvent
+from charms.oai_5g_nrf.v1.fiveg_nrf import FiveGNRFRequires  # type: ignore[import]
+from charms.oai_5g_udm.v1.oai_5g_udm import FiveGUDMRequires  # type: ignore[import]
+from charms.oai_5g_upf.v1.fiveg_upf import FiveGUPFRequires  # type: ignore[import]
+from ops.charm import (
+    ActionEvent,
+    CharmBase,
+    ConfigChangedEvent,
+    LeaderElectedEvent,
+    RelationBrokenEvent,
+    RelationEvent,
+    UpdateStatusEvent,
+)
+from ops.framework import EventBase, StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.model import (
+    ActiveStatus,
+    BlockedStatus,
+    MaintenanceStatus,
+    ModelError,
+    Relation,
+    StatusBase,
+    WaitingStatus,
+)
+from ops.pebble import APIError, ChangeError, CheckLevel, CheckStatus
+from ops.pebble import Error as PebbleError
+from ops.pebble import ExecError
+
+import capacity
+import nf_profile
+import pfcp
+import profiling
+import tracing
+import upf_list
+import workload_health
+import workload_logging
+import workload_tuning
+from config_stream import READ_CHUNK_SIZE, ConfigStream
+from local_subscriptions import (
+    SubscriptionImportError,
+    SubscriptionKey,
+    file_digest,
+    read_subscriptions,
+    subscription_key,
+    unique_subscriptions,
+)
+
+# jinja2 and lightkube are imported by the methods using them, so that hooks which do
+# not render nor patch anything, like update-status, skip their import. See
+# tests/benchmark/cold_start.py.
+if TYPE_CHECKING:
+    from kubernetes_client import KubernetesClient
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIRECTORY = "src/templates"
+BASE_CONFIG_PATH = "/openair-smf/etc"
+CONFIG_FILE_NAME = "smf.conf"
+CONFIG_PATH = f"{BASE_CONFIG_PATH}/{CONFIG_FILE_NAME}"
+PENDING_CONFIG_PATH = f"{CONFIG_PATH}.pending"
+WORKLOAD_BINARY = "/openair-smf/bin/oai_smf"
+# Requests and limits of the containers Juju adds to the pod, for the Guaranteed QoS class
+CHARM_CONTAINERS_RESOURCES = {"cpu": "500m", "memory": "512Mi"}
+QUANTITY_PATTERN = re.compile(r"^[0-9]+(\.[0-9]+)?(m|k|M|G|T|P|E|Ki|Mi|Gi|Ti|Pi|Ei)?$")
+NODE_LABEL_PATTERN = re.compile(r"^\s*[A-Za-z0-9./_-]+=[A-Za-z0-9._-]*\s*$")
+N4_SERVICE_TYPES = ("ClusterIP", "NodePort", "LoadBalancer")
+CONFIG_DELIVERIES = ("pebble", "configmap")
+CONFIG_MAP_MOUNT_PATH = "/openair-smf/etc-configmap"
+APPLY_POLICIES = ("immediate", "window", "manual")
+AMF_SELECTIONS = ("spread", "first")
+NF_DISCOVERY_MODES = ("static", "nrf")
+# Rendered for the AMF and UDM without a hint in the nrf discovery mode
+UNSET_NF_ADDRESS = {"ipv4_address": "127.0.0.1", "fqdn": "localhost"}
+DEFAULT_NF_CAPACITY = 100
+DEFAULT_NF_PRIORITY = 1
+NF_PROFILE_TIMEOUT = 2
+PEER_RELATION_NAME = "replicas"
+LOGGING_RELATION_NAME = "logging"
+NF_RELATION_NAMES = ("fiveg-amf", "fiveg-upf", "fiveg-nrf", "fiveg-udm")
+LOGGING_LAYER_LABEL = "smf-logging"
+SESSION_METRICS_SERVICE = "smf-session-metrics"
+SESSION_METRICS_SCRIPT = "session_metrics.py"
+SESSION_METRICS_SCRIPT_PATH = f"/opt/smf-charm/{SESSION_METRICS_SCRIPT}"
+SESSION_METRICS_LOG_LEVELS = ("trace", "debug", "info")
+PROFILES_DIRECTORY = "/var/tmp/smf-profiles"
+PROFILE_EXEC_TIMEOUT_MARGIN = 30
+PERF_DATA_PATH = "/tmp/smf-profile.perf.data"
+PROFILE_TOP_STACKS = 10
+PYTHON_PATHS = ("/usr/bin/python3", "/usr/local/bin/python3")
+PEBBLE_PATH = "/charm/bin/pebble"
+PEBBLE_SOCKET_PATH = "/charm/container/pebble.socket"
+HEALTH_CHECK_PERIOD = 5
+N4_PROBE_UPDATE_STATUS_ITERATIONS = 3
+N4_PROBE_UPDATE_STATUS_TIMEOUT = 0.5
+N4_PROBE_UPDATE_STATUS_DEADLINE = 2
+
+
+class Oai5GSMFOperatorCharm(CharmBase):
+    """Charm the service."""
+
+    _stored = StoredState()
+
+    def __init__(self, *args):
+        """Observes juju events."""
+        super().__init__(*args)
+        self._stored.set_default(
+            config_map_hash="",
+            applied_inputs_digest="",
+            staged_inputs_digest="",
+            local_subscriptions_digest="",
+            local_subscriptions_error="",
+            update_status_has_work=True,
+            delivered_config_digest="",
+            workload_unhealthy=False,
+            log_targets="{}",
+            nf_instance_id="",
+            nf_profile_synced=False,
+            restarted_at=0.0,
+            observed_hooks="",
+            workload_health="",
+        )
+        self._container_name = self._service_name = "smf"
+        self._container = self.unit.get_container(self._container_name)
+        self._configure_tracing()
+        self.amf_requires = FiveGAMFRequires(self, "fiveg-amf")
+        self.upf_requires = FiveGUPFRequires(self, "fiveg-upf")
+        self.nrf_requires = FiveGNRFRequires(self, "fiveg-nrf")
+        self.udm_requires = FiveGUDMRequires(self, "fiveg-udm")
+        self.framework.observe(self.on.install, self._on_reconcile_kubernetes_resources)
+        self.framework.observe(self.on.upgrade_charm, self._on_reconcile_kubernetes_resources)
+        self.framework.observe(self.on.leader_elected, self._on_reconcile_kubernetes_resources)
+        self.framework.observe(self.on.config_changed, self._on_reconcile_kubernetes_resources)
+        self.framework.observe(self.on.config_changed, self._on_config_changed)
+        self.framework.observe(self.on.config_changed, self._on_log_forwarding_changed)
+        self.framework.observe(self.on.config_changed, self._on_session_metrics_changed)
+        self.framework.observe(self.on.config_changed, self._on_nf_profile_changed)
+        self.framework.observe(
+            self.on[LOGGING_RELATION_NAME].relation_changed, self._on_log_forwarding_changed
+        )
+        self.framework.observe(
+            self.on[LOGGING_RELATION_NAME].relation_broken, self._on_log_forwarding_changed
+        )
+        self.framework.observe(self.on.upgrade_charm, self._on_config_changed)
+        self.framework.observe(self.on.fiveg_amf_relation_changed, self._on_config_changed)
+        self.framework.observe(self.on.fiveg_upf_relation_changed, self._on_config_changed)
+        self.framework.observe(self.on.fiveg_nrf_relation_changed, self._on_config_changed)
+        self.framework.observe(self.on.fiveg_udm_relation_changed, self._on_config_changed)
+        # The requirers observe relation-broken first, to leave the broken relation out
+        for relation_name in NF_RELATION_NAMES:
+            self.framework.observe(
+                self.on[relation_name].relation_departed, self._on_config_changed
+            )
+            self.framework.observe(self.on[relation_name].relation_broken, self._on_config_changed)
+        self.framework.observe(self.on.update_status, self._on_update_status)
+        self.framework.observe(
+            self.on[PEER_RELATION_NAME].relation_changed, self._on_replicas_relation_changed
+        )
+        self.framework.observe(
+            self.on[PEER_RELATION_NAME].relation_departed, self._on_replicas_relation_changed
+        )
+        self.framework.observe(self.on.leader_elected, self._on_leader_elected)
+        self.framework.observe(self.on.apply_config_action, self._on_apply_config_action)
+        self.framework.observe(self.on.probe_n4_action, self._on_probe_n4_action)
+        self.framework.observe(self.on.verify_tuning_action, self._on_verify_tuning_action)
+        self.framework.observe(self.on.capacity_report_action, self._on_capacity_report_action)
+        self.framework.observe(self.on.profile_workload_action, self._on_profile_workload_action)
+        self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
+
+    def _on_reconcile_kubernetes_resources(self, event: EventBase) -> None:
+        """Reconciles the Kubernetes resources shared by all units, from the leader.
+
+        Args:
+            event: Install, Upgrade Charm, Leader Elected or Config Changed Event
+
+        Returns:
+            None
+        """
+        if not self.unit.is_leader():
+            return
+        from kubernetes_client import KubernetesClient, KubernetesClientError
+
+        client = KubernetesClient(namespace=self.model.name, field_manager=self.app.name)
+        try:
+            if not self._invalid_service_config_status:
+                self._apply_services(client)
+            if not self._invalid_workload_resources_config_status:
+                self._patch_workload_resources(client)
+        except KubernetesClientError as e:
+            logger.error(str(e))
+
+    def _apply_services(self, client: "KubernetesClient") -> None:
+        """Applies the Kubernetes services exposing N4 and SBI.
+
+        N4 is exposed by the Service Juju creates for the application, with the type,
+        traffic policy and session affinity from the charm config. The SBI ports have
+        their own ClusterIP Service.
+
+        Args:
+            client: Kubernetes client
+
+        Returns:
+            None
+        """
+        from lightkube.models.core_v1 import ServicePort
+
+        with tracing.span("kubernetes-service-apply"):
+            client.apply_service(
+                name=self.app.name,
+                ports=[
+                    ServicePort(
+                        name="oai-smf",
+                        port=8805,
+                        protocol="UDP",
+                        targetPort=8805,
+                    ),
+                ],
+                service_type=self._config_n4_service_type,
+                external_traffic_policy=(
+                    None
+                    if self._config_n4_service_type == "ClusterIP"
+                    else self._config_n4_external_traffic_policy
+                ),
+                session_affinity_timeout=self._config_n4_session_affinity_timeout,
+            )
+            client.apply_service(
+                name=self._sbi_service_name,
+                ports=[
+                    ServicePort(
+                        name="http1",
+                        port=int(self._config_sbi_interface_port),
+                        protocol="TCP",
+                        targetPort=int(self._config_sbi_interface_port),
+                    ),
+                    ServicePort(
+                        name="http2",
+                        port=int(self._config_sbi_interface_http2_port),
+                        protocol="TCP",
+                        targetPort=int(self._config_sbi_interface_http2_port),
+                    ),
+                ],
+                selector={"app.kubernetes.io/name": self.app.name},
+            )
+
+    def _patch_workload_resources(self, client: "KubernetesClient") -> None:
+        """Patches the compute resources, node selector and mounts of the workload pods.
+
+        A pod only gets the Guaranteed QoS class when every container has limits equal
+        to its requests, so with guaranteed-qos the containers Juju adds for the charm
+        get `CHARM_CONTAINERS_RESOURCES`. With the configmap config delivery, the
+        ConfigMap of the config files is mounted in the workload container.
+
+        Args:
+            client: Kubernetes client
+
+        Returns:
+            None
+        """
+        cpu_request = self._config_cpu_request
+        if self._config_guaranteed_qos and not cpu_request.isdigit():
+            logger.warning(
+                "cpu-request %s is not an integer, the static CPU manager will not pin cores",
+                cpu_request,
+            )
+        with tracing.span("kubernetes-statefulset-patch"):
+            client.patch_workload_resources(
+                statefulset_name=self.app.name,
+                container_name=self._container_name,
+                requests=self._workload_resource_requests,
+                limits=self._workload_resource_limits,
+                node_selector=self._node_selector,
+                sysctls=workload_tuning.pod_sysctls(self._sysctls),
+                other_containers_resources=(
+                    CHARM_CONTAINERS_RESOURCES if self._config_guaranteed_qos else None
+                ),
+                config_map_name=(
+                    self._config_map_name if self._config_config_delivery == "configmap" else None
+                ),
+                config_map_mount_path=CONFIG_MAP_MOUNT_PATH,
+            )
+
+    @property
+    def _workload_resource_requests(self) -> Dict[str, str]:
+        """Returns the resource requests of the workload container from the charm config."""
+        requests = {
+            "cpu": self._config_cpu_request,
+            "memory": self._config_memory_request,
+            "hugepages-2Mi": self._config_hugepages_2mi,
+            "hugepages-1Gi": self._config_hugepages_1gi,
+        }
+        return {name: value for name, value in requests.items() if value}
+
+    @property
+    def _workload_resource_limits(self) -> Dict[str, str]:
+        """Returns the resource limits of the workload container from the charm config.
+
+        Hugepages cannot be overcommitted, so their limit is always their request. With
+        guaranteed-qos, so are the CPU and memory limits.
+        """
+        limits = {
+            "cpu": self._config_cpu_limit,
+            "memory": self._config_memory_limit,
+            "hugepages-2Mi": self._config_hugepages_2mi,
+            "hugepages-1Gi": self._config_hugepages_1gi,
+        }
+        if self._config_guaranteed_qos:
+            limits["cpu"] = self._config_cpu_request
+            limits["memory"] = self._config_memory_request
+        return {name: value for name, value in limits.items() if value}
+
+    @property
+    def _node_selector(self) -> Dict[str, str]:
+        """Returns the node selector of the workload pods from the charm config."""
+        return dict(
+            label.strip().split("=", 1) for label in self._config_node_selector.split(",") if label
+        )
+
+    @property
+    def _invalid_workload_resources_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the workload resources config is invalid, if any."""
+        quantities = {
+            "cpu-request": self._config_cpu_request,
+            "cpu-limit": self._config_cpu_limit,
+            "memory-request": self._config_memory_request,
+            "memory-limit": self._config_memory_limit,
+            "hugepages-2mi": self._config_hugepages_2mi,
+            "hugepages-1gi": self._config_hugepages_1gi,
+        }
+        for option, value in quantities.items():
+            if value and not QUANTITY_PATTERN.match(value):
+                return BlockedStatus(f"Invalid {option} {value!r}, expected a Kubernetes quantity")
+        if self._config_guaranteed_qos:
+            if not self._config_cpu_request or not self._config_memory_request:
+                return BlockedStatus("guaranteed-qos requires cpu-request and memory-request")
+            if self._config_cpu_limit not in ("", self._config_cpu_request) or (
+                self._config_memory_limit not in ("", self._config_memory_request)
+            ):
+                return BlockedStatus("guaranteed-qos requires limits equal to requests")
+        if not all(
+            NODE_LABEL_PATTERN.match(label)
+            for label in self._config_node_selector.split(",")
+            if label
+        ):
+            return BlockedStatus(
+                "Invalid node-selector, expected comma-separated key=value labels"
+            )
+        return self._invalid_tuning_config_status
+
+    @property
+    def _invalid_tuning_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the sysctls or rlimits config is invalid, if any."""
+        try:
+            workload_tuning.validate_sysctls(self._sysctls)
+        except ValueError as e:
+            return BlockedStatus(f"Invalid sysctls: {e}")
+        try:
+            workload_tuning.validate_rlimits(self._rlimits)
+        except ValueError as e:
+            return BlockedStatus(f"Invalid rlimits: {e}")
+        return self._invalid_workload_process_config_status
+
+    @property
+    def _invalid_workload_process_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the environment or CPU affinity config is invalid."""
+        try:
+            workload_tuning.validate_environment(self._config_environment)
+        except ValueError as e:
+            return BlockedStatus(f"Invalid workload-environment: {e}")
+        if self._config_allocator not in workload_tuning.ALLOCATORS:
+            return BlockedStatus(
+                f"Invalid allocator {self._config_allocator!r}, "
+                f"expected one of {', '.join(workload_tuning.ALLOCATORS)}"
+            )
+        if self._config_malloc_arena_max < 0:
+            return BlockedStatus("Invalid malloc-arena-max, expected 0 or more")
+        if self._config_cpu_affinity:
+            try:
+                workload_tuning.validate_cpu_affinity(self._config_cpu_affinity)
+            except ValueError as e:
+                return BlockedStatus(f"Invalid cpu-affinity: {e}")
+        return None
+
+    @property
+    def _missing_workload_files_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the workload image lacks a configured tool, if any."""
+        if self._config_allocator != "glibc" and not self._allocator_library:
+            return BlockedStatus(f"{self._config_allocator} not found in the workload container")
+        if self._config_cpu_affinity and not self._taskset_path:
+            return BlockedStatus("taskset not found in the workload container")
+        if self._config_session_metrics_port and not self._python_path:
+            return BlockedStatus("python3 not found in the workload container")
+        return None
+
+    @property
+    def _allocator_library(self) -> Optional[str]:
+        """Returns the path of the configured allocator library in the workload container."""
+        if self._config_allocator == "glibc":
+            return None
+        return next(
+            (
+                path
+                for path in workload_tuning.allocator_library_paths(self._config_allocator)
+                if self._container.exists(path)
+            ),
+            None,
+        )
+
+    @property
+    def _taskset_path(self) -> Optional[str]:
+        """Returns the path of taskset in the workload container."""
+        return next(
+            (path for path in workload_tuning.TASKSET_PATHS if self._container.exists(path)), None
+        )
+
+    @property
+    def _python_path(self) -> Optional[str]:
+        """Returns the path of python3 in the workload container."""
+        return next((path for path in PYTHON_PATHS if self._container.exists(path)), None)
+
+    @property
+    def _workload_environment(self) -> Dict[str, str]:
+        """Returns the environment of the workload from the charm config.
+
+        The allocator library is preloaded before the libraries of workload-environment.
+        """
+        environment = self._config_environment
+        if self._config_malloc_arena_max:
+            environment["MALLOC_ARENA_MAX"] = str(self._config_malloc_arena_max)
+        if allocator_library := self._allocator_library:
+            environment["LD_PRELOAD"] = ":".join(
+                filter(None, [allocator_library, environment.get("LD_PRELOAD")])
+            )
+        return environment
+
+    @property
+    def _workload_command(self) -> str:
+        """Returns the command of the workload.
+
+        The command sets the CPU affinity and resource limits of the workload, and filters
+        its logs by level and rate. Logs are not written at all at the off log level.
+        """
+        command = f"{WORKLOAD_BINARY} -c {self._config_path}"
+        log_filter = ""
+        if self._config_log_level != "off":
+            command += " -o"
+            log_filter = workload_logging.log_filter(
+                self._config_log_level, self._config_log_rate_limit
+            )
+        if self._config_cpu_affinity:
+            command = workload_tuning.taskset_command(
+                command, self._config_cpu_affinity, self._taskset_path or "taskset"
+            )
+        return workload_tuning.shell_command(command, self._rlimits, output_filter=log_filter)
+
+    @property
+    def _sysctls(self) -> Dict[str, str]:
+        """Returns the sysctls of the workload pods from the charm config.
+
+        Raises:
+            ValueError: If the config is not comma-separated name=value pairs
+        """
+        return workload_tuning.parse_settings(self._config_sysctls)
+
+    @property
+    def _rlimits(self) -> Dict[str, str]:
+        """Returns the resource limits of the workload from the charm config.
+
+        Raises:
+            ValueError: If the config is not comma-separated name=value pairs
+        """
+        return workload_tuning.parse_settings(self._config_rlimits)
+
+    @property
+    def _config_environment(self) -> Dict[str, str]:
+        """Returns the extra environment variables of the workload from the charm config.
+
+        Raises:
+            ValueError: If the config is not comma-separated name=value pairs
+        """
+        return workload_tuning.parse_settings(self._config_workload_environment)
+
+    @property
+    def _invalid_service_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the N4 Service config is invalid, if any."""
+        if self._config_n4_service_type not in N4_SERVICE_TYPES:
+            return BlockedStatus(
+                f"Invalid n4-service-type {self._config_n4_service_type!r}, "
+                f"expected one of {', '.join(N4_SERVICE_TYPES)}"
+            )
+        if self._config_n4_external_traffic_policy not in ("Cluster", "Local"):
+            return BlockedStatus("Invalid n4-external-traffic-policy, expected Cluster or Local")
+        local_traffic_policy = self._config_n4_external_traffic_policy == "Local"
+        if local_traffic_policy and self._config_n4_service_type == "ClusterIP":
+            return BlockedStatus(
+                "n4-external-traffic-policy Local requires a NodePort or LoadBalancer "
+                "n4-service-type"
+            )
+        if self._config_n4_session_affinity_timeout < 0:
+            return BlockedStatus("Invalid n4-session-affinity-timeout, expected 0 or more")
+        return None
+
+    def _configure_tracing(self) -> None:
+        """Exports the spans of this dispatch to the collector provided over relation data.
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation("tracing")
+        if not relation or not relation.app:
+            return
+        endpoint = relation.data[relation.app].get("endpoint")
+        if endpoint:
+            tracing.set_otlp_endpoint(endpoint)
+
+    @tracing.traced
+    def _on_config_changed(self, event: ConfigChangedEvent) -> None:
+        """Triggered on any change in configuration.
+
+        Args:
+            event: Config Changed Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect():
+            self.unit.status = WaitingStatus("Waiting for Pebble in workload container")
+            event.defer()
+            return
+        if relations_status := self._relations_status:
+            self.unit.status = relations_status
+            return
+        if invalid_config_status := (
+            self._invalid_config_status or self._missing_workload_files_status
+        ):
+            self.unit.status = invalid_config_status
+            return
+        context = self._render_context
+        inputs_digest = self._config_inputs_digest(context)
+        if inputs_digest == self._stored.applied_inputs_digest and self._workload_is_configured:
+            logger.info("Config inputs did not change since they were applied")
+            self._set_pending_config_status()
+            return
+        config = self._render_config(context)
+        if self._config_apply_policy == "immediate" or not self._config_file_is_pushed:
+            if not self._apply_config(config):
+                event.defer()
+                return
+            self._stored.applied_inputs_digest = inputs_digest
+            return
+        if self._stage_config(config):
+            self._stored.staged_inputs_digest = inputs_digest
+        else:
+            self._stored.applied_inputs_digest = inputs_digest
+        if self._apply_window_is_open:
+            self._apply_pending_config()
+        self._set_pending_config_status()
+
+    @property
+    def _invalid_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the charm config is invalid, if any."""
+        if self._config_apply_policy not in APPLY_POLICIES:
+            return BlockedStatus(
+                f"Invalid apply-policy {self._config_apply_policy!r}, "
+                f"expected one of {', '.join(APPLY_POLICIES)}"
+            )
+        if self._config_apply_policy == "window" and not self._apply_window:
+            return BlockedStatus(
+                "Invalid apply-window, expected a UTC time range like 02:00-04:00"
+            )
+        if self._config_config_delivery not in CONFIG_DELIVERIES:
+            return BlockedStatus(
+                f"Invalid config-delivery {self._config_config_delivery!r}, "
+                f"expected one of {', '.join(CONFIG_DELIVERIES)}"
+            )
+        if invalid_kubernetes_status := (
+            self._invalid_service_config_status or self._invalid_workload_resources_config_status
+        ):
+            return invalid_kubernetes_status
+        if local_subscriptions_error := self._local_subscriptions_error:
+            return BlockedStatus(
+                f"Invalid local-subscriptions resource: {local_subscriptions_error}"
+            )
+        return self._invalid_logging_config_status or self._invalid_network_functions_config_status
+
+    @property
+    def _invalid_logging_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the logging config is invalid, if any."""
+        if self._config_log_level not in workload_logging.LOG_LEVELS:
+            return BlockedStatus(
+                f"Invalid log-level {self._config_log_level!r}, "
+                f"expected one of {', '.join(workload_logging.LOG_LEVELS)}"
+            )
+        if self._config_log_rate_limit < 0:
+            return BlockedStatus("Invalid log-rate-limit, expected 0 or more")
+        if self._config_log_forwarding_url and not re.match(
+            r"^https?://", self._config_log_forwarding_url
+        ):
+            return BlockedStatus("Invalid log-forwarding-url, expected an http(s) URL")
+        if not 0 <= self._config_session_metrics_port <= 65535:
+            return BlockedStatus("Invalid session-metrics-port, expected 0 to 65535")
+        if str(self._config_session_metrics_port) in (
+            self._config_sbi_interface_port,
+            self._config_sbi_interface_http2_port,
+        ):
+            return BlockedStatus("session-metrics-port conflicts with an SBI port")
+        session_metrics_logged = self._config_log_level in SESSION_METRICS_LOG_LEVELS
+        if self._config_session_metrics_port and not session_metrics_logged:
+            return BlockedStatus("session-metrics-port requires log-level info or lower")
+        return None
+
+    @property
+    def _invalid_network_functions_config_status(self) -> Optional[StatusBase]:
+        """Returns the status to set when the config of the peer NFs is invalid, if any."""
+        if self._config_nf_discovery not in NF_DISCOVERY_MODES:
+            return BlockedStatus(
+                f"Invalid nf-discovery {self._config_nf_discovery!r}, "
+                f"expected one of {', '.join(NF_DISCOVERY_MODES)}"
+            )
+        if self._config_amf_selection not in AMF_SELECTIONS:
+            return BlockedStatus(
+                f"Invalid amf-selection {self._config_amf_selection!r}, "
+                f"expected one of {', '.join(AMF_SELECTIONS)}"
+            )
+        try:
+            self._nf_capacity, self._nf_priority
+        except ValueError as e:
+            return BlockedStatus(f"Invalid nf-capacity or nf-priority: {e}")
+        try:
+            self._upf_list_entries
+        except ValueError as e:
+            return BlockedStatus(f"Invalid upf-list: {e}")
+        return None
+
+    @property
+    def _workload_is_configured(self) -> bool:
+        """Returns whether the config file is delivered and no change is staged."""
+        return self._config_file_is_pushed and not self._container.exists(PENDING_CONFIG_PATH)
+
+    @property
+    def _local_subscriptions_path(self) -> Optional[str]:
+        """Returns the path of the local-subscriptions resource, None if not attached."""
+        try:
+            path = self.model.resources.fetch("local-subscriptions")
+        except (ModelError, NameError):
+            return None
+        if not path.stat().st_size:
+            return None
+        return str(path)
+
+    @property
+    def _local_subscriptions_digest(self) -> str:
+        """Returns the digest of the local-subscriptions resource, empty if not attached."""
+        path = self._local_subscriptions_path
+        return file_digest(path) if path else ""
+
+    @property
+    def _local_subscriptions_error(self) -> Optional[str]:
+        """Validates the local-subscriptions resource when it changed.
+
+        Validation streams the whole file, so its result is stored along with the digest
+        of the file and re-importing an unchanged file costs a single read.
+
+        Returns:
+            str: Validation error, None if the resource is valid or not attached
+        """
+        digest = self._local_subscriptions_digest
+        if not digest:
+            return None
+        if digest == self._stored.local_subscriptions_digest:
+            return str(self._stored.local_subscriptions_error) or None
+        try:
+            count = sum(1 for _ in self._local_subscriptions)
+        except SubscriptionImportError as e:
+            self._stored.local_subscriptions_error = str(e)
+        else:
+            self._stored.local_subscriptions_error = ""
+            logger.info("Imported %d local subscriptions", count)
+        self._stored.local_subscriptions_digest = digest
+        return str(self._stored.local_subscriptions_error) or None
+
+    @property
+    def _local_subscriptions(self) -> Iterator[Dict[str, str]]:
+        """Returns the unique local subscriptions of the resource, read as they are consumed.
+
+        Subscriptions for the (SST, SD, DNN) of a DNN from the charm config are skipped
+        since the config ones are rendered first.
+        """
+        path = self._local_subscriptions_path
+        if not path:
+            return iter(())
+        return unique_subscriptions(read_subscriptions(path), self._config_subscription_keys)
+
+    @property
+    def _config_subscription_keys(self) -> List[SubscriptionKey]:
+        """Returns the (SST, SD, DNN) of the DNNs from the charm config."""
+        keys = []
+        for dnn in range(3):
+            try:
+                keys.append(
+                    subscription_key(
+                        {
+                            "sst": self.model.config[f"dnn-{dnn}-nssai-sst"],
+                            "sd": self.model.config[f"dnn-{dnn}-nssai-sd"],
+                            "dnn": self.model.config[f"dnn-{dnn}-ni"],
+                        }
+                    )
+                )
+            except ValueError:
+                continue
+        return keys
+
+    @property
+    def _relations_status(self) -> Optional[StatusBase]:
+        """Returns the status to set while the required relations are not ready, if any."""
+        if self._config_nf_discovery == "nrf":
+            return self._nrf_relation_status or self._listed_upfs_status
+        if not self._amf_relation_created:
+            return BlockedStatus("Waiting for relation to AMF to be created")
+        if not self._upf_relation_created:
+            return BlockedStatus("Waiting for relation to UPF to be created")
+        if nrf_relation_status := self._nrf_relation_status:
+            return nrf_relation_status
+        if not self._udm_relation_created:
+            return BlockedStatus("Waiting for relation to UDM to be created")
+        if not self.amf_requires.amfs:
+            return WaitingStatus("Waiting for AMF IPv4 address to be available in relation data")
+        if not self.upf_requires.upfs:
+            return WaitingStatus("Waiting for UPF IPv4 address to be available in relation data")
+        if not self.udm_requires.udms:
+            return WaitingStatus("Waiting for UDM IPv4 address to be available in relation data")
+        return self._listed_upfs_status
+
+    @property
+    def _listed_upfs_status(self) -> Optional[StatusBase]:
+        """Returns the status to set while none of the UPFs of upf-list is related, if any."""
+        try:
+            entries = self._upf_list_entries
+        except ValueError:
+            return None
+        if entries and not upf_list.related_upfs(entries, self._related_upfs):
+            return WaitingStatus("Waiting for a UPF of upf-list to be available in relation data")
+        return None
+
+    @property
+    def _nrf_relation_status(self) -> Optional[StatusBase]:
+        """Returns the status to set while the NRF relation is not ready, if any."""
+        if not self._nrf_relation_created:
+            return BlockedStatus("Waiting for relation to NRF to be created")
+        if not self.nrf_requires.nrfs:
+            return WaitingStatus("Waiting for NRF IPv4 address to be available in relation data")
+        return None
+
+    def _apply_config(self, config: Iterable[str]) -> bool:
+        """Delivers the config file and restarts the workload with it.
+
+        Args:
+            config: Chunks of the rendered config file
+
+        Returns:
+            bool: Whether the config file was delivered, False if it should be retried
+        """
+        if not self._deliver_config(config):
+            return False
+        if self._container.exists(PENDING_CONFIG_PATH):
+            self._container.remove_path(PENDING_CONFIG_PATH)
+        self._restart_workload()
+        if not self._restart_pending:
+            self.unit.status = ActiveStatus()
+        return True
+
+    def _deliver_config(self, config: Iterable[str]) -> bool:
+        """Makes the config file available to the workload.
+
+        Args:
+            config: Chunks of the rendered config file
+
+        Returns:
+            bool: Whether the workload container sees the new config file
+        """
+        if self._config_config_delivery != "configmap":
+            self._push_config(config)
+            return True
+        from kubernetes_client import KubernetesClientError
+
+        # ConfigMaps are applied as a whole and cannot exceed 1MiB anyway
+        content = "".join(config)
+        try:
+            self._apply_config_map(content)
+        except KubernetesClientError as e:
+            logger.error(str(e))
+            self.unit.status = BlockedStatus(str(e))
+            return False
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        if not self._config_map_is_synced(content_hash):
+            self.unit.status = WaitingStatus("Waiting for ConfigMap to be synced in workload")
+            return False
+        self._stored.delivered_config_digest = content_hash
+        logger.info(f"ConfigMap {self._config_map_name} synced in workload container")
+        return True
+
+    def _apply_config_map(self, content: str) -> None:
+        """Applies the config file of this unit to the ConfigMap mounted in the workload.
+
+        Each unit owns its own entry and content-hash annotation of the ConfigMap. The
+        Kubernetes API is only called when the content changed since the last apply. The
+        ConfigMap is mounted by the leader with the other changes of the pod template,
+        see `_patch_workload_resources`.
+
+        Args:
+            content: Rendered config file
+
+        Returns:
+            None
+        """
+        from kubernetes_client import KubernetesClient
+
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        if self._stored.config_map_hash == content_hash:
+            return
+        client = KubernetesClient(namespace=self.model.name, field_manager=self._field_manager)
+        with tracing.span("kubernetes-config-map-apply"):
+            client.apply_config_map_entry(
+                name=self._config_map_name,
+                key=self._config_map_key,
+                content=content,
+                annotations={f"{self.app.name}/config-hash-{self._unit_number}": content_hash},
+            )
+        self._stored.config_map_hash = content_hash
+
+    def _config_map_is_synced(self, content_hash: str) -> bool:
+        """Returns whether the kubelet synced the ConfigMap entry of this unit in the workload.
+
+        The hook does not wait for the sync, which takes up to the kubelet sync period:
+        the config is delivered again, without applying the ConfigMap again, by the next
+        hook, as the event is deferred.
+
+        Args:
+            content_hash: SHA-256 digest of the expected content
+
+        Returns:
+            bool: Whether the mounted entry has the expected content
+        """
+        if not self._container.exists(self._config_path):
+            return False
+        return self._file_digest(self._config_path) == content_hash
+
+    def _stage_config(self, config: Iterable[str]) -> bool:
+        """Stages the config file until it is applied, unless nothing would change.
+
+        Successive changes overwrite the staged file so that they are applied in a single
+        restart. The file is also staged when it matches the running one but the
+        workload service does not match the Pebble layer, as for changes of the log
+        level or resource limits, so that the service is only updated when applied.
+
+        Args:
+            config: Chunks of the rendered config file
+
+        Returns:
+            bool: Whether the config file was staged
+        """
+        stream = ConfigStream(config)
+        with tracing.span("pebble-push"):
+            self._container.push(
+                path=PENDING_CONFIG_PATH, source=cast(BinaryIO, stream), make_dirs=True
+            )
+        config_changed = stream.hexdigest() != self._file_digest(self._config_path)
+        if not config_changed and not self._pebble_layer_diff:
+            self._container.remove_path(PENDING_CONFIG_PATH)
+            logger.info("Rendered config matches the running one, discarded staged config")
+            return False
+        logger.info("Staged config changes in %s", PENDING_CONFIG_PATH)
+        return True
+
+    def _apply_pending_config(self) -> bool:
+        """Applies the staged config file, if any.
+
+        Returns:
+            bool: Whether a staged config file was applied
+        """
+        if not self._container.exists(PENDING_CONFIG_PATH):
+            return False
+        with self._container.pull(PENDING_CONFIG_PATH) as pending_config:
+            if not self._apply_config(cast(TextIO, pending_config)):
+                return False
+        self._stored.applied_inputs_digest = str(self._stored.staged_inputs_digest)
+        logger.info("Applied staged config changes")
+        return True
+
+    def _set_pending_config_status(self) -> None:
+        """Sets the unit status depending on whether config changes are pending.
+
+        Returns:
+            None
+        """
+        if self._restart_pending:
+            return
+        if not self._container.exists(PENDING_CONFIG_PATH):
+            self.unit.status = ActiveStatus()
+        elif self._config_apply_policy == "window":
+            self.unit.status = ActiveStatus(
+                f"Config changes pending until apply window {self._config_apply_window} UTC"
+            )
+        else:
+            self.unit.status = ActiveStatus(
+                "Config changes pending, run the apply-config action to apply them"
+            )
+
+    @property
+    def _pending_config_diff(self) -> str:
+        """Returns the unified diff between the running and the staged config files.
+
+        It is followed by the diff of the workload service, when the staged changes
+        update it.
+        """
+        if not self._container.exists(PENDING_CONFIG_PATH):
+            return ""
+        pending_config = self._read_file(PENDING_CONFIG_PATH)
+        config_diff = "".join(
+            difflib.unified_diff(
+                self._running_config.splitlines(keepends=True),
+                pending_config.splitlines(keepends=True),
+                fromfile=self._config_path,
+                tofile=PENDING_CONFIG_PATH,
+            )
+        )
+        return config_diff + self._pebble_layer_diff
+
+    @property
+    def _pebble_layer_diff(self) -> str:
+        """Returns the unified diff between the running and the planned workload service."""
+        running_service = self._container.get_plan().services.get(self._service_name)
+        running = running_service.to_dict() if running_service else {}
+        planned = self._pebble_layer["services"][self._service_name]
+        if running == planned:
+            return ""
+        return "".join(
+            difflib.unified_diff(
+                yaml.safe_dump(running).splitlines(keepends=True),
+                yaml.safe_dump(planned).splitlines(keepends=True),
+                fromfile=f"pebble plan: {self._service_name}",
+                tofile=f"pebble layer: {self._service_name}",
+            )
+        )
+
+    @property
+    def _running_config(self) -> str:
+        """Returns the config file the workload runs with, empty if there is none."""
+        if not self._config_file_is_pushed:
+            return ""
+        return self._read_file(self._config_path)
+
+    def _read_file(self, path: str) -> str:
+        """Returns the content of a text file in the workload container.
+
+        Args:
+            path: Path of the file
+
+        Returns:
+            str: File content
+        """
+        return cast(str, self._container.pull(path).read())
+
+    def _file_digest(self, path: str) -> str:
+        """Returns the SHA-256 digest of a file in the workload container, read in chunks.
+
+        Args:
+            path: Path of the file
+
+        Returns:
+            str: Hexadecimal digest
+        """
+        sha256 = hashlib.sha256()
+        with self._container.pull(path, encoding=None) as file:
+            while chunk := file.read(READ_CHUNK_SIZE):
+                sha256.update(cast(bytes, chunk))
+        return sha256.hexdigest()
+
+    @property
+    def _apply_window(self) -> Optional[Tuple[datetime.time, datetime.time]]:
+        """Returns the start and end of the configured apply window, None if invalid."""
+        try:
+            start, end = self._config_apply_window.split("-")
+            return (
+                datetime.time.fromisoformat(start.strip()),
+                datetime.time.fromisoformat(end.strip()),
+            )
+        except ValueError:
+            return None
+
+    @property
+    def _apply_window_is_open(self) -> bool:
+        """Returns whether config changes can be applied now under the window policy."""
+        if self._config_apply_policy != "window" or not self._apply_window:
+            return False
+        start, end = self._apply_window
+        now = datetime.datetime.now(datetime.timezone.utc).time()
+        if start <= end:
+            return start <= now < end
+        return now >= start or now < end
+
+    @tracing.traced
+    def _on_update_status(self, event: UpdateStatusEvent) -> None:
+        """Triggered periodically by Juju.
+
+        Args:
+            event: Update Status Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect():
+            return
+        if self.unit.is_leader():
+            self._grant_restart_locks()
+        self._process_restart_lock()
+        if self._apply_window_is_open and self._apply_pending_config():
+            self._set_pending_config_status()
+        else:
+            self._check_workload_health(event)
+        if self._nf_profile_enabled and self._workload_is_planned:
+            self._update_nf_profile()
+        if self._config_probe_n4_on_update_status:
+            self._probe_n4_on_update_status()
+
+    def _probe_n4_on_update_status(self) -> None:
+        """Probes the related UPFs within a few seconds and reports unanswered ones.
+
+        UPFs left unprobed once the deadline is reached are not reported. The status is
+        cleared by the next update-status once every UPF answers again.
+
+        Returns:
+            None
+        """
+        results = self._probe_n4(
+            iterations=N4_PROBE_UPDATE_STATUS_ITERATIONS,
+            timeout=N4_PROBE_UPDATE_STATUS_TIMEOUT,
+            deadline=time.monotonic() + N4_PROBE_UPDATE_STATUS_DEADLINE,
+        )
+        for result in results:
+            logger.info("N4 probe results: %s", result.summary())
+        unanswered = [result.address for result in results if result.sent and not result.rtts]
+        if unanswered and isinstance(self.unit.status, ActiveStatus):
+            self._set_health_status(
+                WaitingStatus(f"No PFCP Heartbeat Response from UPFs: {', '.join(unanswered)}")
+            )
+
+    def _check_workload_health(self, event: UpdateStatusEvent) -> None:
+        """Sets the unit status from the workload health and reconciles drift.
+
+        Only the Pebble service and check states and the digest of the running config
+        file are read. Nothing is rendered, pushed nor restarted unless drift is found:
+        a config file changed behind the charm's back is reconciled like a config change,
+        a stopped service is started again with a replan.
+
+        Args:
+            event: Update Status Event
+
+        Returns:
+            None
+        """
+        if self._restart_pending or not self._workload_is_planned:
+            return
+        if self._config_file_drifted:
+            logger.warning("Config file %s changed since it was delivered", self._config_path)
+            self._stored.applied_inputs_digest = ""
+            self._on_config_changed(event)
+            return
+        service = self._container.get_service(self._service_name)
+        if not service.is_running():
+            logger.warning("Workload service %s is %s, starting it", service.name, service.current)
+            self._container.replan()
+            self._set_health_status(MaintenanceStatus("Workload service was not running"))
+            return
+        failing_checks = sorted(
+            name
+            for name, check in self._container.get_checks(level=CheckLevel.READY).items()
+            if check.status != CheckStatus.UP
+        )
+        if failing_checks:
+            self._set_health_status(
+                WaitingStatus(f"Workload health checks failing: {', '.join(failing_checks)}")
+            )
+            return
+        if bool(self._stored.workload_unhealthy):
+            self._stored.workload_unhealthy = False
+            self._set_pending_config_status()
+
+    def _set_health_status(self, status: StatusBase) -> None:
+        """Sets a status reporting an unhealthy workload, cleared once it recovers.
+
+        Args:
+            status: Unit status
+
+        Returns:
+            None
+        """
+        self._stored.workload_unhealthy = True
+        self.unit.status = status
+
+    @property
+    def _workload_is_planned(self) -> bool:
+        """Returns whether the workload service is part of the Pebble plan."""
+        return self._service_name in self._container.get_plan().services
+
+    @property
+    def _config_file_drifted(self) -> bool:
+        """Returns whether the running config file differs from the one last delivered."""
+        if not str(self._stored.delivered_config_digest):
+            return False
+        if not self._container.exists(self._config_path):
+            return True
+        return self._file_digest(self._config_path) != self._stored.delivered_config_digest
+
+    def _on_pre_commit(self, _) -> None:
+        """Stores the hooks observed and the work of update-status, for the dispatch fast path.
+
+        Returns:
+            None
+        """
+        self._stored.observed_hooks = json.dumps(self._observed_hooks)
+        has_work, workload_health = self._update_status_has_work, None
+        if not has_work and self._container.can_connect() and self._workload_is_planned:
+            workload_health = self._workload_health
+            has_work = workload_health is None
+        self._stored.update_status_has_work = has_work
+        self._stored.workload_health = json.dumps(workload_health) if workload_health else ""
+
+    @property
+    def _observed_hooks(self) -> List[str]:
+        """Returns the names of the Juju hooks observed by the charm and its libraries."""
+        return sorted(
+            {
+                str(event_kind).replace("_", "-")
+                for _, _, emitter_path, event_kind in self.framework._observers
+                if emitter_path == self.on.handle.path and not str(event_kind).endswith("_action")
+            }
+        )
+
+    @property
+    def _update_status_has_work(self) -> bool:
+        """Returns whether the next update-status has work to do besides checking health.
+
+        This is the case when the N4 probe runs on update-status, when this unit waits
+        for or holds the rolling restart lock, while the NF profile reports the load or
+        is not updated yet, and while staged changes wait for the apply window.
+        """
+        if self._config_probe_n4_on_update_status or self._restart_pending:
+            return True
+        if self._nf_profile_enabled and (
+            self._config_session_metrics_port or not bool(self._stored.nf_profile_synced)
+        ):
+            return True
+        if not self._container.can_connect():
+            return False
+        return self._config_apply_policy == "window" and self._container.exists(
+            PENDING_CONFIG_PATH
+        )
+
+    @property
+    def _workload_health(self) -> Optional[Dict[str, Any]]:
+        """Returns the state of the healthy workload, None when it is unhealthy.
+
+        The state of the workload service, of its readiness checks and of the running
+        config file is stored, and src/dispatch.py only dispatches update-status again
+        once Pebble reports a different one.
+        """
+        try:
+            service = self._container.get_service(self._service_name)
+            checks = self._container.get_checks(level=CheckLevel.READY)
+            config_file = self._container.list_files(self._config_path, itself=True)[0]
+        except (ModelError, PebbleError):
+            return None
+        if not service.is_running() or any(
+            check.status != CheckStatus.UP for check in checks.values()
+        ):
+            return None
+        return {
+            "socket": f"/charm/containers/{self._container_name}/pebble.socket",
+            "services": {service.name: service.current.value},
+            "checks": {name: check.status.value for name, check in checks.items()},
+            "files": {
+                self._config_path: workload_health.file_state(
+                    config_file.size or 0, config_file.last_modified
+                )
+            },
+        }
+
+    @tracing.traced
+    def _on_apply_config_action(self, event: ActionEvent) -> None:
+        """Applies the staged config changes, restarting the workload.
+
+        Args:
+            event: Action Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect():
+            event.fail("Workload container is not ready")
+            return
+        diff = self._pending_config_diff
+        if not diff:
+            event.set_results({"applied": False, "diff": ""})
+            return
+        if event.params["dry-run"]:
+            event.set_results({"applied": False, "diff": diff})
+            return
+        if not self._apply_pending_config():
+            event.fail(f"Failed to apply staged config changes: {self.unit.status.message}")
+            return
+        event.set_results({"applied": True, "diff": diff})
+
+    @tracing.traced
+    def _on_probe_n4_action(self, event: ActionEvent) -> None:
+        """Measures the N4 round-trip latency towards every related UPF.
+
+        Args:
+            event: Action Event
+
+        Returns:
+            None
+        """
+        if not self._upf_ipv4_addresses:
+            event.fail("No UPF IPv4 address available in relation data")
+            return
+        results = self._probe_n4(
+            iterations=int(event.params["iterations"]),
+            timeout=float(event.params["timeout"]),
+        )
+        event.set_results(
+            {f"upf-{index}": result.summary() for index, result in enumerate(results)}
+        )
+
+    @tracing.traced
+    def _on_verify_tuning_action(self, event: ActionEvent) -> None:
+        """Compares the sysctls and resource limits applied to the workload with the config.
+
+        Values are read in the workload container through Pebble exec, the resource
+        limits from those of the running workload process.
+
+        Args:
+            event: Action Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect():
+            event.fail("Workload container is not ready")
+            return
+        if invalid_tuning_status := self._invalid_tuning_config_status:
+            event.fail(invalid_tuning_status.message)
+            return
+        try:
+            results = self._verify_tuning()
+        except (APIError, ChangeError, ExecError) as e:
+            event.fail(f"Failed to read the values applied to the workload: {e}")
+            return
+        mismatches = [result for result in results if result["expected"] != result["applied"]]
+        event.set_results(
+            {
+                **{f"setting-{index}": result for index, result in enumerate(results)},
+                "mismatches": str(len(mismatches)),
+            }
+        )
+        if mismatches:
+            not_applied = ", ".join(
+                f"{result['name']}={result['expected']}" for result in mismatches
+            )
+            event.fail(f"Not applied: {not_applied}")
+
+    def _verify_tuning(self) -> List[dict]:
+        """Reads the sysctls and resource limits applied to the workload.
+
+        Sysctls not namespaced per pod are not set by the charm, and are reported as set
+        on the node.
+
+        Returns:
+            list: Name, expected and applied value of every configured setting, and where
+                sysctls are set
+        """
+        results = []
+        for name, value in self._sysctls.items():
+            process = self._container.exec(["cat", workload_tuning.sysctl_path(name)])
+            applied, _ = process.wait_output()
+            results.append(
+                {
+                    "name": name,
+                    "expected": value,
+                    "applied": " ".join(applied.split()),
+                    "set-on": "pod" if workload_tuning.is_pod_sysctl(name) else "node",
+                }
+            )
+        if rlimits := self._rlimits:
+            process = self._container.exec(
+                [
+                    "/bin/sh",
+                    "-c",
+                    workload_tuning.LIMITS_SCRIPT.format(name=os.path.basename(WORKLOAD_BINARY)),
+                ]
+            )
+            limits, _ = process.wait_output()
+            applied_rlimits = workload_tuning.parse_limits(limits)
+            results.extend(
+                {"name": name, "expected": value, "applied": applied_rlimits.get(name, "")}
+                for name, value in rlimits.items()
+            )
+        return results
+
+    @tracing.traced
+    def _on_profile_workload_action(self, event: ActionEvent) -> None:
+        """Samples the stacks of the workload and stores them folded for flamegraphs.
+
+        The collapsed stacks are written in the workload container, the most sampled ones
+        are also returned.
+
+        Args:
+            event: Action Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect():
+            event.fail("Workload container is not ready")
+            return
+        profiler = event.params["profiler"]
+        profilers = self._installed_profilers
+        if profiler != "auto":
+            if profiler not in profilers:
+                event.fail(f"{profiler} not found in the workload container")
+                return
+            profilers = {profiler: profilers[profiler]}
+        try:
+            pid = self._workload_pid()
+        except (APIError, ChangeError, ExecError) as e:
+            event.fail(f"Failed to find the {os.path.basename(WORKLOAD_BINARY)} process: {e}")
+            return
+        used_profiler, stacks, warnings = self._sample_stacks(
+            profilers, pid, int(event.params["duration"]), int(event.params["frequency"])
+        )
+        if not stacks:
+            event.fail(f"No stack sampled: {', '.join(warnings)}")
+            return
+        folded = profiling.collapsed(profiling.fold(stacks))
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = f"{PROFILES_DIRECTORY}/{timestamp}-{used_profiler}.folded"
+        self._container.push(path, folded, make_dirs=True)
+        results: Dict[str, Any] = {
+            "profiler": used_profiler,
+            "samples": str(len(stacks)),
+            "path": path,
+            "top-stacks": "".join(folded.splitlines(keepends=True)[:PROFILE_TOP_STACKS]),
+        }
+        if warnings:
+            results["warnings"] = "\n".join(warnings)
+        event.set_results(results)
+
+    @property
+    def _installed_profilers(self) -> Dict[str, str]:
+        """Returns the profilers of the workload container by order of preference.
+
+        Returns:
+            dict: Path by profiler of `profiling.PROFILERS`, ending with the fallback
+        """
+        profilers = {}
+        for profiler, paths in profiling.PROFILER_PATHS.items():
+            if path := next((path for path in paths if self._container.exists(path)), None):
+                profilers[profiler] = path
+        profilers[profiling.FALLBACK_PROFILER] = ""
+        return profilers
+
+    def _workload_pid(self) -> str:
+        """Returns the PID of the workload process in the workload container."""
+        process = self._container.exec(
+            [
+                "/bin/sh",
+                "-c",
+                profiling.PID_SCRIPT.format(name=os.path.basename(WORKLOAD_BINARY)),
+            ]
+        )
+        pid, _ = process.wait_output()
+        return pid.strip()
+
+    def _sample_stacks(
+        self, profilers: Dict[str, str], pid: str, duration: int, frequency: int
+    ) -> Tuple[str, List[List[str]], List[str]]:
+        """Samples the stacks of the workload with the first profiler that works.
+
+        Args:
+            profilers: Path by profiler, by order of preference
+            pid: PID of the workload process
+            duration: Seconds to sample for
+            frequency: Samples per second
+
+        Returns:
+            tuple: Profiler used, sampled stacks and why the profilers before it failed
+        """
+        warnings = []
+        for profiler, path in profilers.items():
+            script = profiling.profiler_script(
+                profiler,
+                path,
+                pid,
+                duration,
+                frequency,
+                data_path=PERF_DATA_PATH,
+            )
+            try:
+                process = self._container.exec(
+                    ["/bin/sh", "-c", script],
+                    timeout=duration + PROFILE_EXEC_TIMEOUT_MARGIN,
+                )
+                output, _ = process.wait_output()
+            except (APIError, ChangeError, ExecError) as e:
+                logger.warning("Failed to profile the workload with %s: %s", profiler, e)
+                warnings.append(f"{profiler} failed")
+                continue
+            stacks = profiling.parse_samples(profiler, output, os.path.basename(WORKLOAD_BINARY))
+            if stacks:
+                return profiler, stacks, warnings
+            warnings.append(f"{profiler} sampled no stack")
+        return "", [], warnings
+
+    @tracing.traced
+    def _on_capacity_report_action(self, event: ActionEvent) -> None:
+        """Reports the UE address capacity of each DNN and slice, and its utilization.
+
+        Args:
+            event: Action Event
+
+        Returns:
+            None
+        """
+        try:
+            sessions = capacity.parse_session_counts(event.params["sessions"])
+            pools = self._dnn_pools
+            overlaps = capacity.overlapping_ipv4_ranges(pools)
+            results: Dict[str, Any] = {
+                f"dnn-{index}": self._dnn_capacity_report(
+                    pool, sessions.get(pool.name), float(event.params["growth-per-hour"])
+                )
+                for index, pool in enumerate(pools)
+            }
+        except ValueError as e:
+            event.fail(f"Invalid DNN pool or session counts: {e}")
+            return
+        for (sst, sd), session_capacity in capacity.slice_capacities(pools).items():
+            results[f"slice-{sst}-{sd}".lower()] = {"session-capacity": str(session_capacity)}
+        warnings = [f"IPv4 ranges of {name} and {other} overlap" for name, other in overlaps]
+        if (units := self._planned_units) > 1:
+            warnings.append(f"All {units} units hand out addresses from the same ranges")
+        if warnings:
+            results["warnings"] = "; ".join(warnings)
+        event.set_results(results)
+
+    @staticmethod
+    def _dnn_capacity_report(
+        pool: capacity.DNNPool, sessions: Optional[int], growth_per_hour: float
+    ) -> Dict[str, str]:
+        """Returns the capacity report of a DNN.
+
+        Args:
+            pool: Address pools of the DNN
+            sessions: Current number of sessions of the DNN, None when unknown
+            growth_per_hour: Sessions added per hour, for the exhaustion projection
+
+        Returns:
+            dict: Capacity, and utilization when the number of sessions is known
+        """
+        report = {
+            "dnn": pool.name,
+            "slice": f"{pool.sst}/{pool.sd}",
+            "pdu-session-type": pool.pdu_session_type,
+            "ipv4-capacity": str(pool.ipv4_capacity),
+            "ipv6-capacity": str(pool.ipv6_capacity),
+            "session-capacity": str(pool.session_capacity),
+        }
+        if sessions is None:
+            return report
+        report["sessions"] = str(sessions)
+        if pool.session_capacity:
+            report["utilization-percent"] = f"{100 * sessions / pool.session_capacity:.1f}"
+        hours = capacity.hours_to_exhaustion(pool.session_capacity, sessions, growth_per_hour)
+        if hours is not None:
+            report["hours-to-exhaustion"] = f"{hours:.1f}"
+        return report
+
+    @property
+    def _dnn_pools(self) -> List[capacity.DNNPool]:
+        """Returns the address pools of the DNNs from the charm config."""
+        return [
+            capacity.DNNPool(
+                name=self.model.config[f"dnn-{index}-ni"],
+                sst=self.model.config[f"dnn-{index}-nssai-sst"],
+                sd=self.model.config[f"dnn-{index}-nssai-sd"],
+                pdu_session_type=self.model.config[f"dnn-{index}-pdu-session-type"],
+                ipv4_range=self.model.config[f"dnn-{index}-ipv4-range"],
+                ipv6_prefix=self.model.config[f"dnn-{index}-ipv6-prefix"],
+            )
+            for index in range(3)
+        ]
+
+    @property
+    def _planned_units(self) -> int:
+        """Returns the number of units of the application, this one included."""
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        return 1 + (len(relation.units) if relation else 0)
+
+    def _probe_n4(
+        self, iterations: int, timeout: float, deadline: Optional[float] = None
+    ) -> List[pfcp.ProbeResult]:
+        """Sends PFCP Heartbeat Requests to every related UPF.
+
+        The charm container shares the network namespace of the SMF pod, so the
+        requests leave from the same address as the N4 traffic of the workload.
+
+        Args:
+            iterations: Number of Heartbeat Requests sent to each UPF
+            timeout: Seconds to wait for each Heartbeat Response
+            deadline: `time.monotonic()` value after which no more requests are sent,
+                None for no deadline
+
+        Returns:
+            list: One probe result per UPF
+        """
+        return [
+            pfcp.probe(address=address, iterations=iterations, timeout=timeout, deadline=deadline)
+            for address in self._upf_ipv4_addresses
+        ]
+
+    @property
+    def _upf_ipv4_addresses(self) -> List[str]:
+        """Returns the IPv4 addresses of all UPFs advertised in relation data."""
+        addresses: List[str] = []
+        for upf in self.upf_requires.upfs:
+            if upf.ipv4_address not in addresses:
+                addresses.append(upf.ipv4_address)
+        return addresses
+
+    @tracing.traced
+    def _on_replicas_relation_changed(self, event: RelationEvent) -> None:
+        """Hands out rolling restart locks and restarts this unit when it holds one.
+
+        Args:
+            event: Relation Changed or Departed Event
+
+        Returns:
+            None
+        """
+        if self.unit.is_leader():
+            self._grant_restart_locks()
+        if self._container.can_connect():
+            self._process_restart_lock()
+
+    def _on_leader_elected(self, event: LeaderElectedEvent) -> None:
+        """Hands out the rolling restart locks the previous leader could not.
+
+        Args:
+            event: Leader Elected Event
+
+        Returns:
+            None
+        """
+        if self.model.relations[PEER_RELATION_NAME]:
+            self._grant_restart_locks()
+
+    def _restart_workload(self) -> None:
+        """Restarts the workload, one batch of units at a time when there are peers.
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        if not relation or not relation.units:
+            self._update_pebble_layer()
+            return
+        relation.data[self.unit]["restart-requested"] = str(time.time())
+        logger.info("Requested rolling restart lock")
+        if self.unit.is_leader():
+            self._grant_restart_locks()
+        self._process_restart_lock()
+
+    def _grant_restart_locks(self) -> None:
+        """Grants the rolling restart lock to up to restart-batch-size requesting units.
+
+        Units keep their lock until they release their request, which they do once
+        their workload passes its health checks.
+
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        if not relation:
+            return
+        requesting_units = sorted(
+            unit.name
+            for unit in (self.unit, *relation.units)
+            if "restart-requested" in relation.data[unit]
+        )
+        granted_units = [unit for unit in self._restart_granted_units if unit in requesting_units]
+        for unit in requesting_units:
+            if len(granted_units) >= self._config_restart_batch_size:
+                break
+            if unit not in granted_units:
+                granted_units.append(unit)
+        if granted_units != self._restart_granted_units:
+            relation.data[self.app]["restart-granted"] = json.dumps(granted_units)
+            logger.info("Granted rolling restart lock to %s", ", ".join(granted_units))
+
+    def _process_restart_lock(self) -> None:
+        """Restarts the workload if this unit holds the lock and releases it once healthy.
 
-logger = logging.getLogger(__name__)
+        Returns:
+            None
+        """
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        if not relation or not self._restart_pending:
+            return
+        unit_data = relation.data[self.unit]
+        if self.unit.name not in self._restart_granted_units:
+            self.unit.status = MaintenanceStatus("Waiting for rolling restart lock")
+            return
+        if unit_data.get("restart-done") != unit_data["restart-requested"]:
+            self._update_pebble_layer()
+            unit_data["restart-done"] = unit_data["restart-requested"]
+            self._stored.restarted_at = time.time()
+        if not self._restarted_workload_is_healthy:
+            self.unit.status = MaintenanceStatus(
+                "Waiting for workload health checks to release rolling restart lock"
+            )
+            return
+        del unit_data["restart-requested"]
+        del unit_data["restart-done"]
+        logger.info("Released rolling restart lock")
+        if self.unit.is_leader():
+            # Changing its own databag fires no event on this unit
+            self._grant_restart_locks()
+        self._set_pending_config_status()
 
-BASE_CONFIG_PATH = "/openair-smf/etc"
-CONFIG_FILE_NAME = "smf.conf"
+    @property
+    def _restart_pending(self) -> bool:
+        """Returns whether this unit waits for or holds the rolling restart lock."""
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        if not relation:
+            return False
+        return "restart-requested" in relation.data[self.unit]
 
+    @property
+    def _restart_granted_units(self) -> List[str]:
+        """Returns the names of the units holding the rolling restart lock."""
+        relation = self.model.get_relation(PEER_RELATION_NAME)
+        if not relation:
+            return []
+        return json.loads(relation.data[self.app].get("restart-granted", "[]"))
 
-class Oai5GSMFOperatorCharm(CharmBase):
-    """Charm the service."""
+    @property
+    def _restarted_workload_is_healthy(self) -> bool:
+        """Returns whether the readiness checks of the restarted workload pass.
 
-    def __init__(self, *args):
-        """Observes juju events."""
-        super().__init__(*args)
-        self._container_name = self._service_name = "smf"
-        self._container = self.unit.get_container(self._container_name)
-        self.service_patcher = KubernetesServicePatch(
-            charm=self,
-            ports=[
-                ServicePort(
-                    name="oai-smf",
-                    port=8805,
-                    protocol="UDP",
-                    targetPort=8805,
-                ),
-                ServicePort(
-                    name="http1",
-                    port=int(self._config_sbi_interface_port),
-                    protocol="TCP",
-                    targetPort=int(self._config_sbi_interface_port),
-                ),
-                ServicePort(
-                    name="http2",
-                    port=int(self._config_sbi_interface_http2_port),
-                    protocol="TCP",
-                    targetPort=int(self._config_sbi_interface_http2_port),
-                ),
-            ],
-        )
-        self.amf_requires = FiveGAMFRequires(self, "fiveg-amf")
-        self.upf_requires = FiveGUPFRequires(self, "fiveg-upf")
-        self.nrf_requires = FiveGNRFRequires(self, "fiveg-nrf")
-        self.udm_requires = FiveGUDMRequires(self, "fiveg-udm")
-        self.framework.observe(self.on.config_changed, self._on_config_changed)
-        self.framework.observe(self.on.fiveg_amf_relation_changed, self._on_config_changed)
-        self.framework.observe(self.on.fiveg_upf_relation_changed, self._on_config_changed)
-        self.framework.observe(self.on.fiveg_nrf_relation_changed, self._on_config_changed)
-        self.framework.observe(self.on.fiveg_udm_relation_changed, self._on_config_changed)
+        The hook does not wait for them: until a full check period has passed since the
+        restart, the checks still reflect the previous workload and are not trusted, and
+        the lock is released by the next update-status or peer event once they pass.
+        """
+        if time.time() - cast(float, self._stored.restarted_at) < HEALTH_CHECK_PERIOD:
+            return False
+        checks = self._container.get_checks(level=CheckLevel.READY)
+        return bool(checks) and all(check.status == CheckStatus.UP for check in checks.values())
 
-    def _on_config_changed(self, event: ConfigChangedEvent) -> None:
-        """Triggered on any change in configuration.
+    def _on_log_forwarding_changed(self, event: EventBase) -> None:
+        """Forwards the workload logs to the Loki endpoints of the logging relation.
+
+        The log targets have their own layer, so that the workload is not restarted when
+        they change.
 
         Args:
-            event: Config Changed Event
+            event: Config Changed, Logging Relation Changed or Broken Event
 
         Returns:
             None
         """
         if not self._container.can_connect():
-            self.unit.status = WaitingStatus("Waiting for Pebble in workload container")
-            event.defer()
-            return
-        if not self._amf_relation_created:
-            self.unit.status = BlockedStatus("Waiting for relation to AMF to be created")
             return
-        if not self._upf_relation_created:
-            self.unit.status = BlockedStatus("Waiting for relation to UPF to be created")
+        excluded_relation = event.relation if isinstance(event, RelationBrokenEvent) else None
+        self._update_log_forwarding_layer(self._loki_push_urls(excluded_relation))
+
+    def _update_log_forwarding_layer(self, loki_push_urls: Dict[str, str]) -> None:
+        """Adds the layer forwarding the workload logs to Loki endpoints.
+
+        Targets added before and gone since are kept in the plan without services, as a
+        layer cannot remove a log target.
+
+        Args:
+            loki_push_urls: Loki push API URLs by log target name
+
+        Returns:
+            None
+        """
+        previous_urls = json.loads(str(self._stored.log_targets))
+        targets = {
+            name: {"override": "replace", "type": "loki", "location": url, "services": []}
+            for name, url in previous_urls.items()
+        }
+        for name, url in loki_push_urls.items():
+            targets[name] = {
+                "override": "replace",
+                "type": "loki",
+                "location": url,
+                "services": [self._service_name],
+                "labels": {
+                    "juju_model": self.model.name,
+                    "juju_application": self.app.name,
+                    "juju_unit": self.unit.name,
+                },
+            }
+        layer = yaml.safe_dump({"summary": "smf log forwarding", "log-targets": targets})
+        try:
+            self._container.add_layer(LOGGING_LAYER_LABEL, layer, combine=True)
+        except APIError as e:
+            logger.error("Failed to update the log targets: %s", e)
             return
-        if not self._nrf_relation_created:
-            self.unit.status = BlockedStatus("Waiting for relation to NRF to be created")
+        self._stored.log_targets = json.dumps(loki_push_urls)
+
+    def _loki_push_urls(self, excluded_relation: Optional[Relation] = None) -> Dict[str, str]:
+        """Returns the Loki push API URLs to forward the workload logs to.
+
+        Args:
+            excluded_relation: Relation being removed, whose endpoints are left out
+
+        Returns:
+            dict: URLs by log target name
+        """
+        urls = {}
+        if self._config_log_forwarding_url:
+            urls["loki-config"] = self._config_log_forwarding_url
+        for relation in self.model.relations[LOGGING_RELATION_NAME]:
+            if relation == excluded_relation:
+                continue
+            for unit in relation.units:
+                try:
+                    url = json.loads(relation.data[unit].get("endpoint", "{}")).get("url")
+                except json.JSONDecodeError:
+                    logger.warning("Invalid Loki endpoint advertised by %s", unit.name)
+                    continue
+                if url:
+                    urls[f"loki-{unit.name.replace('/', '-')}"] = url
+        return urls
+
+    def _on_session_metrics_changed(self, event: ConfigChangedEvent) -> None:
+        """Starts or stops the service serving the session metrics of the workload logs.
+
+        Args:
+            event: Config Changed Event
+
+        Returns:
+            None
+        """
+        if not self._container.can_connect() or self._invalid_logging_config_status:
             return
-        if not self._udm_relation_created:
-            self.unit.status = BlockedStatus("Waiting for relation to UDM to be created")
+        self._update_session_metrics_layer()
+
+    def _update_session_metrics_layer(self) -> None:
+        """Adds the layer of the service serving the session metrics, see session_metrics.py.
+
+        The service has its own layer, so that the workload is not restarted when it
+        changes. It reads the workload logs with `pebble logs`, and is only started when
+        session-metrics-port is set and the workload image ships python3.
+
+        Returns:
+            None
+        """
+        python_path = self._python_path
+        enabled = bool(self._config_session_metrics_port and python_path)
+        if not enabled and SESSION_METRICS_SERVICE not in self._container.get_plan().services:
             return
-        if not self.amf_requires.amf_ipv4_address_available:
-            self.unit.status = WaitingStatus(
-                "Waiting for AMF IPv4 address to be available in relation data"
-            )
+        command = f"{python_path or 'python3'} {SESSION_METRICS_SCRIPT_PATH}"
+        command += f" --port {self._config_session_metrics_port}"
+        log_command = f"{PEBBLE_PATH} logs --follow -n 0 {self._service_name}"
+        script = f"{log_command} | exec {command}"
+        layer = {
+            "summary": "smf session metrics",
+            "services": {
+                SESSION_METRICS_SERVICE: {
+                    "override": "replace",
+                    "summary": "PDU session metrics of the smf logs",
+                    "command": f"/bin/sh -c {shlex.quote(script)}",
+                    "startup": "enabled" if enabled else "disabled",
+                    "environment": {"PEBBLE_SOCKET": PEBBLE_SOCKET_PATH},
+                }
+            },
+        }
+        try:
+            if enabled:
+                with open(os.path.join(os.path.dirname(__file__), SESSION_METRICS_SCRIPT)) as f:
+                    self._container.push(SESSION_METRICS_SCRIPT_PATH, f, make_dirs=True)
+            self._container.add_layer(SESSION_METRICS_SERVICE, layer, combine=True)
+            if enabled:
+                self._container.replan()
+            elif self._container.get_service(SESSION_METRICS_SERVICE).is_running():
+                self._container.stop(SESSION_METRICS_SERVICE)
+        except (APIError, ChangeError) as e:
+            logger.error("Failed to update the session metrics service: %s", e)
+
+    def _on_nf_profile_changed(self, event: ConfigChangedEvent) -> None:
+        """Updates the NF profile of the unit in the NRF with the configured weights.
+
+        The profile is only found once oai_smf registered, and is reset when it
+        registers again, so it is also updated on update-status.
+
+        Args:
+            event: Config Changed Event
+
+        Returns:
+            None
+        """
+        if not self._nf_profile_enabled:
             return
-        if not self.upf_requires.upf_ipv4_address_available:
-            self.unit.status = WaitingStatus(
-                "Waiting for UPF IPv4 address to be available in relation data"
+        if self._container.can_connect() and self._workload_is_planned:
+            self._update_nf_profile()
+
+    @property
+    def _nf_profile_enabled(self) -> bool:
+        """Returns whether the NF profile capacity or priority is set by the charm."""
+        return bool(self._config_nf_capacity or self._config_nf_priority)
+
+    @property
+    def _nf_capacity(self) -> int:
+        """Returns the NF profile capacity, from the config or from the CPU allocation.
+
+        With auto, the CPU allocation is the CPU limit of the workload, else its CPU
+        request, else its CPU affinity, else the CPU quota of its container. Without any,
+        the CPUs of the node are no measure of the share of the workload, so the capacity
+        is `DEFAULT_NF_CAPACITY`.
+        """
+        if self._config_nf_capacity != "auto":
+            return nf_profile.parse_weight(
+                self._config_nf_capacity or str(DEFAULT_NF_CAPACITY), nf_profile.MAX_CAPACITY
             )
-            return
-        if not self.nrf_requires.nrf_ipv4_address_available:
-            self.unit.status = WaitingStatus(
-                "Waiting for NRF IPv4 address to be available in relation data"
+        if cpu := self._config_cpu_limit or self._config_cpu_request:
+            millicores = nf_profile.cpu_millicores(cpu)
+        elif self._config_cpu_affinity:
+            millicores = 1000 * nf_profile.cpu_list_size(self._config_cpu_affinity)
+        elif cpu_quota := self._workload_cpu_quota:
+            millicores = cpu_quota
+        else:
+            return DEFAULT_NF_CAPACITY
+        return nf_profile.auto_capacity(millicores)
+
+    @property
+    def _workload_cpu_quota(self) -> Optional[int]:
+        """Returns the CPU quota of the workload container in millicores, if any.
+
+        The cgroup of the workload container is only visible from inside it, so its
+        cgroup v2 CPU quota is read through Pebble.
+        """
+        try:
+            if not self._container.exists(nf_profile.CGROUP_CPU_MAX_PATH):
+                return None
+            return nf_profile.cgroup_cpu_millicores(
+                self._read_file(nf_profile.CGROUP_CPU_MAX_PATH)
             )
+        except (PebbleError, ValueError) as e:
+            logger.debug("No CPU quota found for the workload container: %s", e)
+            return None
+
+    @property
+    def _nf_priority(self) -> int:
+        """Returns the NF profile priority from the config."""
+        return nf_profile.parse_weight(
+            self._config_nf_priority or str(DEFAULT_NF_PRIORITY), nf_profile.MAX_PRIORITY
+        )
+
+    @property
+    def _nf_load(self) -> Optional[int]:
+        """Returns the NF profile load, the share of the UE address pools in use.
+
+        The established sessions are read from the session metrics, so the load is only
+        known when session-metrics-port is set.
+        """
+        if not self._config_session_metrics_port:
+            return None
+        active_sessions = nf_profile.fetch_active_sessions(
+            f"http://127.0.0.1:{self._config_session_metrics_port}/metrics", NF_PROFILE_TIMEOUT
+        )
+        if active_sessions is None:
+            return None
+        try:
+            session_capacity = sum(pool.session_capacity for pool in self._dnn_pools)
+        except ValueError:
+            return None
+        return nf_profile.load(active_sessions, session_capacity)
+
+    @property
+    def _pod_ipv4_address(self) -> str:
+        """Returns the IPv4 address of the pod, which the workload registers in the NRF."""
+        return socket.gethostbyname(socket.gethostname())
+
+    def _update_nf_profile(self) -> None:
+        """Sets the capacity, priority and load of the NF profile of the unit in the NRF.
+
+        Nothing is updated while the config is invalid, the status is set by config-changed.
+
+        Returns:
+            None
+        """
+        if not self.nrf_requires.nrfs or self._invalid_network_functions_config_status:
             return
-        if not self.udm_requires.udm_ipv4_address_available:
-            self.unit.status = WaitingStatus(
-                "Waiting for UDM IPv4 address to be available in relation data"
+        nrf = self.nrf_requires.nrfs[0]
+        nrf_url = f"http://{nrf.ipv4_address}:{nrf.port}/nnrf-nfm/{nrf.api_version}"
+        self._stored.nf_profile_synced = False
+        try:
+            profile = self._registered_nf_profile(nrf_url)
+            if not profile:
+                logger.info("SMF instance of the unit not registered in the NRF yet")
+                return
+            operations = nf_profile.profile_operations(
+                profile, self._nf_capacity, self._nf_priority, self._nf_load
             )
-            return
-        self._push_config()
-        self._update_pebble_layer()
-        self.unit.status = ActiveStatus()
+            if operations:
+                nf_profile.update_profile(
+                    nrf_url, profile["nfInstanceId"], operations, NF_PROFILE_TIMEOUT
+                )
+                logger.info("Updated the NF profile in the NRF: %s", operations)
+            self._stored.nf_profile_synced = True
+        except (nf_profile.NRFError, OSError, KeyError) as e:
+            logger.warning("Failed to update the NF profile in the NRF: %s", e)
+
+    def _registered_nf_profile(self, nrf_url: str) -> Optional[dict]:
+        """Returns the NF profile the workload registered in the NRF, None if not registered.
+
+        The instance found is remembered, so that only its profile is read from then on.
+        The instances of the NRF are only listed again when it is no longer registered
+        with the address of the pod, after a re-registration or a reschedule.
+
+        Args:
+            nrf_url: NF management API root of the NRF
+
+        Returns:
+            dict: NF profile
+        """
+        address = self._pod_ipv4_address
+        if instance_id := str(self._stored.nf_instance_id):
+            profile = nf_profile.get_profile(nrf_url, instance_id, NF_PROFILE_TIMEOUT)
+            if profile and address in profile.get("ipv4Addresses", []):
+                return profile
+        profile = nf_profile.find_profile(nrf_url, "SMF", address, NF_PROFILE_TIMEOUT)
+        self._stored.nf_instance_id = profile["nfInstanceId"] if profile else ""
+        return profile
 
     def _update_pebble_layer(self) -> None:
         """Updates pebble layer with new configuration.
@@ -122,103 +1984,275 @@ class Oai5GSMFOperatorCharm(CharmBase):
         Returns:
             None
         """
-        self._container.add_layer("smf", self._pebble_layer, combine=True)
-        self._container.replan()
-        self._container.restart(self._service_name)
+        with tracing.span("pebble-layer-update"):
+            self._container.add_layer("smf", self._pebble_layer, combine=True)
+            self._update_log_forwarding_layer(self._loki_push_urls())
+            self._update_session_metrics_layer()
+            self._container.replan()
+        with tracing.span("pebble-restart"):
+            self._container.restart(self._service_name)
+        # oai_smf registers its default NF profile again once restarted
+        self._stored.nf_profile_synced = False
 
     @property
     def _amf_relation_created(self) -> bool:
-        return self._relation_created("fiveg-amf")
+        return bool(self.amf_requires.relations)
 
     @property
     def _upf_relation_created(self) -> bool:
-        return self._relation_created("fiveg-upf")
+        return bool(self.upf_requires.relations)
 
     @property
     def _nrf_relation_created(self) -> bool:
-        return self._relation_created("fiveg-nrf")
+        return bool(self.nrf_requires.relations)
 
     @property
     def _udm_relation_created(self) -> bool:
-        return self._relation_created("fiveg-udm")
+        return bool(self.udm_requires.relations)
 
-    def _relation_created(self, relation_name: str) -> bool:
-        if not self.model.get_relation(relation_name):
-            return False
-        return True
+    def _render_config(self, context: Dict[str, Any]) -> Iterator[str]:
+        """Renders the config file of the workload.
+
+        The template is rendered lazily, chunk by chunk, as the result is consumed, and
+        so are the local subscriptions imported from the local-subscriptions resource.
+        The template-render span covers the consumption, within the pebble-push span.
+
+        Args:
+            context: Template context, from `_render_context`
+
+        Returns:
+            Iterator: Chunks of the config file
+        """
+        from jinja2 import Environment, FileSystemLoader
 
-    def _push_config(self) -> None:
-        jinja2_environment = Environment(loader=FileSystemLoader("src/templates/"))
+        jinja2_environment = Environment(loader=FileSystemLoader(TEMPLATES_DIRECTORY))
         template = jinja2_environment.get_template(f"{CONFIG_FILE_NAME}.j2")
-        content = template.render(
-            fqdn=self._config_fqdn,
-            instance=self._config_instance,
-            pid_directory=self._config_pid_directory,
-            n4_interface_name=self._config_n4_interface_name,
-            sbi_interface_name=self._config_sbi_interface_name,
-            sbi_interface_port=self._config_sbi_interface_port,
-            sbi_interface_http2_port=self._config_sbi_interface_http2_port,
-            sbi_interface_api_version=self._config_sbi_interface_api_version,
-            dnn_0_ni=self._config_dnn_0_ni,
-            dnn_0_pdu_session_type=self._config_dnn_0_pdu_session_type,
-            dnn_0_ipv4_range=self._config_dnn_0_ipv4_range,
-            dnn_0_ipv6_prefix=self._config_dnn_0_ipv6_prefix,
-            dnn_1_ni=self._config_dnn_1_ni,
-            dnn_1_pdu_session_type=self._config_dnn_1_pdu_session_type,
-            dnn_1_ipv4_range=self._config_dnn_1_ipv4_range,
-            dnn_1_ipv6_prefix=self._config_dnn_1_ipv6_prefix,
-            dnn_2_ni=self._config_dnn_2_ni,
-            dnn_2_pdu_session_type=self._config_dnn_2_pdu_session_type,
-            dnn_2_ipv4_range=self._config_dnn_2_ipv4_range,
-            dnn_2_ipv6_prefix=self._config_dnn_2_ipv6_prefix,
-            dns_0_ipv4_address=self._config_dns_0_ipv4_address,
-            dns_1_ipv4_address=self._config_dns_1_ipv4_address,
-            dns_0_ipv6_address=self._config_dns_0_ipv6_address,
-            dns_1_ipv6_address=self._config_dns_1_ipv6_address,
-            ue_mtu=self._config_ue_mtu,
-            register_nrf=self._config_register_nrf,
-            discover_upf=self._config_discover_upf,
-            use_local_subscription_info=self._config_use_local_subscription_info,
-            use_fqdn_dns=self._config_use_fqdn_dns,
-            http_version=self._config_http_version,
-            use_network_instance=self._config_use_network_instance,
-            enable_usage_reporting=self._config_enable_usage_reporting,
-            amf_ipv4_address=self.amf_requires.amf_ipv4_address,
-            amf_port=self.amf_requires.amf_port,
-            amf_api_version=self.amf_requires.amf_api_version,
-            amf_fqdn=self.amf_requires.amf_fqdn,
-            udm_ipv4_address=self.udm_requires.udm_ipv4_address,
-            udm_port=self.udm_requires.udm_port,
-            udm_api_version=self.udm_requires.udm_api_version,
-            udm_fqdn=self.udm_requires.udm_fqdn,
-            nrf_ipv4_address=self.nrf_requires.nrf_ipv4_address,
-            nrf_port=self.nrf_requires.nrf_port,
-            nrf_api_version=self.nrf_requires.nrf_api_version,
-            nrf_fqdn=self.nrf_requires.nrf_fqdn,
-            upf_0_ipv4_address=self.upf_requires.upf_ipv4_address,
-            upf_0_fqdn=self.upf_requires.upf_fqdn,
-            domain_access=self._config_domain_access,
-            domain_core=self._config_core_access,
-            dnn_0_nssai_sst=self._config_dnn_0_nssai_sst,
-            dnn_0_nssai_sd=self._config_dnn_0_nssai_sd,
-            dnn_1_nssai_sst=self._config_dnn_1_nssai_sst,
-            dnn_1_nssai_sd=self._config_dnn_1_nssai_sd,
-            dnn_2_nssai_sst=self._config_dnn_2_nssai_sst,
-            dnn_2_nssai_sd=self._config_dnn_2_nssai_sd,
+        return tracing.iterated(
+            "template-render",
+            template.generate(**context, local_subscriptions=self._local_subscriptions),
         )
 
-        self._container.push(path=f"{BASE_CONFIG_PATH}/{CONFIG_FILE_NAME}", source=content)
-        logger.info(f"Wrote file to container: {CONFIG_FILE_NAME}")
+    @property
+    def _render_context(self) -> Dict[str, Any]:
+        """Returns the values rendered in the config template, except local subscriptions."""
+        amf_relation_data = self._amf_relation_data
+        udm_relation_data = self._udm_relation_data
+        nrf_relation_data = self._nrf_relation_data
+        return {
+            "fqdn": self._config_fqdn,
+            "instance": self._config_instance,
+            "pid_directory": self._config_pid_directory,
+            "n4_interface_name": self._config_n4_interface_name,
+            "sbi_interface_name": self._config_sbi_interface_name,
+            "sbi_interface_port": self._config_sbi_interface_port,
+            "sbi_interface_http2_port": self._config_sbi_interface_http2_port,
+            "sbi_interface_api_version": self._config_sbi_interface_api_version,
+            "dnn_0_ni": self._config_dnn_0_ni,
+            "dnn_0_pdu_session_type": self._config_dnn_0_pdu_session_type,
+            "dnn_0_ipv4_range": self._config_dnn_0_ipv4_range,
+            "dnn_0_ipv6_prefix": self._config_dnn_0_ipv6_prefix,
+            "dnn_1_ni": self._config_dnn_1_ni,
+            "dnn_1_pdu_session_type": self._config_dnn_1_pdu_session_type,
+            "dnn_1_ipv4_range": self._config_dnn_1_ipv4_range,
+            "dnn_1_ipv6_prefix": self._config_dnn_1_ipv6_prefix,
+            "dnn_2_ni": self._config_dnn_2_ni,
+            "dnn_2_pdu_session_type": self._config_dnn_2_pdu_session_type,
+            "dnn_2_ipv4_range": self._config_dnn_2_ipv4_range,
+            "dnn_2_ipv6_prefix": self._config_dnn_2_ipv6_prefix,
+            "dns_0_ipv4_address": self._config_dns_0_ipv4_address,
+            "dns_1_ipv4_address": self._config_dns_1_ipv4_address,
+            "dns_0_ipv6_address": self._config_dns_0_ipv6_address,
+            "dns_1_ipv6_address": self._config_dns_1_ipv6_address,
+            "ue_mtu": self._config_ue_mtu,
+            "register_nrf": self._config_register_nrf,
+            "discover_upf": self._config_discover_upf,
+            "use_local_subscription_info": self._config_use_local_subscription_info,
+            "use_fqdn_dns": self._config_use_fqdn_dns,
+            "http_version": self._config_http_version,
+            "use_network_instance": self._config_use_network_instance,
+            "enable_usage_reporting": self._config_enable_usage_reporting,
+            "amf_ipv4_address": amf_relation_data["amf_ipv4_address"],
+            "amf_port": amf_relation_data["amf_port"],
+            "amf_api_version": amf_relation_data["amf_api_version"],
+            "amf_fqdn": amf_relation_data["amf_fqdn"],
+            "udm_ipv4_address": udm_relation_data["udm_ipv4_address"],
+            "udm_port": udm_relation_data["udm_port"],
+            "udm_api_version": udm_relation_data["udm_api_version"],
+            "udm_fqdn": udm_relation_data["udm_fqdn"],
+            "nrf_ipv4_address": nrf_relation_data["nrf_ipv4_address"],
+            "nrf_port": nrf_relation_data["nrf_port"],
+            "nrf_api_version": nrf_relation_data["nrf_api_version"],
+            "nrf_fqdn": nrf_relation_data["nrf_fqdn"],
+            "upfs": self._upf_list,
+            "dnn_0_nssai_sst": self._config_dnn_0_nssai_sst,
+            "dnn_0_nssai_sd": self._config_dnn_0_nssai_sd,
+            "dnn_1_nssai_sst": self._config_dnn_1_nssai_sst,
+            "dnn_1_nssai_sd": self._config_dnn_1_nssai_sd,
+            "dnn_2_nssai_sst": self._config_dnn_2_nssai_sst,
+            "dnn_2_nssai_sd": self._config_dnn_2_nssai_sd,
+        }
+
+    def _config_inputs_digest(self, context: Dict[str, Any]) -> str:
+        """Returns a digest of everything the config file and the Pebble layer depend on.
+
+        Args:
+            context: Template context, from `_render_context`
+
+        Returns:
+            str: Hexadecimal digest
+        """
+        if self._config_nf_discovery == "nrf":
+            # oai_smf resolves the FQDNs of its peers, their addresses are only hints
+            context = {
+                key: value
+                for key, value in context.items()
+                if not key.endswith("_ipv4_address") or key.startswith("dns_")
+            }
+            context["upfs"] = [{**upf, "ipv4_address": ""} for upf in context["upfs"]]
+        inputs = {
+            "context": context,
+            "local_subscriptions": self._local_subscriptions_digest,
+            "template": file_digest(f"{TEMPLATES_DIRECTORY}/{CONFIG_FILE_NAME}.j2"),
+            "layer": self._pebble_layer,
+            "config_delivery": self._config_config_delivery,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _push_config(self, config: Iterable[str]) -> None:
+        stream = ConfigStream(config)
+        with tracing.span("pebble-push"):
+            self._container.push(path=CONFIG_PATH, source=cast(BinaryIO, stream), make_dirs=True)
+        self._stored.delivered_config_digest = stream.hexdigest()
+        logger.info(f"Wrote file to container: {CONFIG_FILE_NAME} ({stream.size} bytes)")
+
+    @property
+    def _amf_relation_data(self) -> dict:
+        """Returns the AMF information read from relation data."""
+        with tracing.span("relation-data-read", relation="fiveg-amf"):
+            if not self.amf_requires.amfs:
+                return self._unset_nf_relation_data("amf")
+            amf = self._selected_amf
+        return {
+            "amf_ipv4_address": amf.ipv4_address,
+            "amf_port": str(amf.port),
+            "amf_api_version": amf.api_version,
+            "amf_fqdn": amf.fqdn,
+        }
+
+    @property
+    def _selected_amf(self) -> AMFInformation:
+        """Returns the AMF of the related AMF set this unit sends its N11 traffic to.
+
+        oai_smf is configured with a single AMF. With the spread selection, the units
+        take the AMFs in turn by unit number, sorted by address so that every unit sees
+        the same order, and spread their traffic over the AMF set.
+        """
+        amfs = self.amf_requires.amfs
+        if self._config_amf_selection == "first":
+            return amfs[0]
+        amfs = sorted(amfs, key=lambda amf: (amf.ipv4_address, amf.port, amf.fqdn))
+        amf = amfs[int(self._unit_number) % len(amfs)]
+        logger.debug("Selected AMF %s:%s of %d", amf.ipv4_address, amf.port, len(amfs))
+        return amf
+
+    @property
+    def _udm_relation_data(self) -> dict:
+        """Returns the UDM information read from relation data."""
+        with tracing.span("relation-data-read", relation="fiveg-udm"):
+            if not self.udm_requires.udms:
+                return self._unset_nf_relation_data("udm")
+            udm = self.udm_requires.udms[0]
+        return {
+            "udm_ipv4_address": udm.ipv4_address,
+            "udm_port": str(udm.port),
+            "udm_api_version": udm.api_version,
+            "udm_fqdn": udm.fqdn,
+        }
+
+    @property
+    def _nrf_relation_data(self) -> dict:
+        """Returns the NRF information read from relation data."""
+        with tracing.span("relation-data-read", relation="fiveg-nrf"):
+            nrf = self.nrf_requires.nrfs[0]
+        return {
+            "nrf_ipv4_address": nrf.ipv4_address,
+            "nrf_port": str(nrf.port),
+            "nrf_api_version": nrf.api_version,
+            "nrf_fqdn": nrf.fqdn,
+        }
+
+    @property
+    def _related_upfs(self) -> List[Dict[str, str]]:
+        """Returns the IPv4 address and FQDN of each UPF read from relation data."""
+        with tracing.span("relation-data-read", relation="fiveg-upf"):
+            return [
+                {"ipv4_address": upf.ipv4_address, "fqdn": upf.fqdn}
+                for upf in self.upf_requires.upfs
+            ]
+
+    @property
+    def _upf_list(self) -> List[Dict[str, str]]:
+        """Returns the UPFs rendered in the config file, the first one without upf-list."""
+        return upf_list.upf_list(self._upf_list_entries, self._related_upfs)
+
+    @property
+    def _upf_list_entries(self) -> List[upf_list.Entry]:
+        """Returns the UPFs of the UPF list and their network instances, from upf-list.
+
+        Raises:
+            ValueError: If upf-list is malformed
+        """
+        return upf_list.parse_entries(self._config_upf_list)
+
+    @staticmethod
+    def _unset_nf_relation_data(nf: str) -> dict:
+        """Returns the data rendered for an AMF or UDM without hint, in nrf discovery mode.
+
+        Args:
+            nf: amf or udm
+
+        Returns:
+            dict: Relation data pointing at the loopback address
+        """
+        return {
+            f"{nf}_ipv4_address": UNSET_NF_ADDRESS["ipv4_address"],
+            f"{nf}_port": "80",
+            f"{nf}_api_version": "v1",
+            f"{nf}_fqdn": UNSET_NF_ADDRESS["fqdn"],
+        }
 
     @property
     def _config_file_is_pushed(self) -> bool:
         """Check if config file is pushed to the container."""
-        if not self._container.exists(f"{BASE_CONFIG_PATH}/{CONFIG_FILE_NAME}"):
+        if not self._container.exists(self._config_path):
             logger.info(f"Config file is not written: {CONFIG_FILE_NAME}")
             return False
         logger.info("Config file is pushed")
         return True
 
+    @property
+    def _config_path(self) -> str:
+        """Returns the path of the config file the workload runs with."""
+        if self._config_config_delivery == "configmap":
+            return f"{CONFIG_MAP_MOUNT_PATH}/{self._config_map_key}"
+        return CONFIG_PATH
+
+    @property
+    def _config_map_name(self) -> str:
+        return f"{self.app.name}-config"
+
+    @property
+    def _config_map_key(self) -> str:
+        return f"smf-{self._unit_number}.conf"
+
+    @property
+    def _unit_number(self) -> str:
+        return self.unit.name.split("/")[1]
+
+    @property
+    def _field_manager(self) -> str:
+        return f"{self.app.name}-{self._unit_number}"
+
     @property
     def _config_instance(self) -> str:
         return "0"
@@ -229,7 +2263,11 @@ class Oai5GSMFOperatorCharm(CharmBase):
 
     @property
     def _config_fqdn(self) -> str:
-        return f"{self.model.app.name}.{self.model.name}.svc.cluster.local"
+        return f"{self._sbi_service_name}.{self.model.name}.svc.cluster.local"
+
+    @property
+    def _sbi_service_name(self) -> str:
+        return f"{self.app.name}-sbi"
 
     @property
     def _config_n4_interface_name(self) -> str:
@@ -341,20 +2379,13 @@ class Oai5GSMFOperatorCharm(CharmBase):
 
     @property
     def _config_use_network_instance(self) -> str:
-        return "no"
+        entries = self._upf_list_entries
+        return "yes" if entries and entries[0].domain_access else "no"
 
     @property
     def _config_enable_usage_reporting(self) -> str:
         return "no"
 
-    @property
-    def _config_domain_access(self) -> str:
-        return "random"
-
-    @property
-    def _config_core_access(self) -> str:
-        return "random"
-
     @property
     def _config_dnn_0_nssai_sst(self) -> str:
         return self.model.config["dnn-0-nssai-sst"]
@@ -379,22 +2410,168 @@ class Oai5GSMFOperatorCharm(CharmBase):
     def _config_dnn_2_nssai_sd(self) -> str:
         return self.model.config["dnn-2-nssai-sd"]
 
+    @property
+    def _config_apply_policy(self) -> str:
+        return self.model.config["apply-policy"]
+
+    @property
+    def _config_apply_window(self) -> str:
+        return self.model.config["apply-window"]
+
+    @property
+    def _config_config_delivery(self) -> str:
+        return self.model.config["config-delivery"]
+
+    @property
+    def _config_n4_service_type(self) -> str:
+        return self.model.config["n4-service-type"]
+
+    @property
+    def _config_n4_external_traffic_policy(self) -> str:
+        return self.model.config["n4-external-traffic-policy"]
+
+    @property
+    def _config_n4_session_affinity_timeout(self) -> int:
+        return int(self.model.config["n4-session-affinity-timeout"])
+
+    @property
+    def _config_cpu_request(self) -> str:
+        return self.model.config["cpu-request"].strip()
+
+    @property
+    def _config_cpu_limit(self) -> str:
+        return self.model.config["cpu-limit"].strip()
+
+    @property
+    def _config_memory_request(self) -> str:
+        return self.model.config["memory-request"].strip()
+
+    @property
+    def _config_memory_limit(self) -> str:
+        return self.model.config["memory-limit"].strip()
+
+    @property
+    def _config_guaranteed_qos(self) -> bool:
+        return bool(self.model.config["guaranteed-qos"])
+
+    @property
+    def _config_hugepages_2mi(self) -> str:
+        return self.model.config["hugepages-2mi"].strip()
+
+    @property
+    def _config_hugepages_1gi(self) -> str:
+        return self.model.config["hugepages-1gi"].strip()
+
+    @property
+    def _config_node_selector(self) -> str:
+        return self.model.config["node-selector"]
+
+    @property
+    def _config_sysctls(self) -> str:
+        return self.model.config["sysctls"]
+
+    @property
+    def _config_rlimits(self) -> str:
+        return self.model.config["rlimits"]
+
+    @property
+    def _config_workload_environment(self) -> str:
+        return self.model.config["workload-environment"]
+
+    @property
+    def _config_allocator(self) -> str:
+        return self.model.config["allocator"]
+
+    @property
+    def _config_malloc_arena_max(self) -> int:
+        return int(self.model.config["malloc-arena-max"])
+
+    @property
+    def _config_cpu_affinity(self) -> str:
+        return self.model.config["cpu-affinity"].strip()
+
+    @property
+    def _config_log_level(self) -> str:
+        return self.model.config["log-level"]
+
+    @property
+    def _config_log_rate_limit(self) -> int:
+        return int(self.model.config["log-rate-limit"])
+
+    @property
+    def _config_log_forwarding_url(self) -> str:
+        return self.model.config["log-forwarding-url"].strip()
+
+    @property
+    def _config_session_metrics_port(self) -> int:
+        return int(self.model.config["session-metrics-port"])
+
+    @property
+    def _config_nf_discovery(self) -> str:
+        return self.model.config["nf-discovery"]
+
+    @property
+    def _config_upf_list(self) -> str:
+        return self.model.config["upf-list"]
+
+    @property
+    def _config_nf_capacity(self) -> str:
+        return self.model.config["nf-capacity"].strip()
+
+    @property
+    def _config_nf_priority(self) -> str:
+        return self.model.config["nf-priority"].strip()
+
+    @property
+    def _config_amf_selection(self) -> str:
+        return self.model.config["amf-selection"]
+
+    @property
+    def _config_restart_batch_size(self) -> int:
+        return max(int(self.model.config["restart-batch-size"]), 1)
+
+    @property
+    def _config_probe_n4_on_update_status(self) -> bool:
+        return bool(self.model.config["probe-n4-on-update-status"])
+
     @property
     def _pebble_layer(self) -> dict:
         """Return a dictionary representing a Pebble layer."""
+        service: Dict[str, Any] = {
+            "override": "replace",
+            "summary": "smf",
+            "command": self._workload_command,
+            "startup": "enabled",
+        }
+        if environment := self._workload_environment:
+            service["environment"] = environment
         return {
             "summary": "smf layer",
             "description": "pebble config layer for smf",
-            "services": {
-                self._service_name: {
+            "services": {self._service_name: service},
+            "checks": {
+                "smf-sbi": {
                     "override": "replace",
-                    "summary": "smf",
-                    "command": f"/openair-smf/bin/oai_smf -c {BASE_CONFIG_PATH}/{CONFIG_FILE_NAME} -o",  # noqa: E501
-                    "startup": "enabled",
+                    "level": "ready",
+                    "period": f"{HEALTH_CHECK_PERIOD}s",
+                    "tcp": {"port": int(self._config_sbi_interface_port)},
                 }
             },
         }
 
 
+def dispatch() -> None:
+    """Dispatches the current hook to the charm, in a span.
+
+    Returns:
+        None
+    """
+    with tracing.root_span(
+        "dispatch", **{"juju.dispatch_path": os.environ.get("JUJU_DISPATCH_PATH", "")}
+    ):
+        main(Oai5GSMFOperatorCharm)
+    tracing.shutdown()
+
+
 if __name__ == "__main__":
-    main(Oai5GSMFOperatorCharm)
+    dispatch()
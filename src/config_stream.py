@@ -0,0 +1,71 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""File-like adapter streaming rendered config chunks into a Pebble push."""
+
+import hashlib
+from typing import Iterable, Iterator
+
+READ_CHUNK_SIZE = 65536
+
+
+class ConfigStream:
+    """Readable binary file-like object over an iterable of text chunks.
+
+    Chunks are only pulled from the iterable when read, so a template rendered with
+    `Template.generate()` is never materialized as a whole. The SHA-256 digest of the
+    content is computed as it is read.
+    """
+
+    def __init__(self, chunks: Iterable[str], encoding: str = "utf-8"):
+        """Init.
+
+        Args:
+            chunks: Text chunks, typically from `Template.generate()`
+            encoding: Encoding of the produced bytes
+        """
+        self._chunks: Iterator[str] = iter(chunks)
+        self._encoding = encoding
+        self._buffer = bytearray()
+        self._sha256 = hashlib.sha256()
+        self._exhausted = False
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to size bytes, or everything left when size is negative.
+
+        Args:
+            size: Maximum number of bytes to read
+
+        Returns:
+            bytes: Content read, empty once the chunks are exhausted
+        """
+        while not self._exhausted and (size < 0 or len(self._buffer) < size):
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+                break
+            data = chunk.encode(self._encoding)
+            self._sha256.update(data)
+            self.size += len(data)
+            self._buffer += data
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def hexdigest(self) -> str:
+        """Returns the SHA-256 digest of the whole content.
+
+        Content that was not read yet is consumed, so that the digest is always complete.
+
+        Returns:
+            str: Hexadecimal digest
+        """
+        while self.read(READ_CHUNK_SIZE):
+            pass
+        return self._sha256.hexdigest()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Charm entrypoint returning straight away for events that need no work.
+
+Importing the charm and building it costs far more than handling most events, so hooks
+are only dispatched to the charm when:
+    - the charm observes the event, or
+    - events deferred by earlier hooks are waiting to be re-emitted.
+
+The hooks the charm observes are stored by the last dispatch, along with whether
+update-status has anything to do. When it has not, update-status is still dispatched
+once the health of the workload, read straight from Pebble, differs from the one the
+last dispatch stored. The state is read straight from the ops SQLite storage, so
+neither ops nor the charm are imported on the fast path.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+STATE_FILE_NAME = ".unit-state.db"
+STORED_STATE_HANDLE = "Oai5GSMFOperatorCharm/StoredStateData[_stored]"
+OBSERVED_HOOKS = "observed_hooks"
+UPDATE_STATUS_HAS_WORK = "update_status_has_work"
+WORKLOAD_HEALTH = "workload_health"
+# Dispatched even when not observed by the charm version that stored the state
+ALWAYS_DISPATCHED_HOOKS = ("install", "upgrade-charm")
+PEBBLE_TIMEOUT = 1
+
+
+def needs_dispatch(dispatch_path: str, state_file: Path) -> bool:
+    """Returns whether a hook must be dispatched to the charm.
+
+    Args:
+        dispatch_path: JUJU_DISPATCH_PATH of the hook (e.g. hooks/update-status)
+        state_file: ops SQLite storage of the unit
+
+    Returns:
+        bool: Whether the charm has work to do for this hook
+    """
+    kind, _, name = dispatch_path.partition("/")
+    if kind != "hooks" or name in ALWAYS_DISPATCHED_HOOKS:
+        return True
+    if not state_file.exists():
+        return True
+    try:
+        with closing(sqlite3.connect(f"file:{state_file}?mode=ro", uri=True)) as db:
+            if db.execute("SELECT 1 FROM notice LIMIT 1").fetchone():
+                return True
+            stored_state = _load_snapshot(db, STORED_STATE_HANDLE)
+    except sqlite3.Error:
+        return True
+    if stored_state is None or not stored_state.get(OBSERVED_HOOKS):
+        return True
+    if name not in json.loads(stored_state[OBSERVED_HOOKS]):
+        return False
+    if name != "update-status" or stored_state.get(UPDATE_STATUS_HAS_WORK, True):
+        return True
+    if not (workload_health := stored_state.get(WORKLOAD_HEALTH)):
+        return False
+    return _workload_health_changed(json.loads(workload_health))
+
+
+def _workload_health_changed(stored_health: dict) -> bool:
+    """Returns whether the health of the workload differs from the stored one.
+
+    The services, checks and files of the stored health are read again from Pebble,
+    failing to read them counts as a change.
+
+    Args:
+        stored_health: Pebble socket of the workload container and state of its
+            services, checks and files, as returned by `workload_health.read`
+
+    Returns:
+        bool: Whether the workload health changed
+    """
+    import workload_health
+
+    try:
+        health = workload_health.read(
+            socket_path=stored_health["socket"],
+            services=stored_health["services"],
+            checks=stored_health["checks"],
+            files=stored_health["files"],
+            timeout=PEBBLE_TIMEOUT,
+        )
+    except (OSError, ValueError, KeyError, workload_health.PebbleError):
+        return True
+    return {"socket": stored_health["socket"], **health} != stored_health
+
+
+def _load_snapshot(db: sqlite3.Connection, handle_path: str) -> Optional[dict]:
+    row = db.execute("SELECT data FROM snapshot WHERE handle=?", (handle_path,)).fetchone()
+    return pickle.loads(row[0]) if row else None
+
+
+def main() -> None:
+    """Dispatches the hook to the charm unless it needs no work."""
+    charm_dir = Path(os.environ.get("JUJU_CHARM_DIR", Path(__file__).parent.parent))
+    if not needs_dispatch(os.environ.get("JUJU_DISPATCH_PATH", ""), charm_dir / STATE_FILE_NAME):
+        return
+    import charm
+
+    charm.dispatch()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Kubernetes resources managed by the charm, through lightkube."""
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+from lightkube import ApiError, Client
+from lightkube.models.core_v1 import (
+    ClientIPConfig,
+    PodSpec,
+    ResourceRequirements,
+    ServicePort,
+    ServiceSpec,
+    SessionAffinityConfig,
+)
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.apps_v1 import StatefulSet
+from lightkube.resources.core_v1 import ConfigMap, Service
+from lightkube.types import PatchType
+from lightkube.utils.quantity import parse_quantity
+
+logger = logging.getLogger(__name__)
+
+MANAGED_RESOURCES = ("cpu", "memory", "hugepages-2Mi", "hugepages-1Gi")
+SERVICE_SPEC_FIELDS = (
+    "type",
+    "selector",
+    "externalTrafficPolicy",
+    "sessionAffinity",
+    "sessionAffinityConfig",
+)
+
+
+class KubernetesClientError(Exception):
+    """Raised when a request to the Kubernetes API fails."""
+
+
+class KubernetesClient:
+    """Applies the Kubernetes resources of the charm in its namespace."""
+
+    def __init__(self, namespace: str, field_manager: str):
+        """Init.
+
+        Args:
+            namespace: Kubernetes namespace, the name of the Juju model
+            field_manager: Server-side apply field manager owning the applied fields
+        """
+        self.namespace = namespace
+        self.field_manager = field_manager
+        self._client = Client(namespace=namespace, field_manager=field_manager)
+
+    def apply_config_map_entry(
+        self, name: str, key: str, content: str, annotations: Dict[str, str]
+    ) -> None:
+        """Applies a single entry of a ConfigMap with server-side apply.
+
+        Entries and annotations applied by other field managers are left untouched, so
+        each unit can own its own entry of a shared ConfigMap.
+
+        Args:
+            name: ConfigMap name
+            key: ConfigMap entry
+            content: Content of the entry
+            annotations: Annotations owned by this field manager
+
+        Returns:
+            None
+        """
+        config_map = ConfigMap(
+            metadata=ObjectMeta(name=name, namespace=self.namespace, annotations=annotations),
+            data={key: content},
+        )
+        try:
+            self._client.apply(config_map, field_manager=self.field_manager, force=True)
+        except ApiError as e:
+            raise KubernetesClientError(_api_error_message(e, f"apply ConfigMap {name}"))
+        logger.info("Applied entry %s of ConfigMap %s", key, name)
+
+    def patch_workload_resources(
+        self,
+        statefulset_name: str,
+        container_name: str,
+        requests: Dict[str, str],
+        limits: Dict[str, str],
+        node_selector: Dict[str, str],
+        sysctls: Optional[Dict[str, str]] = None,
+        other_containers_resources: Optional[Dict[str, str]] = None,
+        config_map_name: Optional[str] = None,
+        config_map_mount_path: Optional[str] = None,
+    ) -> bool:
+        """Patches the compute resources, node selector, sysctls and mounts of a StatefulSet.
+
+        Resources of `MANAGED_RESOURCES` missing from requests or limits are removed. The
+        node selector keys set by the last call are kept in an annotation of the
+        StatefulSet, so that they are removed once dropped while the keys set by others
+        are left untouched. The pod template, which Kubernetes rolls out to every pod,
+        is only patched when it differs.
+
+        Args:
+            statefulset_name: StatefulSet name
+            container_name: Name of the container in the pod template
+            requests: Resource requests by resource name
+            limits: Resource limits by resource name
+            node_selector: Node labels the pods must be scheduled on
+            sysctls: Sysctls of the pods, replacing the live ones, left untouched when None
+            other_containers_resources: Requests and limits of every other container and
+                init container of the pod template, like the ones Juju adds for the charm,
+                left untouched when None
+            config_map_name: ConfigMap mounted in the container, none added when None
+            config_map_mount_path: Mount path of the ConfigMap in the container
+
+        Returns:
+            bool: Whether the StatefulSet was patched
+        """
+        try:
+            statefulset = self._client.get(StatefulSet, statefulset_name)
+        except ApiError as e:
+            raise KubernetesClientError(
+                _api_error_message(e, f"get StatefulSet {statefulset_name}")
+            )
+        annotation = f"{self.field_manager}/node-selector-keys"
+        annotations = statefulset.metadata.annotations or {}  # type: ignore[union-attr]
+        previous_keys = set(json.loads(annotations.get(annotation, "[]")))
+        pod_spec = statefulset.spec.template.spec  # type: ignore[union-attr]
+        live_node_selector = pod_spec.nodeSelector or {}  # type: ignore[union-attr]
+        security_context = pod_spec.securityContext  # type: ignore[union-attr]
+        live_sysctls = {
+            sysctl.name: sysctl.value
+            for sysctl in (security_context.sysctls if security_context else None) or []
+        }
+        resources = next(
+            (
+                container.resources
+                for container in pod_spec.containers  # type: ignore[union-attr]
+                if container.name == container_name
+            ),
+            None,
+        )
+        other_containers = {
+            field: [
+                container
+                for container in getattr(pod_spec, field) or []
+                if container.name != container_name
+            ]
+            for field in ("containers", "initContainers")
+        }
+        other_containers_match = other_containers_resources is None or all(
+            _guaranteed_resources_match(container.resources, other_containers_resources)
+            for containers in other_containers.values()
+            for container in containers
+        )
+        config_map_mounted = config_map_name is None or _mounts_config_map(
+            pod_spec,  # type: ignore[arg-type]
+            container_name,
+            config_map_name,
+            config_map_mount_path,
+        )
+        up_to_date = resources is not None and all(
+            [
+                _quantities_match(resources.requests, requests),
+                _quantities_match(resources.limits, limits),
+                previous_keys == set(node_selector),
+                all(live_node_selector.get(key) == value for key, value in node_selector.items()),
+                sysctls is None or live_sysctls == sysctls,
+                other_containers_match,
+                config_map_mounted,
+            ]
+        )
+        if up_to_date:
+            return False
+        patch: Dict = {
+            "metadata": {"annotations": {annotation: json.dumps(sorted(node_selector))}},
+            "spec": {
+                "template": {
+                    "spec": {
+                        "nodeSelector": {
+                            **{key: None for key in previous_keys - set(node_selector)},
+                            **node_selector,
+                        },
+                        "containers": [
+                            {
+                                "name": container_name,
+                                "resources": {
+                                    "requests": {
+                                        name: requests.get(name) for name in MANAGED_RESOURCES
+                                    },
+                                    "limits": {
+                                        name: limits.get(name) for name in MANAGED_RESOURCES
+                                    },
+                                },
+                            }
+                        ],
+                    }
+                }
+            },
+        }
+        if other_containers_resources is not None:
+            quantities = {name: other_containers_resources.get(name) for name in MANAGED_RESOURCES}
+            for field, containers in other_containers.items():
+                patch["spec"]["template"]["spec"].setdefault(field, []).extend(
+                    {
+                        "name": container.name,
+                        "resources": {"requests": quantities, "limits": quantities},
+                    }
+                    for container in containers
+                )
+        if config_map_name is not None:
+            patch["spec"]["template"]["spec"]["volumes"] = [
+                {"name": config_map_name, "configMap": {"name": config_map_name}}
+            ]
+            patch["spec"]["template"]["spec"]["containers"][0]["volumeMounts"] = [
+                {"name": config_map_name, "mountPath": config_map_mount_path}
+            ]
+        if sysctls is not None:
+            patch["spec"]["template"]["spec"]["securityContext"] = {
+                "sysctls": [
+                    {"name": name, "value": value} for name, value in sorted(sysctls.items())
+                ]
+            }
+        try:
+            self._client.patch(
+                StatefulSet, statefulset_name, patch, patch_type=PatchType.STRATEGIC
+            )
+        except ApiError as e:
+            raise KubernetesClientError(
+                _api_error_message(e, f"patch StatefulSet {statefulset_name}")
+            )
+        logger.info("Patched resources of StatefulSet %s", statefulset_name)
+        return True
+
+    def apply_service(
+        self,
+        name: str,
+        ports: List[ServicePort],
+        service_type: str = "ClusterIP",
+        selector: Optional[Dict[str, str]] = None,
+        external_traffic_policy: Optional[str] = None,
+        session_affinity_timeout: int = 0,
+    ) -> bool:
+        """Applies the spec of a Service with server-side apply, unless it already matches.
+
+        The live Service is only compared on the fields owned by the field manager, from
+        its managed fields, so an up-to-date Service costs a single GET. Fields and ports
+        set by others, like the placeholder port of the Service created by Juju, are left
+        untouched. Fields and ports applied before but not set anymore are removed by the
+        apply, as the field manager releases them.
+
+        Args:
+            name: Service name
+            ports: Desired ports, compared on name, port, protocol and targetPort
+            service_type: Service type
+            selector: Pod selector, left to the Service owner when None
+            external_traffic_policy: Cluster or Local, only for NodePort and LoadBalancer
+            session_affinity_timeout: ClientIP session affinity timeout in seconds, 0 for
+                no session affinity
+
+        Returns:
+            bool: Whether the Service was changed
+        """
+        spec = ServiceSpec(
+            ports=ports,
+            type=service_type,
+            selector=selector,
+            externalTrafficPolicy=external_traffic_policy,
+            sessionAffinity="ClientIP" if session_affinity_timeout else "None",
+        )
+        if session_affinity_timeout:
+            spec.sessionAffinityConfig = SessionAffinityConfig(
+                clientIP=ClientIPConfig(timeoutSeconds=session_affinity_timeout)
+            )
+        service = Service(metadata=ObjectMeta(name=name, namespace=self.namespace), spec=spec)
+        try:
+            live_service = self._client.get(Service, name)
+        except ApiError as e:
+            if e.status.code != 404:
+                raise KubernetesClientError(_api_error_message(e, f"get Service {name}"))
+        else:
+            if _owned_service_spec_matches(live_service, spec, self.field_manager):
+                return False
+        try:
+            self._client.apply(service, field_manager=self.field_manager, force=True)
+        except ApiError as e:
+            raise KubernetesClientError(_api_error_message(e, f"apply Service {name}"))
+        logger.info("Applied Service %s", name)
+        return True
+
+
+def _owned_service_spec_matches(
+    live_service: Service, desired_spec: ServiceSpec, field_manager: str
+) -> bool:
+    """Returns whether the fields of a live Service owned by a field manager are desired.
+
+    Fields of `SERVICE_SPEC_FIELDS` must match when desired, and not be owned when not.
+    Ports owned by the field manager must be the desired ones and match on the fields of
+    the desired ports, fields filled in by Kubernetes like nodePort are ignored.
+    """
+    owned = _applied_fields(live_service.metadata, field_manager).get("f:spec", {})
+    live = live_service.spec.to_dict() if live_service.spec else {}
+    desired = desired_spec.to_dict()
+    for field in SERVICE_SPEC_FIELDS:
+        if field in desired:
+            if live.get(field) != desired[field]:
+                return False
+        elif f"f:{field}" in owned:
+            return False
+    live_ports = {_port_key(port): port for port in live.get("ports") or []}
+    desired_ports = {_port_key(port): port for port in desired.get("ports") or []}
+    owned_ports = {
+        _port_key(json.loads(key.partition(":")[2]))
+        for key in owned.get("f:ports", {})
+        if key.startswith("k:")
+    }
+    if owned_ports - desired_ports.keys():
+        return False
+    return all(
+        _port_matches(live_ports.get(port_key), port) for port_key, port in desired_ports.items()
+    )
+
+
+def _port_matches(live_port: Optional[Dict], desired_port: Dict) -> bool:
+    return live_port is not None and all(
+        live_port.get(field) == value for field, value in desired_port.items()
+    )
+
+
+def _applied_fields(metadata: Optional[ObjectMeta], field_manager: str) -> Dict:
+    """Returns the fields applied by a field manager, in the FieldsV1 format."""
+    fields: Dict = {}
+    for entry in (metadata.managedFields if metadata else None) or []:
+        if entry.manager == field_manager and entry.operation == "Apply":
+            _merge_fields(fields, entry.fieldsV1 or {})
+    return fields
+
+
+def _merge_fields(fields: Dict, other: Dict) -> None:
+    for key, value in other.items():
+        _merge_fields(fields.setdefault(key, {}), value)
+
+
+def _quantities_match(live: Optional[Dict[str, str]], desired: Dict[str, str]) -> bool:
+    """Returns whether live resource quantities match the desired ones, in any notation."""
+    for name in MANAGED_RESOURCES:
+        live_value, desired_value = (live or {}).get(name), desired.get(name)
+        if live_value is None or desired_value is None:
+            if live_value != desired_value:
+                return False
+        elif parse_quantity(live_value) != parse_quantity(desired_value):
+            return False
+    return True
+
+
+def _guaranteed_resources_match(
+    live: Optional[ResourceRequirements], desired: Dict[str, str]
+) -> bool:
+    """Returns whether live requests and limits both match the desired quantities."""
+    return live is not None and all(
+        _quantities_match(quantities, desired) for quantities in (live.requests, live.limits)
+    )
+
+
+def _mounts_config_map(
+    pod_spec: PodSpec, container_name: str, config_map_name: str, mount_path: Optional[str]
+) -> bool:
+    """Returns whether a container of a pod spec mounts a ConfigMap at a given path."""
+    volume_names = {
+        volume.name
+        for volume in pod_spec.volumes or []
+        if volume.configMap and volume.configMap.name == config_map_name
+    }
+    return any(
+        mount.name in volume_names and mount.mountPath == mount_path
+        for container in pod_spec.containers
+        if container.name == container_name
+        for mount in container.volumeMounts or []
+    )
+
+
+def _port_key(port: Dict) -> tuple:
+    return port["port"], port.get("protocol", "TCP")
+
+
+def _api_error_message(error: ApiError, action: str) -> str:
+    if error.status.code == 403:
+        return f"Failed to {action}: `juju trust` this application"
+    return f"Failed to {action}: {error.status.message}"
@@ -0,0 +1,205 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Streaming import of local session management subscriptions.
+
+Subscriptions are read from a CSV file with a header row or from a JSON Lines file
+(one JSON object per line), using the field names of `FIELDS`. Only `sst` and `dnn` are
+required, the other fields default to the values used for the DNNs of the charm config.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import re
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 65536
+
+FIELDS = {
+    "sst": None,
+    "sd": "0xFFFFFF",
+    "dnn": None,
+    "session_type": "IPv4",
+    "ssc_mode": "1",
+    "qos_5qi": "9",
+    "priority_level": "1",
+    "arp_priority_level": "1",
+    "arp_preempt_cap": "NOT_PREEMPT",
+    "arp_preempt_vuln": "NOT_PREEMPTABLE",
+    "session_ambr_ul": "20Mbps",
+    "session_ambr_dl": "22Mbps",
+}
+
+_INTEGER_RANGES = {
+    "sst": (0, 255),
+    "ssc_mode": (1, 3),
+    "qos_5qi": (1, 255),
+    "priority_level": (1, 127),
+    "arp_priority_level": (1, 15),
+}
+_CHOICES = {
+    "session_type": ("IPv4", "IPv6", "IPv4v6"),
+    "arp_preempt_cap": ("NOT_PREEMPT", "MAY_PREEMPT"),
+    "arp_preempt_vuln": ("NOT_PREEMPTABLE", "PREEMPTABLE"),
+}
+_SD_PATTERN = re.compile(r"^(0x)?[0-9A-Fa-f]{1,6}$")
+_DNN_PATTERN = re.compile(r"^[A-Za-z0-9]([A-Za-z0-9.-]{0,98}[A-Za-z0-9])?$")
+_AMBR_PATTERN = re.compile(r"^[0-9]+(\.[0-9]+)?(bps|Kbps|Mbps|Gbps|Tbps)$")
+
+SubscriptionKey = Tuple[str, str, str]
+
+
+class SubscriptionImportError(Exception):
+    """Raised when a subscription file cannot be imported."""
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 digest of a file, read in chunks.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        str: Hexadecimal digest
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def read_subscriptions(path: str) -> Iterator[Dict[str, str]]:
+    """Reads and validates the subscriptions of a file, one at a time.
+
+    Args:
+        path: Path of a CSV or JSON Lines file
+
+    Yields:
+        dict: Subscription with every field of `FIELDS`
+
+    Raises:
+        SubscriptionImportError: If the file is malformed or a subscription is invalid
+    """
+    with open(path, newline="") as file:
+        first_line = file.readline()
+        file.seek(0)
+        if first_line.lstrip().startswith("{"):
+            rows = _json_lines_rows(file)
+        else:
+            rows = _csv_rows(file)
+        for line_number, row in rows:
+            try:
+                yield validate_subscription(row)
+            except ValueError as e:
+                raise SubscriptionImportError(f"Invalid subscription on line {line_number}: {e}")
+
+
+def unique_subscriptions(
+    subscriptions: Iterable[Dict[str, str]], excluded_keys: Iterable[SubscriptionKey] = ()
+) -> Iterator[Dict[str, str]]:
+    """Drops the subscriptions whose (SST, SD, DNN) was already seen.
+
+    Only the keys are kept in memory, not the subscriptions.
+
+    Args:
+        subscriptions: Validated subscriptions
+        excluded_keys: Keys of subscriptions defined elsewhere, which take precedence
+
+    Yields:
+        dict: First subscription for each (SST, SD, DNN)
+    """
+    seen: Set[SubscriptionKey] = set(excluded_keys)
+    duplicates = 0
+    for subscription in subscriptions:
+        key = subscription_key(subscription)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        yield subscription
+    if duplicates:
+        logger.info("Skipped %d duplicate local subscriptions", duplicates)
+
+
+def subscription_key(subscription: Dict[str, str]) -> SubscriptionKey:
+    """Returns the (SST, SD, DNN) identifying a subscription.
+
+    Args:
+        subscription: Validated subscription
+
+    Returns:
+        tuple: Normalized (SST, SD, DNN)
+    """
+    return (
+        str(int(subscription["sst"])),
+        f"{int(subscription['sd'], 16):06x}",
+        subscription["dnn"].lower(),
+    )
+
+
+def validate_subscription(row: Dict[str, object]) -> Dict[str, str]:
+    """Validates a subscription and fills in the default values.
+
+    Args:
+        row: Raw subscription
+
+    Returns:
+        dict: Subscription with every field of `FIELDS`
+
+    Raises:
+        ValueError: If a field is missing, unknown or invalid
+    """
+    unknown_fields = set(row) - set(FIELDS)
+    if unknown_fields:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown_fields))}")
+    subscription = {}
+    for name, default in FIELDS.items():
+        value = row.get(name)
+        value = default if value is None or str(value).strip() == "" else str(value).strip()
+        if value is None:
+            raise ValueError(f"missing {name}")
+        subscription[name] = value
+    _validate_values(subscription)
+    return subscription
+
+
+def _validate_values(subscription: Dict[str, str]) -> None:
+    for name, (minimum, maximum) in _INTEGER_RANGES.items():
+        if not subscription[name].isdigit() or not minimum <= int(subscription[name]) <= maximum:
+            raise ValueError(f"{name} must be an integer between {minimum} and {maximum}")
+    for name, choices in _CHOICES.items():
+        if subscription[name] not in choices:
+            raise ValueError(f"{name} must be one of {', '.join(choices)}")
+    if not _SD_PATTERN.match(subscription["sd"]):
+        raise ValueError("sd must be up to 6 hexadecimal digits")
+    if not _DNN_PATTERN.match(subscription["dnn"]):
+        raise ValueError("dnn must only contain letters, digits, dots and hyphens")
+    for name in ("session_ambr_ul", "session_ambr_dl"):
+        if not _AMBR_PATTERN.match(subscription[name]):
+            raise ValueError(f"{name} must be a bit rate such as 20Mbps")
+
+
+def _csv_rows(file) -> Iterator[Tuple[int, Dict[str, object]]]:
+    reader = csv.DictReader(file, skipinitialspace=True)
+    for row in reader:
+        if None in row:
+            raise SubscriptionImportError(f"Too many columns on line {reader.line_num}")
+        yield reader.line_num, dict(row)
+
+
+def _json_lines_rows(file) -> Iterator[Tuple[int, Dict[str, object]]]:
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise SubscriptionImportError(f"Invalid JSON on line {line_number}: {e.msg}")
+        if not isinstance(row, dict):
+            raise SubscriptionImportError(f"Expected a JSON object on line {line_number}")
+        yield line_number, row
@@ -0,0 +1,281 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Capacity, priority and load of the SMF NF profile, updated in the NRF.
+
+AMFs weight their selection of an SMF instance by the capacity and priority of its NF
+profile, and may use its load (3GPP TS 29.510, 6.1.6.2.2). oai_smf registers a fixed
+capacity and priority, with no config key to change them, so the profile of the
+instance of each unit is updated in the NRF with an NFUpdate JSON Patch
+(3GPP TS 29.510, 5.2.2.3) instead. The instance is found by its IPv4 address, as every
+unit registers the same FQDN.
+"""
+
+import json
+import re
+import urllib.error
+import urllib.request
+from http import HTTPStatus
+from typing import List, Optional
+
+MAX_CAPACITY = 65535
+MAX_PRIORITY = 65535
+MAX_LOAD = 100
+# 1 CPU weighs 100, the capacity oai_smf registers by default
+MILLICORES_PER_CAPACITY_UNIT = 10
+# CPU quota of a cgroup v2, seen from inside its container
+CGROUP_CPU_MAX_PATH = "/sys/fs/cgroup/cpu.max"
+
+_CPU_QUANTITY_PATTERN = re.compile(r"^([0-9]+(?:\.[0-9]+)?)(m?)$")
+_ACTIVE_SESSIONS_PATTERN = re.compile(r"^smf_pdu_sessions_active (\d+)$", re.MULTILINE)
+
+
+class NRFError(Exception):
+    """Raised when the NRF cannot be reached or answers with an error."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        """Init.
+
+        Args:
+            message: Error message
+            status: HTTP status of the NRF response, None when it could not be reached
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def parse_weight(value: str, maximum: int) -> int:
+    """Parses an NF profile capacity or priority.
+
+    Args:
+        value: Integer
+        maximum: Largest value allowed
+
+    Returns:
+        int: Value
+
+    Raises:
+        ValueError: If the value is not an integer between 0 and maximum
+    """
+    if not value.strip().isdigit() or int(value) > maximum:
+        raise ValueError(f"expected an integer from 0 to {maximum}, got {value!r}")
+    return int(value)
+
+
+def cpu_millicores(quantity: str) -> int:
+    """Returns the millicores of a Kubernetes CPU quantity.
+
+    Args:
+        quantity: CPU quantity, e.g. "2", "1.5" or "500m"
+
+    Returns:
+        int: Millicores
+
+    Raises:
+        ValueError: If the quantity is not a CPU quantity
+    """
+    match = _CPU_QUANTITY_PATTERN.match(quantity.strip())
+    if not match:
+        raise ValueError(f"invalid CPU quantity {quantity!r}")
+    value = float(match.group(1))
+    return int(value if match.group(2) else value * 1000)
+
+
+def cgroup_cpu_millicores(cpu_max: str) -> Optional[int]:
+    """Returns the millicores of the CPU quota of a cgroup v2.
+
+    Args:
+        cpu_max: Content of the cpu.max file of the cgroup, e.g. "200000 100000"
+
+    Returns:
+        int: Millicores, None when the cgroup has no quota
+
+    Raises:
+        ValueError: If the content is not a CPU quota and period
+    """
+    quota, _, period = cpu_max.strip().partition(" ")
+    if quota == "max":
+        return None
+    if not quota.isdigit() or not period.isdigit() or not int(period):
+        raise ValueError(f"invalid cgroup CPU quota {cpu_max!r}")
+    return int(quota) * 1000 // int(period)
+
+
+def cpu_list_size(cpus: str) -> int:
+    """Returns the number of CPUs of a taskset CPU list.
+
+    Args:
+        cpus: Valid CPU list, e.g. "0-3,8"
+
+    Returns:
+        int: Number of CPUs
+    """
+    size = 0
+    for cpu_range in cpus.split(","):
+        first, _, last = cpu_range.partition("-")
+        size += int(last or first) - int(first) + 1
+    return size
+
+
+def auto_capacity(millicores: int) -> int:
+    """Returns the capacity of an instance, proportional to its CPU allocation.
+
+    Args:
+        millicores: CPU allocated to the instance
+
+    Returns:
+        int: Capacity, 100 per CPU
+    """
+    return min(max(millicores // MILLICORES_PER_CAPACITY_UNIT, 1), MAX_CAPACITY)
+
+
+def load(active_sessions: int, session_capacity: int) -> int:
+    """Returns the load of an instance, as the percentage of its PDU sessions in use.
+
+    Args:
+        active_sessions: Established PDU sessions
+        session_capacity: PDU sessions the UE address pools can hold
+
+    Returns:
+        int: Load from 0 to 100
+    """
+    if session_capacity <= 0:
+        return MAX_LOAD
+    return min(round(active_sessions * MAX_LOAD / session_capacity), MAX_LOAD)
+
+
+def parse_active_sessions(metrics: str) -> Optional[int]:
+    """Returns the established PDU sessions of the metrics served by session_metrics.py.
+
+    Args:
+        metrics: Metrics in the Prometheus text format
+
+    Returns:
+        int: Established PDU sessions, None when the metric is missing
+    """
+    match = _ACTIVE_SESSIONS_PATTERN.search(metrics)
+    return int(match.group(1)) if match else None
+
+
+def fetch_active_sessions(metrics_url: str, timeout: float) -> Optional[int]:
+    """Returns the established PDU sessions served by session_metrics.py.
+
+    Args:
+        metrics_url: URL of the metrics
+        timeout: Seconds to wait for the response
+
+    Returns:
+        int: Established PDU sessions, None when the metrics cannot be read
+    """
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=timeout) as response:
+            return parse_active_sessions(response.read().decode())
+    except (urllib.error.URLError, OSError, UnicodeDecodeError):
+        return None
+
+
+def profile_operations(
+    profile: dict, capacity: int, priority: int, load: Optional[int]
+) -> List[dict]:
+    """Returns the JSON Patch operations setting the capacity, priority and load of a profile.
+
+    Args:
+        profile: NF profile registered in the NRF
+        capacity: Capacity
+        priority: Priority, lower values being preferred
+        load: Load, None to leave it as is
+
+    Returns:
+        list: Operations for the values that differ, empty when none does
+    """
+    values = {"capacity": capacity, "priority": priority}
+    if load is not None:
+        values["load"] = load
+    return [
+        {"op": "replace" if name in profile else "add", "path": f"/{name}", "value": value}
+        for name, value in values.items()
+        if profile.get(name) != value
+    ]
+
+
+def find_profile(nrf_url: str, nf_type: str, ipv4_address: str, timeout: float) -> Optional[dict]:
+    """Returns the NF profile registered in the NRF by an instance.
+
+    Args:
+        nrf_url: NF management API root of the NRF, e.g. http://nrf:80/nnrf-nfm/v1
+        nf_type: NF type, e.g. SMF
+        ipv4_address: IPv4 address of the instance
+        timeout: Seconds to wait for each NRF response
+
+    Returns:
+        dict: NF profile, None when no instance of the type has the address
+
+    Raises:
+        NRFError: If the NRF cannot be reached or answers with an error
+    """
+    instances = _request(f"{nrf_url}/nf-instances?nf-type={nf_type}", timeout)
+    for link in instances.get("_links", {}).get("item", []):
+        profile = _request(link["href"], timeout)
+        if ipv4_address in profile.get("ipv4Addresses", []):
+            return profile
+    return None
+
+
+def get_profile(nrf_url: str, instance_id: str, timeout: float) -> Optional[dict]:
+    """Returns the NF profile of an instance registered in the NRF.
+
+    Args:
+        nrf_url: NF management API root of the NRF
+        instance_id: NF instance ID
+        timeout: Seconds to wait for the NRF response
+
+    Returns:
+        dict: NF profile, None when the instance is not registered
+
+    Raises:
+        NRFError: If the NRF cannot be reached or answers with another error
+    """
+    try:
+        return _request(f"{nrf_url}/nf-instances/{instance_id}", timeout)
+    except NRFError as e:
+        if e.status == HTTPStatus.NOT_FOUND:
+            return None
+        raise
+
+
+def update_profile(nrf_url: str, instance_id: str, operations: List[dict], timeout: float) -> None:
+    """Applies JSON Patch operations to the NF profile of an instance.
+
+    Args:
+        nrf_url: NF management API root of the NRF
+        instance_id: NF instance ID
+        operations: JSON Patch operations
+        timeout: Seconds to wait for the NRF response
+
+    Raises:
+        NRFError: If the NRF cannot be reached or answers with an error
+    """
+    _request(
+        f"{nrf_url}/nf-instances/{instance_id}",
+        timeout,
+        method="PATCH",
+        body=json.dumps(operations).encode(),
+    )
+
+
+def _request(url: str, timeout: float, method: str = "GET", body: Optional[bytes] = None) -> dict:
+    """Sends a request to the NRF and returns its decoded JSON response, if any."""
+    request = urllib.request.Request(url, data=body, method=method)
+    if body is not None:
+        request.add_header("Content-Type", "application/json-patch+json")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content = response.read()
+    except urllib.error.HTTPError as e:
+        raise NRFError(f"{method} {url} failed: {e}", status=e.code)
+    except (urllib.error.URLError, OSError) as e:
+        raise NRFError(f"{method} {url} failed: {e}")
+    try:
+        return json.loads(content) if content else {}
+    except json.JSONDecodeError:
+        raise NRFError(f"{method} {url} returned invalid JSON")
@@ -0,0 +1,172 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Minimal PFCP Heartbeat client used to measure N4 round-trip latency towards UPFs."""
+
+import logging
+import math
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+PFCP_PORT = 8805
+PFCP_VERSION = 1
+HEARTBEAT_REQUEST = 1
+HEARTBEAT_RESPONSE = 2
+RECOVERY_TIME_STAMP_IE = 96
+NTP_EPOCH_OFFSET = 2208988800  # Seconds between 1900-01-01 (NTP epoch) and 1970-01-01
+
+
+def build_heartbeat_request(sequence_number: int, recovery_time_stamp: int) -> bytes:
+    """Builds a PFCP Heartbeat Request message.
+
+    Args:
+        sequence_number: 24 bits sequence number of the message
+        recovery_time_stamp: Recovery time stamp, in seconds since the NTP epoch
+
+    Returns:
+        bytes: Encoded PFCP message
+    """
+    recovery_time_stamp_ie = struct.pack(
+        "!HHI", RECOVERY_TIME_STAMP_IE, 4, recovery_time_stamp & 0xFFFFFFFF
+    )
+    body = struct.pack("!I", (sequence_number & 0xFFFFFF) << 8) + recovery_time_stamp_ie
+    header = struct.pack("!BBH", PFCP_VERSION << 5, HEARTBEAT_REQUEST, len(body))
+    return header + body
+
+
+def parse_heartbeat_response(message: bytes) -> Optional[int]:
+    """Returns the sequence number of a PFCP Heartbeat Response.
+
+    Args:
+        message: Datagram received from the UPF
+
+    Returns:
+        int: Sequence number of the response, None if the datagram is not a Heartbeat Response.
+    """
+    if len(message) < 8:
+        return None
+    flags, message_type, _ = struct.unpack("!BBH", message[:4])
+    if flags >> 5 != PFCP_VERSION or message_type != HEARTBEAT_RESPONSE:
+        return None
+    if flags & 0x01:  # SEID present, never the case for node related messages
+        return None
+    (sequence_and_spare,) = struct.unpack("!I", message[4:8])
+    return sequence_and_spare >> 8
+
+
+def percentile(values: List[float], rank: float) -> Optional[float]:
+    """Returns the nearest-rank percentile of a list of values.
+
+    Args:
+        values: Samples
+        rank: Percentile to compute, between 0 and 100
+
+    Returns:
+        float: Percentile value, None if there are no samples.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+@dataclass
+class ProbeResult:
+    """Result of a PFCP Heartbeat probe towards a single UPF."""
+
+    address: str
+    sent: int = 0
+    rtts: List[float] = field(default_factory=list)
+
+    @property
+    def received(self) -> int:
+        """Number of Heartbeat Responses received."""
+        return len(self.rtts)
+
+    @property
+    def loss_percent(self) -> float:
+        """Percentage of Heartbeat Requests left unanswered."""
+        if not self.sent:
+            return 0.0
+        return 100 * (self.sent - self.received) / self.sent
+
+    def summary(self) -> dict:
+        """Returns a summary of the probe with RTTs in milliseconds."""
+        summary = {
+            "address": self.address,
+            "sent": str(self.sent),
+            "received": str(self.received),
+            "loss-percent": f"{self.loss_percent:.1f}",
+        }
+        for name, rank in (("p50", 50), ("p90", 90), ("p99", 99)):
+            value = percentile(self.rtts, rank)
+            summary[f"rtt-{name}-ms"] = f"{value * 1000:.3f}" if value is not None else "n/a"
+        return summary
+
+
+def probe(
+    address: str,
+    iterations: int,
+    timeout: float,
+    port: int = PFCP_PORT,
+    interval: float = 0.1,
+    deadline: Optional[float] = None,
+) -> ProbeResult:
+    """Sends PFCP Heartbeat Requests to a UPF and times its responses.
+
+    Args:
+        address: UPF N4 address
+        iterations: Number of Heartbeat Requests to send
+        timeout: Seconds to wait for each Heartbeat Response
+        port: UPF PFCP port
+        interval: Seconds to wait between two Heartbeat Requests
+        deadline: `time.monotonic()` value after which no more requests are sent nor
+            responses waited for, None for no deadline
+
+    Returns:
+        ProbeResult: Round-trip times of the answered requests
+    """
+    result = ProbeResult(address=address)
+    recovery_time_stamp = int(time.time()) + NTP_EPOCH_OFFSET
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for sequence_number in range(1, iterations + 1):
+            if sequence_number > 1:
+                time.sleep(interval)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            request = build_heartbeat_request(sequence_number, recovery_time_stamp)
+            sent_at = time.monotonic()
+            try:
+                sock.sendto(request, (address, port))
+            except OSError as e:
+                logger.warning("Failed to send PFCP Heartbeat Request to %s: %s", address, e)
+                result.sent += 1
+                continue
+            result.sent += 1
+            if deadline is not None:
+                timeout = min(timeout, deadline - sent_at)
+            rtt = _wait_for_response(sock, sequence_number, sent_at, timeout)
+            if rtt is not None:
+                result.rtts.append(rtt)
+    return result
+
+
+def _wait_for_response(
+    sock: socket.socket, sequence_number: int, sent_at: float, timeout: float
+) -> Optional[float]:
+    deadline = sent_at + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        sock.settimeout(remaining)
+        try:
+            message, _ = sock.recvfrom(2048)
+        except (socket.timeout, OSError):
+            return None
+        if parse_heartbeat_response(message) == sequence_number:
+            return time.monotonic() - sent_at
+    return None
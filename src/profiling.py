@@ -0,0 +1,199 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Sampling of the workload stacks, folded into the collapsed format of flamegraph.pl.
+
+The profilers of the workload image are run through Pebble exec, by order of
+preference: perf samples at the requested frequency with little overhead, while eu-stack
+and gdb stop the process at each sample, so they are looped at a lower frequency. When
+none of them is installed or allowed to trace the process, the kernel wait channel of
+each thread is sampled from /proc instead, which needs no privilege and only shows where
+threads are blocked.
+"""
+
+import re
+from typing import Dict, Iterable, List
+
+PROFILER_PATHS = {
+    "perf": ("/usr/bin/perf", "/usr/local/bin/perf"),
+    "eu-stack": ("/usr/bin/eu-stack", "/usr/local/bin/eu-stack"),
+    "gdb": ("/usr/bin/gdb", "/usr/local/bin/gdb"),
+}
+FALLBACK_PROFILER = "proc"
+PROFILERS = (*PROFILER_PATHS, FALLBACK_PROFILER)
+MAX_LOOP_FREQUENCY = 10
+SAMPLE_SEPARATOR = "--"
+
+# Prints the PID of the running workload process, identified by its name
+PID_SCRIPT = (
+    'for p in /proc/[0-9]*; do [ "$(cat $p/comm 2>/dev/null)" = {name} ] '
+    "&& echo ${{p#/proc/}} && exit 0; done; exit 1"
+)
+_LOOP_SCRIPT = (
+    "i=0; while [ $i -lt {samples} ]; do {sample}; echo {separator}; sleep {interval}; "
+    "i=$((i+1)); done"
+)
+_SAMPLE_COMMANDS = {
+    "eu-stack": "{path} -p {pid} 2>/dev/null",
+    "gdb": (
+        "{path} -p {pid} -batch -nx -ex 'set pagination off' -ex 'thread apply all bt' "
+        "2>/dev/null"
+    ),
+    "proc": (
+        'for t in /proc/{pid}/task/*; do echo "$(cat $t/comm 2>/dev/null);'
+        '$(cat $t/wchan 2>/dev/null)"; done'
+    ),
+}
+_PERF_SCRIPT = (
+    "{path} record -q -F {frequency} -g -p {pid} -o {data} -- sleep {duration} "
+    ">/dev/null 2>&1 && {path} script -i {data} -F comm,ip,sym 2>/dev/null; "
+    "status=$?; rm -f {data}; exit $status"
+)
+
+_PERF_FRAME_PATTERN = re.compile(r"^\s+[0-9a-f]+\s+(.+?)(?:\+0x[0-9a-f]+)?$")
+_EU_STACK_FRAME_PATTERN = re.compile(r"^#\d+\s+0x[0-9a-f]+\s*(.*)$")
+_GDB_THREAD_PATTERN = re.compile(r'^Thread \d+ .*?(?:"(?P<name>[^"]*)")?\)?:$')
+_GDB_FRAME_PATTERN = re.compile(r"^#\d+\s+(?:0x[0-9a-f]+ in )?(\S+)")
+
+
+def profiler_script(
+    profiler: str, path: str, pid: str, duration: int, frequency: int, data_path: str
+) -> str:
+    """Returns the shell script sampling the stacks of a process.
+
+    Args:
+        profiler: Profiler of `PROFILERS`
+        path: Path of the profiler in the workload container, unused for the fallback
+        pid: PID of the process
+        duration: Seconds to sample for
+        frequency: Samples per second, capped at `MAX_LOOP_FREQUENCY` but for perf
+        data_path: Path perf records its samples to
+
+    Returns:
+        str: Script printing the samples to its standard output
+    """
+    if profiler == "perf":
+        return _PERF_SCRIPT.format(
+            path=path, frequency=frequency, pid=pid, data=data_path, duration=duration
+        )
+    frequency = min(frequency, MAX_LOOP_FREQUENCY)
+    return _LOOP_SCRIPT.format(
+        samples=duration * frequency,
+        sample=_SAMPLE_COMMANDS[profiler].format(path=path, pid=pid),
+        separator=SAMPLE_SEPARATOR,
+        interval=round(1 / frequency, 3),
+    )
+
+
+def parse_samples(profiler: str, output: str, process_name: str) -> List[List[str]]:
+    """Parses the output of a profiler script into stacks.
+
+    Args:
+        profiler: Profiler of `PROFILERS`
+        output: Standard output of `profiler_script`
+        process_name: Name of the process, the root frame of every stack
+
+    Returns:
+        list: Frames of each sampled thread stack, from the root to the leaf
+    """
+    parsers = {
+        "perf": _parse_perf,
+        "eu-stack": _parse_eu_stack,
+        "gdb": _parse_gdb,
+        "proc": _parse_proc,
+    }
+    return [[process_name, *stack] for stack in parsers[profiler](output.splitlines())]
+
+
+def fold(stacks: Iterable[List[str]]) -> Dict[str, int]:
+    """Counts identical stacks.
+
+    Args:
+        stacks: Frames of each stack, from the root to the leaf
+
+    Returns:
+        dict: Number of samples by stack, frames separated by semicolons
+    """
+    folded: Dict[str, int] = {}
+    for stack in stacks:
+        key = ";".join(frame.replace(";", ":") for frame in stack)
+        folded[key] = folded.get(key, 0) + 1
+    return folded
+
+
+def collapsed(folded: Dict[str, int]) -> str:
+    """Returns folded stacks in the collapsed format, most sampled first.
+
+    Args:
+        folded: Number of samples by stack
+
+    Returns:
+        str: One "frame;frame;... count" line per stack
+    """
+    return "".join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(folded.items(), key=lambda item: (-item[1], item[0]))
+    )
+
+
+def _parse_perf(lines: List[str]) -> List[List[str]]:
+    """Parses `perf script` samples: a thread name line, then indented frames from the leaf."""
+    stacks = []
+    thread = ""
+    frames: List[str] = []
+    for line in [*lines, ""]:
+        match = _PERF_FRAME_PATTERN.match(line)
+        if match:
+            frames.append(match.group(1))
+            continue
+        if frames:
+            stacks.append([thread, *frames[::-1]] if thread else frames[::-1])
+            frames = []
+        if line.strip():
+            thread = line.strip()
+    return stacks
+
+
+def _parse_eu_stack(lines: List[str]) -> List[List[str]]:
+    """Parses eu-stack samples: a TID line per thread, then frames from the leaf."""
+    stacks = []
+    frames: List[str] = []
+    for line in [*lines, SAMPLE_SEPARATOR]:
+        match = _EU_STACK_FRAME_PATTERN.match(line)
+        if match:
+            frames.append(match.group(1).split(" - ")[0].strip() or "[unknown]")
+        elif frames and (line.startswith("TID") or line == SAMPLE_SEPARATOR):
+            stacks.append(frames[::-1])
+            frames = []
+    return stacks
+
+
+def _parse_gdb(lines: List[str]) -> List[List[str]]:
+    """Parses gdb backtraces: a Thread line per thread, then frames from the leaf."""
+    stacks = []
+    thread = ""
+    frames: List[str] = []
+    for line in [*lines, SAMPLE_SEPARATOR]:
+        thread_match = _GDB_THREAD_PATTERN.match(line)
+        frame_match = _GDB_FRAME_PATTERN.match(line)
+        if frame_match:
+            frames.append(frame_match.group(1))
+            continue
+        if frames and (thread_match or line == SAMPLE_SEPARATOR):
+            stacks.append([thread, *frames[::-1]] if thread else frames[::-1])
+            frames = []
+        if thread_match:
+            thread = thread_match.group("name") or ""
+    return stacks
+
+
+def _parse_proc(lines: List[str]) -> List[List[str]]:
+    """Parses "thread;wchan" lines, a wait channel of 0 meaning the thread is running."""
+    stacks = []
+    for line in lines:
+        thread, separator, wchan = line.partition(";")
+        if not separator:
+            continue
+        wchan = wchan.strip()
+        stacks.append([thread.strip(), "[running]" if wchan in ("", "0") else f"[kernel] {wchan}"])
+    return stacks
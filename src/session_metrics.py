@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""PDU session setup metrics derived from the oai_smf log, served in Prometheus format.
+
+The charm pushes this script into the workload container and runs it as a Pebble service
+reading `pebble logs --follow smf` on its standard input. Session establishment requests
+are correlated with their accept, reject or release by SUPI and PDU session ID. Memory
+stays bounded whatever the session rate: pending sessions and failure causes are capped,
+and latencies only land in histogram buckets. The histogram is cumulative, latencies over a
+window are left to PromQL, e.g. `histogram_quantile(0.99,
+rate(smf_pdu_session_setup_seconds_bucket[5m]))`.
+
+Only the Python standard library is used, as the script runs with the Python of the
+workload image.
+"""
+
+import argparse
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_PENDING_SESSIONS = 10000
+MAX_FAILURE_CAUSES = 32
+PENDING_SESSION_TIMEOUT = 30.0
+
+_SESSION = r"SUPI[ :]*(?P<supi>[\w-]+)\D+?PDU Session ID[ :]*(?P<pdu_session_id>\d+)"
+PATTERNS = {
+    "request": re.compile(r"PDU Session Create SM Context Request.*?" + _SESSION),
+    "accept": re.compile(r"PDU Session Establishment Accept.*?" + _SESSION),
+    "reject": re.compile(
+        r"PDU Session Establishment Reject.*?" + _SESSION + r"(?:.*?[Cc]ause[ :=]*(?P<cause>\w+))?"
+    ),
+    "release": re.compile(r"PDU Session Release.*?" + _SESSION),
+}
+# spdlog prefix of the oai_smf lines, e.g. [2022-11-10T10:21:33.123456]
+_SPDLOG_TIMESTAMP = re.compile(r"\[(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)\]")
+# Prefix of the lines printed by `pebble logs`, e.g. 2022-11-10T10:21:33.123Z [smf]
+_PEBBLE_TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)Z ")
+
+SessionKey = Tuple[str, str]
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets."""
+
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        """Init.
+
+        Args:
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds a value to the histogram.
+
+        Args:
+            value: Observed value
+        """
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets)
+        )
+        self.counts[index] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        """Returns the number of observations."""
+        return sum(self.counts)
+
+    def render(self, name: str) -> List[str]:
+        """Returns the Prometheus text lines of the histogram.
+
+        Args:
+            name: Metric name
+
+        Returns:
+            list: Bucket, sum and count samples
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*self.buckets, float("inf")], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {cumulative}")
+        return lines
+
+
+class SessionMetrics:
+    """Correlates the session events of the log and keeps the resulting metrics."""
+
+    def __init__(
+        self,
+        max_pending: int = MAX_PENDING_SESSIONS,
+        max_causes: int = MAX_FAILURE_CAUSES,
+        pending_timeout: float = PENDING_SESSION_TIMEOUT,
+    ):
+        """Init.
+
+        Args:
+            max_pending: Maximum number of sessions waiting for their accept or reject,
+                the oldest ones are counted as timed out beyond it
+            max_causes: Maximum number of distinct failure causes, others are counted as
+                "other"
+            pending_timeout: Seconds after which a pending session is counted as timed out
+        """
+        self.max_pending = max_pending
+        self.max_causes = max_causes
+        self.pending_timeout = pending_timeout
+        self.pending: "OrderedDict[SessionKey, float]" = OrderedDict()
+        self.active: Dict[SessionKey, None] = {}
+        self.setup_latency = Histogram()
+        self.failures: Dict[str, int] = {}
+        self.releases = 0
+        self.lock = threading.Lock()
+
+    def process_line(self, line: str, received_at: Optional[float] = None) -> None:
+        """Updates the metrics with a log line.
+
+        Args:
+            line: Line of the oai_smf log, possibly prefixed by `pebble logs`
+            received_at: Time the line was read, used when it has no timestamp
+        """
+        for event, pattern in PATTERNS.items():
+            match = pattern.search(line)
+            if match:
+                break
+        else:
+            return
+        timestamp = line_timestamp(line)
+        now = timestamp if timestamp is not None else received_at or time.time()
+        key = (match.group("supi"), match.group("pdu_session_id"))
+        with self.lock:
+            self._expire_pending(now)
+            if event == "request":
+                self._add_pending(key, now)
+            elif event == "accept":
+                self._complete(key, now)
+            elif event == "reject":
+                if self.pending.pop(key, None) is not None:
+                    self._count_failure(match.group("cause") or "unknown")
+            else:
+                self.pending.pop(key, None)
+                if self.active.pop(key, 0) is None:
+                    self.releases += 1
+
+    def _add_pending(self, key: SessionKey, now: float) -> None:
+        self.pending.pop(key, None)
+        self.pending[key] = now
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self._count_failure("timeout")
+
+    def _complete(self, key: SessionKey, now: float) -> None:
+        started_at = self.pending.pop(key, None)
+        if started_at is None:
+            return
+        latency = max(now - started_at, 0.0)
+        self.setup_latency.observe(latency)
+        self.active[key] = None
+        while len(self.active) > self.max_pending * 10:
+            self.active.pop(next(iter(self.active)))
+
+    def _expire_pending(self, now: float) -> None:
+        while self.pending:
+            key, started_at = next(iter(self.pending.items()))
+            if now - started_at <= self.pending_timeout:
+                return
+            del self.pending[key]
+            self._count_failure("timeout")
+
+    def _count_failure(self, cause: str) -> None:
+        if cause not in self.failures and len(self.failures) >= self.max_causes:
+            cause = "other"
+        self.failures[cause] = self.failures.get(cause, 0) + 1
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics
+        """
+        with self.lock:
+            lines = [
+                "# HELP smf_pdu_session_setup_seconds PDU session establishment latency.",
+                "# TYPE smf_pdu_session_setup_seconds histogram",
+                *self.setup_latency.render("smf_pdu_session_setup_seconds"),
+                "# HELP smf_pdu_session_setup_failures_total Failed PDU session "
+                "establishments by cause.",
+                "# TYPE smf_pdu_session_setup_failures_total counter",
+                *(
+                    f'smf_pdu_session_setup_failures_total{{cause="{cause}"}} {count}'
+                    for cause, count in sorted(self.failures.items())
+                ),
+                "# HELP smf_pdu_session_releases_total Released PDU sessions.",
+                "# TYPE smf_pdu_session_releases_total counter",
+                f"smf_pdu_session_releases_total {self.releases}",
+                "# HELP smf_pdu_sessions_pending PDU sessions waiting for establishment.",
+                "# TYPE smf_pdu_sessions_pending gauge",
+                f"smf_pdu_sessions_pending {len(self.pending)}",
+                "# HELP smf_pdu_sessions_active Established PDU sessions not released yet.",
+                "# TYPE smf_pdu_sessions_active gauge",
+                f"smf_pdu_sessions_active {len(self.active)}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def line_timestamp(line: str) -> Optional[float]:
+    """Returns the time a log line was written, from its spdlog or Pebble timestamp.
+
+    Args:
+        line: Log line
+
+    Returns:
+        float: Seconds since the epoch, None when the line has no timestamp
+    """
+    match = _SPDLOG_TIMESTAMP.search(line) or _PEBBLE_TIMESTAMP.search(line)
+    if not match:
+        return None
+    value = match.group(1)
+    seconds, _, fraction = value.partition(".")
+    try:
+        parsed = datetime.strptime(seconds, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return parsed.timestamp() + (float(f"0.{fraction}") if fraction else 0.0)
+
+
+def consume(stream: TextIO, metrics: SessionMetrics) -> None:
+    """Processes the lines of a stream until it ends.
+
+    Args:
+        stream: Log stream
+        metrics: Metrics to update
+    """
+    for line in stream:
+        metrics.process_line(line, received_at=time.time())
+
+
+def serve(metrics: SessionMetrics, port: int) -> ThreadingHTTPServer:
+    """Starts serving the metrics on /metrics, in a background thread.
+
+    Args:
+        metrics: Metrics to serve
+        port: TCP port
+
+    Returns:
+        ThreadingHTTPServer: Running server
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    """Serves the metrics of the log read on standard input."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9464)
+    arguments = parser.parse_args()
+    metrics = SessionMetrics()
+    serve(metrics, arguments.port)
+    consume(sys.stdin, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""OpenTelemetry tracing of the charm dispatches and reconcile phases.
+
+OpenTelemetry is only imported once an exporter is added, so that dispatches without
+tracing, like most update-status hooks, skip its import. Until then spans are not
+recorded, except for the root span, which starts retroactively at the time it was
+entered. See tests/benchmark/cold_start.py.
+"""
+
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SpanExporter
+    from opentelemetry.trace import Span, Tracer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SERVICE_NAME = "oai-5g-smf-operator"
+
+_provider: Optional["TracerProvider"] = None
+_tracer: Optional["Tracer"] = None
+_otlp_endpoint: Optional[str] = None
+_root: Optional["_RootSpan"] = None
+
+
+class _RootSpan:
+    """Root span of the process, started once tracing is set up, as of when it was entered."""
+
+    def __init__(self, name: str, attributes: Dict[str, str]):
+        """Init.
+
+        Args:
+            name: Span name
+            attributes: Span attributes
+        """
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self._span: Optional["Span"] = None
+        self._token: Optional[object] = None
+
+    def start(self, tracer: "Tracer") -> None:
+        """Starts the span and makes it current.
+
+        Args:
+            tracer: Tracer
+
+        Returns:
+            None
+        """
+        from opentelemetry import context, trace
+
+        self._span = tracer.start_span(
+            self.name, attributes=self.attributes, start_time=self.start_time
+        )
+        self._token = context.attach(trace.set_span_in_context(self._span))
+
+    def end(self) -> None:
+        """Ends the span, if started.
+
+        Returns:
+            None
+        """
+        if not self._span:
+            return
+        from opentelemetry import context
+
+        context.detach(self._token)  # type: ignore[arg-type]
+        self._span.end()
+
+
+def add_exporter(exporter: "SpanExporter", batch: bool = True) -> None:
+    """Exports the spans of this process with the given exporter.
+
+    Args:
+        exporter: Span exporter
+        batch: Whether spans are exported in batches or as soon as they end
+
+    Returns:
+        None
+    """
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _set_up().add_span_processor(processor)
+
+
+def _set_up() -> "TracerProvider":
+    """Returns the tracer provider of this process, creating it on first use."""
+    global _provider, _tracer
+    if _provider:
+        return _provider
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    _tracer = _provider.get_tracer(__name__)
+    if _root:
+        _root.start(_tracer)
+    return _provider
+
+
+def set_otlp_endpoint(endpoint: str) -> None:
+    """Exports the spans of this process to an OTLP/HTTP collector.
+
+    The root span, such as the dispatch span, is exported even when entered before the
+    endpoint is known.
+
+    Args:
+        endpoint: Base URL of the collector (e.g. http://collector:4318)
+
+    Returns:
+        None
+    """
+    global _otlp_endpoint
+    if _otlp_endpoint:
+        if _otlp_endpoint != endpoint:
+            logger.warning(
+                "OTLP endpoint already set to %s, ignoring %s", _otlp_endpoint, endpoint
+            )
+        return
+    # The exporter pulls in protobuf and requests, only import it when tracing is related
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+    _otlp_endpoint = endpoint
+    add_exporter(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces"))
+
+
+@contextmanager
+def span(name: str, **attributes: str) -> Iterator[Optional["Span"]]:
+    """Context manager starting a span, child of the current one if any.
+
+    Args:
+        name: Span name
+        attributes: Span attributes
+
+    Yields:
+        Span: The started span, None when tracing is not set up
+    """
+    if not _tracer:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current_span:
+        yield current_span
+
+
+@contextmanager
+def root_span(name: str, **attributes: str) -> Iterator[None]:
+    """Context manager of the root span of this process.
+
+    Unlike other spans, it is recorded when tracing is set up while it is open, with the
+    time it was entered as start time, so that it covers the whole dispatch.
+
+    Args:
+        name: Span name
+        attributes: Span attributes
+
+    Yields:
+        None
+    """
+    global _root
+    _root = _RootSpan(name, attributes)
+    if _tracer:
+        _root.start(_tracer)
+    try:
+        yield
+    finally:
+        _root.end()
+        _root = None
+
+
+def iterated(name: str, items: Iterable[T], **attributes: str) -> Iterator[T]:
+    """Yields the items of a lazy iterable in a span covering their consumption.
+
+    The span is a child of the span current when this is called, and is not made current,
+    as the consumer runs its own spans between items. It starts when the first item is
+    requested and ends when the items are exhausted or no longer consumed. The time spent
+    producing the items, without the consumer's, is recorded as its busy_ms attribute.
+
+    Args:
+        name: Span name
+        items: Lazy iterable, e.g. a generator
+        attributes: Span attributes
+
+    Returns:
+        Iterator: The items
+    """
+    if not _tracer:
+        return iter(items)
+    from opentelemetry import context
+
+    tracer, parent = _tracer, context.get_current()
+
+    def generate() -> Iterator[T]:
+        current_span = tracer.start_span(name, context=parent, attributes=attributes)
+        busy = 0.0
+        try:
+            iterator = iter(items)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    busy += time.perf_counter() - start
+                yield item
+        finally:
+            current_span.set_attribute("busy_ms", round(busy * 1000, 3))
+            current_span.end()
+
+    return generate()
+
+
+def traced(handler: Callable) -> Callable:
+    """Decorator wrapping a charm event handler in a span named after the event.
+
+    Args:
+        handler: Charm method observing an event
+
+    Returns:
+        Callable: Wrapped handler
+    """
+
+    @functools.wraps(handler)
+    def wrapper(charm, event):
+        with span(type(event).__name__, **{"juju.unit": charm.unit.name}):
+            return handler(charm, event)
+
+    return wrapper
+
+
+def shutdown() -> None:
+    """Flushes the pending spans to the exporters.
+
+    Returns:
+        None
+    """
+    if _provider:
+        _provider.shutdown()
@@ -0,0 +1,109 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""UPF list of the config file, in order, with the network instances of each UPF.
+
+Each entry names a UPF by FQDN or IPv4 address, and optionally its access and core
+network instances (NWI). oai_smf reads a single pair of network instances per UPF.
+
+oai_smf matches the DNN and S-NSSAI of a PDU session against the UPF profiles it
+discovers in the NRF, and otherwise takes the first associated UPF of the list, so the
+order of the entries is the only preference the charm can express.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+# Network instance rendered when none is configured, ignored by oai_smf
+UNSET_NETWORK_INSTANCE = "random"
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9]([A-Za-z0-9.-]*[A-Za-z0-9])?$")
+
+
+@dataclass(frozen=True)
+class Entry:
+    """UPF of the UPF list and its network instances."""
+
+    upf: str
+    domain_access: str = ""
+    domain_core: str = ""
+
+
+def parse_entries(value: str) -> List[Entry]:
+    """Parses comma-separated upf[:access-nwi:core-nwi] entries.
+
+    Args:
+        value: Entries, e.g. "upf-0.example.com:access:core,upf-1.example.com:access:core"
+
+    Returns:
+        list: Entries, in order
+
+    Raises:
+        ValueError: If an entry is malformed or repeated, or network instances are set on
+            some entries only
+    """
+    entries: List[Entry] = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        upf, *network_instances = (part.strip() for part in entry.split(":"))
+        if not _NAME_PATTERN.match(upf):
+            raise ValueError(f"invalid UPF in {entry.strip()!r}")
+        valid_network_instances = len(network_instances) == 2 and all(
+            _NAME_PATTERN.match(name) for name in network_instances
+        )
+        if network_instances and not valid_network_instances:
+            raise ValueError(f"expected access and core network instances in {entry.strip()!r}")
+        if any(existing.upf == upf for existing in entries):
+            raise ValueError(f"UPF {upf} is listed more than once")
+        entries.append(Entry(upf, *network_instances))
+    if len({bool(entry.domain_access) for entry in entries}) > 1:
+        raise ValueError("network instances must be set on every entry or on none")
+    return entries
+
+
+def upf_list(entries: List[Entry], upfs: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Returns the UPFs of the UPF list of the config file, with their network instances.
+
+    Args:
+        entries: Entries, the first UPF is listed alone when empty
+        upfs: IPv4 address and FQDN of each related UPF
+
+    Returns:
+        list: IPv4 address, FQDN, access and core network instances of each related UPF
+            of the entries, in the order of the entries
+    """
+    if not entries:
+        return [
+            {
+                **upf,
+                "domain_access": UNSET_NETWORK_INSTANCE,
+                "domain_core": UNSET_NETWORK_INSTANCE,
+            }
+            for upf in upfs[:1]
+        ]
+    listed: Dict[str, Dict[str, str]] = {}
+    for entry in entries:
+        upf = next((upf for upf in upfs if entry.upf in (upf["fqdn"], upf["ipv4_address"])), None)
+        if upf is not None and upf["ipv4_address"] not in listed:
+            listed[upf["ipv4_address"]] = {
+                **upf,
+                "domain_access": entry.domain_access or UNSET_NETWORK_INSTANCE,
+                "domain_core": entry.domain_core or UNSET_NETWORK_INSTANCE,
+            }
+    return list(listed.values())
+
+
+def related_upfs(entries: Iterable[Entry], upfs: List[Dict[str, str]]) -> List[str]:
+    """Returns the UPFs of the entries that are related.
+
+    Args:
+        entries: Entries
+        upfs: IPv4 address and FQDN of each related UPF
+
+    Returns:
+        list: UPFs, as named in the entries
+    """
+    names = {name for upf in upfs for name in (upf["fqdn"], upf["ipv4_address"])}
+    return [entry.upf for entry in entries if entry.upf in names]
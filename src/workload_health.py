@@ -0,0 +1,128 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Health of the workload read straight from the Pebble API of its container.
+
+src/dispatch.py compares it with the health stored by the charm to skip update-status
+while nothing changed, so it is read with the standard library only: importing ops
+would cost more than the hook it saves.
+"""
+
+import datetime
+import http.client
+import json
+import re
+import socket
+import urllib.parse
+from typing import Dict, Iterable, List
+
+_TIMESTAMP_PATTERN = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(Z|z|[+-]\d\d:\d\d)$")
+
+
+class PebbleError(Exception):
+    """Raised when Pebble answers with an error."""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection to a Unix socket."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        """Init.
+
+        Args:
+            socket_path: Path of the Unix socket
+            timeout: Socket timeout in seconds
+        """
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        """Connects to the Unix socket."""
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def read(
+    socket_path: str,
+    services: Iterable[str],
+    checks: Iterable[str],
+    files: Iterable[str],
+    timeout: float,
+) -> Dict[str, Dict]:
+    """Reads the state of services, checks and files from Pebble.
+
+    Args:
+        socket_path: Pebble socket of the workload container
+        services: Service names
+        checks: Check names
+        files: File paths
+        timeout: Timeout of each request in seconds
+
+    Returns:
+        dict: Current state by service, status by check and state by file, see
+            `file_state`
+
+    Raises:
+        OSError: If Pebble cannot be reached
+        PebbleError: If Pebble answers with an error
+    """
+    services, checks = list(services), list(checks)
+    connection = _UnixHTTPConnection(socket_path, timeout)
+    try:
+        return {
+            "services": (
+                {
+                    service["name"]: service["current"]
+                    for service in _get(connection, "/v1/services", names=",".join(services))
+                }
+                if services
+                else {}
+            ),
+            "checks": (
+                {
+                    check["name"]: check["status"]
+                    for check in _get(connection, "/v1/checks", names=",".join(checks))
+                }
+                if checks
+                else {}
+            ),
+            "files": {
+                path: file_state(info["size"], _parse_timestamp(info["last-modified"]))
+                for path in files
+                for info in _get(connection, "/v1/files", action="list", path=path, itself="true")
+            },
+        }
+    finally:
+        connection.close()
+
+
+def file_state(size: int, last_modified: datetime.datetime) -> List[int]:
+    """Returns the state of a file compared to tell whether it changed.
+
+    Args:
+        size: Size in bytes
+        last_modified: Modification time
+
+    Returns:
+        list: Size and modification time in whole seconds since the epoch
+    """
+    return [size, int(last_modified.timestamp())]
+
+
+def _get(connection: http.client.HTTPConnection, endpoint: str, **query: str) -> List[dict]:
+    connection.request("GET", f"{endpoint}?{urllib.parse.urlencode(query)}")
+    response = connection.getresponse()
+    body = json.loads(response.read())
+    if response.status != 200:
+        raise PebbleError(f"GET {endpoint} failed: {body.get('result', {}).get('message')}")
+    return body["result"]
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    """Parses the RFC 3339 timestamp of Go, the fraction of seconds left out."""
+    match = _TIMESTAMP_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"invalid timestamp {value!r}")
+    zone = "+00:00" if match.group(2) in ("Z", "z") else match.group(2)
+    return datetime.datetime.fromisoformat(match.group(1) + zone)
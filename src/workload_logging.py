@@ -0,0 +1,71 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Level filtering and rate limiting of the workload logs.
+
+oai_smf logs every spdlog level to stdout when started with -o, and has no option to
+raise its log level. Its output is instead piped through an awk program, which drops the
+lines below the configured level and caps the lines written per second, before Pebble
+stores and forwards them. Only POSIX awk features are used, as the workload image
+ships mawk.
+"""
+
+import shlex
+
+LOG_LEVELS = ("trace", "debug", "info", "warning", "error", "critical", "off")
+DROPPED_BATCH = 100
+
+# awk has no clock, but srand() returns the previous seed, which srand() sets to the time
+# of day in seconds. The lines kept are counted in batches of the rate limit, the clock
+# being read only when a batch starts and ends, and then once every DROPPED_BATCH dropped
+# lines: a batch may thus span several seconds, and a second up to twice the limit.
+_FILTER_PROGRAM = """\
+BEGIN {
+    minimum = %(minimum)d; cap = %(cap)d; dropped_batch = %(dropped_batch)d;
+    split("trace debug info warning error critical", names, " ");
+    for (i in names) rank[names[i]] = i;
+}
+function flush_dropped() {
+    if (dropped) print "[log-filter] dropped " dropped " lines over the rate limit";
+    dropped = 0;
+}
+{
+    level = 0;
+    if (match($0, /\\[(trace|debug|info|warning|error|critical)\\]/))
+        level = rank[substr($0, RSTART + 1, RLENGTH - 2)];
+    if (level && level < minimum) next;
+    if (cap) {
+        if (!count) { srand(); second = srand(); }
+        if (++count > cap) {
+            if (dropped %% dropped_batch == 0) { srand(); now = srand(); }
+            if (now == second) { dropped++; next; }
+            flush_dropped(); second = now; count = 1;
+        }
+    }
+    print; fflush();
+}
+END { flush_dropped(); }
+"""
+
+
+def log_filter(level: str, rate_limit: int) -> str:
+    """Returns the shell command filtering the workload logs.
+
+    Args:
+        level: Lowest level of `LOG_LEVELS` kept
+        rate_limit: Maximum number of lines written per second, in batches, 0 for no
+            limit
+
+    Returns:
+        str: awk command reading the logs from its standard input, empty when no line
+            would be dropped as the workload logs at debug level at most
+    """
+    minimum = LOG_LEVELS.index(level) + 1
+    if minimum <= LOG_LEVELS.index("debug") + 1 and not rate_limit:
+        return ""
+    program = _FILTER_PROGRAM % {
+        "minimum": minimum,
+        "cap": rate_limit,
+        "dropped_batch": DROPPED_BATCH,
+    }
+    return f"awk {shlex.quote(' '.join(line.strip() for line in program.splitlines()))}"
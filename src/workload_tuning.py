@@ -0,0 +1,257 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Kernel, resource limits, allocator and CPU affinity tuning of the workload.
+
+Sysctls are set on the pod securityContext, so only the sysctls Linux namespaces per pod
+can be set there: the others are left to the node, and only reported by the verify-tuning
+action. Resource limits are raised by the shell starting the workload, with ulimit,
+and the CPU affinity is set by taskset. The memory allocator is replaced by preloading
+jemalloc or tcmalloc, when the workload image ships them.
+"""
+
+import re
+import shlex
+from typing import Dict, List
+
+# Sysctls of the network namespace that pods can set. Many net.* sysctls, like
+# net.core.rmem_max, are not per namespace, and pods setting them fail to start.
+POD_NET_SYSCTLS = frozenset(
+    {
+        "net.core.somaxconn",
+        "net.ipv4.ip_forward",
+        "net.ipv4.ip_local_port_range",
+        "net.ipv4.ip_local_reserved_ports",
+        "net.ipv4.ip_unprivileged_port_start",
+        "net.ipv4.ping_group_range",
+        "net.ipv4.tcp_fin_timeout",
+        "net.ipv4.tcp_keepalive_intvl",
+        "net.ipv4.tcp_keepalive_probes",
+        "net.ipv4.tcp_keepalive_time",
+        "net.ipv4.tcp_max_syn_backlog",
+        "net.ipv4.tcp_rmem",
+        "net.ipv4.tcp_syncookies",
+        "net.ipv4.tcp_tw_reuse",
+        "net.ipv4.tcp_wmem",
+    }
+)
+# Sysctls of the IPC namespace, all of which pods can set
+POD_IPC_SYSCTL_PREFIXES = ("kernel.shm", "kernel.msg", "kernel.sem", "fs.mqueue.")
+RLIMITS = {
+    "nofile": ("-n", "Max open files"),
+    "nproc": ("-u", "Max processes"),
+}
+ALLOCATORS = ("glibc", "jemalloc", "tcmalloc")
+ALLOCATOR_LIBRARIES = {
+    "jemalloc": ("libjemalloc.so.2",),
+    "tcmalloc": ("libtcmalloc_minimal.so.4", "libtcmalloc.so.4"),
+}
+LIBRARY_DIRECTORIES = (
+    "/usr/lib/x86_64-linux-gnu",
+    "/usr/lib/aarch64-linux-gnu",
+    "/usr/lib",
+    "/usr/local/lib",
+)
+TASKSET_PATHS = ("/usr/bin/taskset", "/bin/taskset")
+# Prints the resource limits of the running workload process, identified by its name
+LIMITS_SCRIPT = (
+    'for p in /proc/[0-9]*; do [ "$(cat $p/comm 2>/dev/null)" = {name} ] '
+    "&& cat $p/limits && exit 0; done; exit 1"
+)
+
+_SYSCTL_NAME_PATTERN = re.compile(r"^[a-z][a-z0-9_]*(\.[a-z0-9_]+)+$")
+_ENVIRONMENT_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_CPU_LIST_PATTERN = re.compile(r"^[0-9]+(-[0-9]+)?(,[0-9]+(-[0-9]+)?)*$")
+_LIMITS_LINE_PATTERN = re.compile(r"^(Max [A-Za-z ]+?)\s{2,}(\S+)\s+(\S+)")
+
+
+def parse_settings(value: str) -> Dict[str, str]:
+    """Parses comma-separated name=value settings.
+
+    Args:
+        value: Settings, e.g. "net.core.rmem_max=8388608,net.core.wmem_max=8388608"
+
+    Returns:
+        dict: Values by name, whitespace trimmed
+
+    Raises:
+        ValueError: If a setting is not a name=value pair
+    """
+    settings = {}
+    for setting in value.split(","):
+        if not setting.strip():
+            continue
+        name, separator, setting_value = setting.partition("=")
+        if not separator or not name.strip() or not setting_value.strip():
+            raise ValueError(f"expected name=value, got {setting.strip()!r}")
+        settings[name.strip()] = " ".join(setting_value.split())
+    return settings
+
+
+def validate_sysctls(sysctls: Dict[str, str]) -> None:
+    """Validates sysctl names.
+
+    Args:
+        sysctls: Values by sysctl name
+
+    Raises:
+        ValueError: If a sysctl name is malformed
+    """
+    for name in sysctls:
+        if not _SYSCTL_NAME_PATTERN.match(name):
+            raise ValueError(f"invalid sysctl name {name!r}")
+
+
+def is_pod_sysctl(name: str) -> bool:
+    """Returns whether a sysctl is namespaced per pod, so that pods can set it.
+
+    Args:
+        name: Sysctl name
+
+    Returns:
+        bool: Whether the sysctl is in `POD_NET_SYSCTLS` or the IPC namespace
+    """
+    return name in POD_NET_SYSCTLS or name.startswith(POD_IPC_SYSCTL_PREFIXES)
+
+
+def pod_sysctls(sysctls: Dict[str, str]) -> Dict[str, str]:
+    """Returns the sysctls pods can set.
+
+    Args:
+        sysctls: Values by sysctl name
+
+    Returns:
+        dict: Values by name of the sysctls namespaced per pod, see `is_pod_sysctl`
+    """
+    return {name: value for name, value in sysctls.items() if is_pod_sysctl(name)}
+
+
+def validate_rlimits(rlimits: Dict[str, str]) -> None:
+    """Validates resource limits.
+
+    Args:
+        rlimits: Values by resource name of `RLIMITS`
+
+    Raises:
+        ValueError: If a resource is unknown or a value is not a positive integer
+    """
+    for name, value in rlimits.items():
+        if name not in RLIMITS:
+            raise ValueError(f"unknown rlimit {name!r}, expected one of {', '.join(RLIMITS)}")
+        if value != "unlimited" and (not value.isdigit() or int(value) == 0):
+            raise ValueError(f"{name} must be a positive integer or unlimited")
+
+
+def validate_environment(environment: Dict[str, str]) -> None:
+    """Validates environment variable names.
+
+    Args:
+        environment: Values by environment variable name
+
+    Raises:
+        ValueError: If a name is not a valid environment variable name
+    """
+    for name in environment:
+        if not _ENVIRONMENT_NAME_PATTERN.match(name):
+            raise ValueError(f"invalid environment variable name {name!r}")
+
+
+def validate_cpu_affinity(cpus: str) -> None:
+    """Validates a taskset CPU list.
+
+    Args:
+        cpus: CPU list, e.g. "0-3,8"
+
+    Raises:
+        ValueError: If the CPU list is malformed or a range is reversed
+    """
+    if not _CPU_LIST_PATTERN.match(cpus):
+        raise ValueError(f"expected a CPU list like 0-3,8, got {cpus!r}")
+    for cpu_range in cpus.split(","):
+        first, _, last = cpu_range.partition("-")
+        if last and int(last) < int(first):
+            raise ValueError(f"reversed CPU range {cpu_range}")
+
+
+def allocator_library_paths(allocator: str) -> List[str]:
+    """Returns the paths an allocator library is looked up at, by order of preference.
+
+    Args:
+        allocator: Allocator of `ALLOCATOR_LIBRARIES`
+
+    Returns:
+        list: Library paths
+    """
+    return [
+        f"{directory}/{library}"
+        for library in ALLOCATOR_LIBRARIES[allocator]
+        for directory in LIBRARY_DIRECTORIES
+    ]
+
+
+def taskset_command(command: str, cpus: str, taskset_path: str) -> str:
+    """Prefixes a command with taskset, pinning it to CPUs.
+
+    Args:
+        command: Command of the workload
+        cpus: CPU list, the command is returned as is when empty
+        taskset_path: Path of taskset in the workload container
+
+    Returns:
+        str: Command
+    """
+    if not cpus:
+        return command
+    return f"{taskset_path} -c {cpus} {command}"
+
+
+def shell_command(command: str, rlimits: Dict[str, str], output_filter: str = "") -> str:
+    """Wraps a command in a shell raising its resource limits and filtering its output.
+
+    Args:
+        command: Command of the workload
+        rlimits: Values by resource name of `RLIMITS`
+        output_filter: Shell command the standard output and error of the workload are
+            piped to
+
+    Returns:
+        str: Command, as is when there are neither resource limits nor output filter
+    """
+    if not rlimits and not output_filter:
+        return command
+    commands = [f"ulimit {RLIMITS[name][0]} {value}" for name, value in sorted(rlimits.items())]
+    script = " && ".join([*commands, f"exec {command}"])
+    if output_filter:
+        script = f"{script} 2>&1 | {output_filter}"
+    return f"/bin/sh -c {shlex.quote(script)}"
+
+
+def sysctl_path(name: str) -> str:
+    """Returns the procfs path of a sysctl.
+
+    Args:
+        name: Sysctl name, e.g. net.core.rmem_max
+
+    Returns:
+        str: Path, e.g. /proc/sys/net/core/rmem_max
+    """
+    return "/proc/sys/" + name.replace(".", "/")
+
+
+def parse_limits(limits: str) -> Dict[str, str]:
+    """Parses the soft resource limits of a /proc/<pid>/limits file.
+
+    Args:
+        limits: Content of the file
+
+    Returns:
+        dict: Soft limits by resource name of `RLIMITS`
+    """
+    soft_limits = {}
+    for line in limits.splitlines():
+        match = _LIMITS_LINE_PATTERN.match(line)
+        if match:
+            soft_limits[match.group(1)] = match.group(2)
+    return {
+        name: soft_limits[label] for name, (_, label) in RLIMITS.items() if label in soft_limits
+    }
@@ -0,0 +1,149 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Cold-start benchmark of the charm dispatch, per event type.
+
+Each event is dispatched under Harness in a fresh interpreter started with
+`python -X importtime`, the way Juju starts one process per hook. The import time is
+only accounted from the import of the charm module, so that ops.testing is left out.
+
+Usage:
+    PYTHONPATH=src:lib python tests/benchmark/cold_start.py [--event EVENT] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+EVENTS = ["update-status", "config-changed", "fiveg-nrf-relation-changed"]
+HEAVY_PACKAGES = ["jinja2", "lightkube", "opentelemetry"]
+DISPATCH_MARKER = "cold-start: dispatch"
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+RELATION_DATA = {
+    "fiveg-amf": {
+        "amf_ipv4_address": "1.2.3.4",
+        "amf_port": "80",
+        "amf_fqdn": "amf.example.com",
+        "amf_api_version": "v1",
+    },
+    "fiveg-upf": {"upf_ipv4_address": "1.2.3.5", "upf_fqdn": "upf.example.com"},
+    "fiveg-nrf": {
+        "nrf_ipv4_address": "1.2.3.6",
+        "nrf_port": "80",
+        "nrf_fqdn": "nrf.example.com",
+        "nrf_api_version": "v1",
+    },
+    "fiveg-udm": {
+        "udm_ipv4_address": "1.2.3.7",
+        "udm_port": "80",
+        "udm_fqdn": "udm.example.com",
+        "udm_api_version": "v1",
+    },
+}
+
+
+def dispatch(event: str) -> float:
+    """Imports the charm and dispatches an event under Harness.
+
+    Args:
+        event: Juju event name, one of `EVENTS`
+
+    Returns:
+        float: Seconds spent importing the charm, building it and handling the event
+    """
+    import ops.testing
+    from ops.testing import Harness
+
+    ops.testing.SIMULATE_CAN_CONNECT = True
+    print(DISPATCH_MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    from charm import Oai5GSMFOperatorCharm
+
+    harness = Harness(Oai5GSMFOperatorCharm)
+    relation_ids = {}
+    for relation_name, data in RELATION_DATA.items():
+        remote_app = relation_name.split("-")[1]
+        relation_ids[relation_name] = harness.add_relation(relation_name, remote_app)
+        harness.add_relation_unit(relation_ids[relation_name], f"{remote_app}/0")
+        harness.update_relation_data(relation_ids[relation_name], remote_app, data)
+    harness.begin()
+    harness.set_can_connect("smf", True)
+    if event.endswith("-relation-changed"):
+        relation_name = event[: -len("-relation-changed")]
+        relation = harness.model.get_relation(relation_name, relation_ids[relation_name])
+        harness.charm.on[relation_name].relation_changed.emit(relation, relation.app)
+    else:
+        getattr(harness.charm.on, event.replace("-", "_")).emit()
+    elapsed = time.perf_counter() - start
+    harness.cleanup()
+    return elapsed
+
+
+def measure(event: str) -> Dict[str, object]:
+    """Dispatches an event in a fresh interpreter and collects its import times.
+
+    Args:
+        event: Juju event name, one of `EVENTS`
+
+    Returns:
+        dict: Dispatch and import times in milliseconds and heavy packages imported
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--child", event],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ,
+    )
+    import_us = 0
+    heavy_imports: List[str] = []
+    dispatching = False
+    for line in process.stderr.splitlines():
+        if line == DISPATCH_MARKER:
+            dispatching = True
+            continue
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not dispatching or not match:
+            continue
+        import_us += int(match.group(1))
+        package = match.group(4)
+        if package in HEAVY_PACKAGES:
+            heavy_imports.append(package)
+    return {
+        "event": event,
+        "dispatch-ms": round(float(process.stdout) * 1000, 1),
+        "import-ms": round(import_us / 1000, 1),
+        "heavy-imports": sorted(heavy_imports),
+    }
+
+
+def main() -> None:
+    """Prints the cold-start times of the charm per event type."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--event", choices=EVENTS, action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(dispatch(args.child))
+        return
+    results = [measure(event) for event in args.event or EVENTS]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'event':<30}{'dispatch ms':>12}{'import ms':>12}  heavy imports")
+    for result in results:
+        print(
+            f"{result['event']:<30}{result['dispatch-ms']:>12}{result['import-ms']:>12}  "
+            f"{', '.join(result['heavy-imports']) or '-'}"  # type: ignore[arg-type]
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Fan-in benchmark of the relation handling, per number of related AMFs, UPFs and NRFs.
+
+For each fan-in, that many AMF, UPF and NRF applications, or units of a single
+application of each, are related under Harness in a fresh interpreter. A relation-changed
+event is then dispatched to a fresh charm, the way Juju runs each hook, after a warm-up
+dispatch so that the lazy imports are left out. The hook time, the number of relation-get
+calls and the peak memory allocated while handling the event are reported per fan-in,
+with the exponent of their growth between the smallest and the largest fan-in: 1 when
+they grow linearly with the fan-in, 2 when they grow quadratically.
+
+Usage:
+    PYTHONPATH=src:lib python tests/benchmark/fan_in.py [--fan-in N ...] [--layout LAYOUT]
+        [--json]
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+FAN_INS = [10, 100, 300]
+LAYOUTS = ["applications", "units"]
+METRICS = ["hook-ms", "relation-gets", "peak-kib"]
+NOISE_FLOOR = 0.2
+# Relation-changed events are dispatched on the last relation added
+DISPATCHED_RELATION = "fiveg-upf"
+
+
+def _relation_data(relation_name: str, index: int) -> Dict[str, str]:
+    """Returns the application data of the nth provider of a relation, in the v1 format."""
+    address = f"10.{index // 256 % 256}.{index % 256}"
+    if relation_name == "fiveg-amf":
+        key, entry = "amfs", {"ipv4_address": f"{address}.1", "port": 80, "api_version": "v1"}
+    elif relation_name == "fiveg-nrf":
+        key, entry = "nrfs", {"ipv4_address": f"{address}.2", "port": 80, "api_version": "v1"}
+    elif relation_name == "fiveg-udm":
+        key, entry = "udms", {"ipv4_address": f"{address}.3", "port": 80, "api_version": "v1"}
+    else:
+        key, entry = "upfs", {"ipv4_address": f"{address}.4"}
+    entry["fqdn"] = f"{relation_name[len('fiveg-'):]}-{index}.example.com"
+    data_key = relation_name.replace("-", "_")
+    return {data_key: json.dumps({"version": 1, key: [entry]})}
+
+
+def dispatch(fan_in: int, layout: str) -> Dict[str, float]:
+    """Relates the providers and dispatches a relation-changed event under Harness.
+
+    Args:
+        fan_in: Number of AMF, UPF and NRF applications or units
+        layout: "applications" for one unit per application, "units" for one application
+
+    Returns:
+        dict: Hook time in milliseconds, relation-get calls and peak memory in KiB
+    """
+    import ops.testing
+    from ops.testing import Harness
+
+    from charm import Oai5GSMFOperatorCharm
+
+    ops.testing.SIMULATE_CAN_CONNECT = True
+    harness = Harness(Oai5GSMFOperatorCharm)
+    harness.set_leader(False)
+    relation_id = 0
+    for relation_name in ("fiveg-udm", "fiveg-amf", "fiveg-nrf", "fiveg-upf"):
+        remote_app = relation_name.split("-")[1]
+        applications = 1 if layout == "units" or relation_name == "fiveg-udm" else fan_in
+        units = fan_in if layout == "units" and relation_name != "fiveg-udm" else 1
+        for index in range(applications):
+            app_name = f"{remote_app}-{index}"
+            relation_id = harness.add_relation(relation_name, app_name)
+            for unit in range(units):
+                harness.add_relation_unit(relation_id, f"{app_name}/{unit}")
+            harness.update_relation_data(
+                relation_id, app_name, _relation_data(relation_name, index)
+            )
+    harness.begin()
+    harness.set_can_connect("smf", True)
+    # Harness cached the relation data it wrote, a hook starts with none
+    for relation_name in ("fiveg-udm", "fiveg-amf", "fiveg-nrf", "fiveg-upf"):
+        harness.model.relations._invalidate(relation_name)
+    relation_gets = 0
+    relation_get = harness._backend.relation_get
+
+    def counted_relation_get(*args, **kwargs):
+        nonlocal relation_gets
+        relation_gets += 1
+        return relation_get(*args, **kwargs)
+
+    harness._backend.relation_get = counted_relation_get  # type: ignore[assignment]
+    relation = harness.model.get_relation(DISPATCHED_RELATION, relation_id)
+    tracemalloc.start()
+    start = time.perf_counter()
+    harness.charm.on[DISPATCHED_RELATION].relation_changed.emit(relation, relation.app)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    harness.cleanup()
+    return {
+        "hook-ms": round(elapsed * 1000, 1),
+        "relation-gets": relation_gets,
+        "peak-kib": round(peak / 1024, 1),
+    }
+
+
+def measure(fan_in: int, layout: str) -> Dict[str, Any]:
+    """Dispatches a relation-changed event in a fresh interpreter, after a warm-up one.
+
+    Args:
+        fan_in: Number of AMF, UPF and NRF applications or units
+        layout: One of `LAYOUTS`
+
+    Returns:
+        dict: Fan-in, layout and measured metrics
+    """
+    process = subprocess.run(
+        [sys.executable, __file__, "--child", str(fan_in), "--layout", layout],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ,
+    )
+    return {"fan-in": fan_in, "layout": layout, **json.loads(process.stdout)}
+
+
+def growth_exponents(results: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Returns the exponent of the growth of each metric with the fan-in.
+
+    The fixed cost of a hook would hide a quadratic term, so the growth is measured on the
+    increments over the smallest fan-in, between the middle and the largest fan-ins.
+    Increments smaller than `NOISE_FLOOR` of the smallest fan-in metric are rounded up to
+    it, as they are within the measurement noise.
+
+    Args:
+        results: Measurements of a layout, by increasing fan-in, at least 3
+
+    Returns:
+        dict: Exponent k of the metric increments ~ fan-in increments^k by metric
+    """
+    base, middle, last = results[0], results[len(results) // 2], results[-1]
+    fan_in_ratio = math.log(
+        (last["fan-in"] - base["fan-in"]) / (middle["fan-in"] - base["fan-in"])
+    )
+    exponents = {}
+    for metric in METRICS:
+        floor = max(base[metric] * NOISE_FLOOR, 1)
+        middle_increment = max(middle[metric] - base[metric], floor)
+        last_increment = max(last[metric] - base[metric], floor)
+        exponents[metric] = round(math.log(last_increment / middle_increment) / fan_in_ratio, 2)
+    return exponents
+
+
+def main() -> None:
+    """Prints the hook time, relation-get calls and peak memory per fan-in."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fan-in", type=int, action="append")
+    parser.add_argument("--layout", choices=LAYOUTS, action="append")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        layout = args.layout[0]
+        dispatch(1, layout)
+        print(json.dumps(dispatch(args.child, layout)))
+        return
+    fan_ins = sorted(set(args.fan_in or FAN_INS))
+    if len(fan_ins) < 3:
+        parser.error("at least 3 distinct fan-ins are needed to measure the growth")
+    reports: List[Dict[str, Any]] = []
+    for layout in args.layout or LAYOUTS:
+        results = [measure(fan_in, layout) for fan_in in fan_ins]
+        reports.append({"layout": layout, "results": results, "growth": growth_exponents(results)})
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    print(f"{'layout':<14}{'fan-in':>8}{'hook ms':>10}{'relation-gets':>15}{'peak KiB':>10}")
+    for report in reports:
+        for result in report["results"]:
+            print(
+                f"{report['layout']:<14}{result['fan-in']:>8}{result['hook-ms']:>10}"
+                f"{result['relation-gets']:>15}{result['peak-kib']:>10}"
+            )
+        growth = report["growth"]
+        print(
+            f"{report['layout']:<14}{'growth':>8}{growth['hook-ms']:>10}"
+            f"{growth['relation-gets']:>15}{growth['peak-kib']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
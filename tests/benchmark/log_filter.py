@@ -0,0 +1,95 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Cost of the workload log filter, per log level and rate limit.
+
+Lines in the oai_smf format, a third of them at debug level, are piped through the filter
+command of each setting and then through cat, the way oai_smf writes to the filter and
+Pebble reads from it. The best time of a few runs is reported per line, with the time of
+the same pipeline without the filter.
+
+Usage:
+    PYTHONPATH=src python tests/benchmark/log_filter.py [--lines N] [--json]
+"""
+
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from workload_logging import log_filter
+
+LINES = 200000
+RUNS = 3
+SETTINGS = [("info", 0), ("debug", 1000000000), ("info", 1000000000), ("info", 1000)]
+
+
+def log_lines(count: int) -> str:
+    """Returns log lines in the oai_smf format.
+
+    Args:
+        count: Number of lines
+
+    Returns:
+        str: Lines, a third of them at debug level and the others at info level
+    """
+    return "".join(
+        f"[2022-11-10T10:21:33.123456] [smf] [smf_app] [{'info' if index % 3 else 'debug'}] "
+        f"Handle PDU Session Create SM Context Request {index}\n"
+        for index in range(count)
+    )
+
+
+def measure(command: str, path: str) -> float:
+    """Returns the best time of piping a log file through a command and cat.
+
+    Args:
+        command: Shell command reading the logs from its standard input
+        path: Log file
+
+    Returns:
+        float: Seconds
+    """
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(["/bin/sh", "-c", f"{command} < {path} | cat > /dev/null"], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """Prints the time per line of each filter setting."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=LINES)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    with tempfile.NamedTemporaryFile("w", suffix=".log") as log_file:
+        log_file.write(log_lines(args.lines))
+        log_file.flush()
+        baseline = measure("cat", log_file.name)
+        results: List[Dict[str, Any]] = [
+            {
+                "log-level": level,
+                "rate-limit": rate_limit,
+                "us-per-line": round(
+                    (measure(log_filter(level, rate_limit), log_file.name) - baseline)
+                    / args.lines
+                    * 1e6,
+                    2,
+                ),
+            }
+            for level, rate_limit in SETTINGS
+        ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'log-level':<10}{'rate-limit':>12}{'us/line':>10}")
+    for result in results:
+        print(f"{result['log-level']:<10}{result['rate-limit']:>12}{result['us-per-line']:>10}")
+
+
+if __name__ == "__main__":
+    main()
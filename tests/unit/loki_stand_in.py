@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+"""Local stand-in for the Loki push API, receiving the logs Pebble forwards.
+
+Run it next to a deployment and point the log-forwarding-url config option at it:
+
+    python tests/unit/loki_stand_in.py --port 3100
+    juju config oai-5g-smf log-forwarding-url=http://<address>:3100/loki/api/v1/push
+
+Received lines are printed with their labels. Tests can also start it in a thread and
+read `LokiStandIn.entries`.
+"""
+
+import argparse
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+PUSH_PATH = "/loki/api/v1/push"
+
+
+class LokiStandIn(ThreadingHTTPServer):
+    """HTTP server accepting Loki push requests in JSON, as sent by Pebble."""
+
+    def __init__(self, address: str = "127.0.0.1", port: int = 0, verbose: bool = False):
+        """Init.
+
+        Args:
+            address: Address to listen on
+            port: Port to listen on, 0 for any free port
+            verbose: Whether received lines are printed
+        """
+        super().__init__((address, port), _PushHandler)
+        self.verbose = verbose
+        self.entries: List[Tuple[Dict[str, str], str]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Returns the push API URL of the stand-in."""
+        address, port = self.server_address[:2]
+        return f"http://{address}:{port}{PUSH_PATH}"
+
+    def record(self, payload: dict) -> None:
+        """Records the lines of a push request.
+
+        Args:
+            payload: Decoded push request
+        """
+        with self._lock:
+            for stream in payload.get("streams", []):
+                for _, line in stream.get("values", []):
+                    self.entries.append((stream.get("stream", {}), line))
+                    if self.verbose:
+                        print(stream.get("stream", {}), line, flush=True)
+
+
+class _PushHandler(BaseHTTPRequestHandler):
+    server: LokiStandIn
+
+    def do_POST(self):  # noqa: N802
+        if self.path != PUSH_PATH:
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            self.server.record(json.loads(body))
+        except (json.JSONDecodeError, ValueError, TypeError):
+            self.send_error(400, "Only JSON push requests are supported")
+            return
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--address", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=3100)
+    arguments = parser.parse_args()
+    server = LokiStandIn(address=arguments.address, port=arguments.port, verbose=True)
+    print(f"Listening on {server.url}", flush=True)
+    server.serve_forever()
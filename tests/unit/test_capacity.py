@@ -0,0 +1,57 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import unittest
+
+import capacity
+
+
+class TestCapacity(unittest.TestCase):
+    def test_given_range_spanning_subnets_when_ipv4_range_capacity_then_x_y_z_1_are_reserved(
+        self,
+    ):
+        self.assertEqual(capacity.ipv4_range_capacity("12.1.1.0 - 12.1.3.255"), 765)
+
+    def test_given_range_without_x_y_z_1_when_ipv4_range_capacity_then_all_addresses_count(
+        self,
+    ):
+        self.assertEqual(capacity.ipv4_range_capacity("12.1.1.2-12.1.1.40"), 39)
+
+    def test_given_reversed_range_when_ipv4_range_capacity_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            capacity.ipv4_range_capacity("12.1.1.40 - 12.1.1.2")
+
+    def test_given_prefixes_when_ipv6_prefix_capacity_then_delegated_64s_are_counted(self):
+        self.assertEqual(capacity.ipv6_prefix_capacity("2001:1:2::/48"), 65536)
+        self.assertEqual(capacity.ipv6_prefix_capacity("2001:1:2::/64"), 1)
+        self.assertEqual(capacity.ipv6_prefix_capacity("2001:1:2::/96"), 0)
+
+    def test_given_ipv4v6_dnn_when_session_capacity_then_smallest_pool_limits(self):
+        pool = capacity.DNNPool(
+            name="internet",
+            sst="1",
+            sd="1",
+            pdu_session_type="IPv4v6",
+            ipv4_range="12.1.1.2 - 12.1.1.40",
+            ipv6_prefix="2001:1:2::/60",
+        )
+
+        self.assertEqual(pool.session_capacity, 16)
+
+    def test_given_overlapping_ranges_when_overlapping_ipv4_ranges_then_pairs_are_returned(self):
+        pools = [
+            capacity.DNNPool("a", "1", "1", "IPv4", "12.1.1.2 - 12.1.1.40", "2001::/64"),
+            capacity.DNNPool("b", "1", "1", "IPv4", "12.1.1.41 - 12.1.1.80", "2001::/64"),
+            capacity.DNNPool("c", "1", "1", "IPv4", "12.1.1.30 - 12.1.1.50", "2001::/64"),
+        ]
+
+        self.assertEqual(capacity.overlapping_ipv4_ranges(pools), [("a", "c"), ("b", "c")])
+
+    def test_given_growth_when_hours_to_exhaustion_then_remaining_capacity_is_divided(self):
+        self.assertEqual(capacity.hours_to_exhaustion(100, 40, 20), 3.0)
+        self.assertIsNone(capacity.hours_to_exhaustion(100, 40, 0))
+        self.assertEqual(capacity.hours_to_exhaustion(100, 120, 0), 0.0)
+
+    def test_given_negative_count_when_parse_session_counts_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            capacity.parse_session_counts("internet=-1")
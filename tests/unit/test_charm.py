@@ -1,27 +1,106 @@
 # Copyright 2022 Guillaume Belanger
 # See LICENSE file for licensing details.
 
+import hashlib
+import json
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, PropertyMock, patch
 
 import ops.testing
-from ops.model import ActiveStatus
+import yaml
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
+from ops.pebble import CheckStatus, ExecError
 from ops.testing import Harness
 
-from charm import Oai5GSMFOperatorCharm
+import nf_profile
+import pfcp
+import tracing
+from charm import HEALTH_CHECK_PERIOD, Oai5GSMFOperatorCharm
+
+SPAN_EXPORTER = InMemorySpanExporter()
+tracing.add_exporter(SPAN_EXPORTER, batch=False)
 
 
 class TestCharm(unittest.TestCase):
-    @patch(
-        "charm.KubernetesServicePatch",
-        lambda charm, ports: None,
-    )
     def setUp(self):
+        kubernetes_client = patch("kubernetes_client.KubernetesClient")
+        self.patch_kubernetes_client = kubernetes_client.start()
+        self.addCleanup(kubernetes_client.stop)
         ops.testing.SIMULATE_CAN_CONNECT = True
         self.addCleanup(setattr, ops.testing, "SIMULATE_CAN_CONNECT", False)
         self.harness = Harness(Oai5GSMFOperatorCharm)
         self.addCleanup(self.harness.cleanup)
         self.harness.begin()
+        SPAN_EXPORTER.clear()
+
+    def test_given_leader_when_install_then_n4_and_sbi_services_are_applied(self):
+        self.harness.set_leader(True)
+
+        self.harness.charm.on.install.emit()
+
+        self.patch_kubernetes_client.assert_called_with(
+            namespace=self.harness.model.name, field_manager="oai-5g-smf"
+        )
+        apply_service = self.patch_kubernetes_client.return_value.apply_service
+        n4_call, sbi_call = apply_service.call_args_list[-2:]
+        self.assertEqual(n4_call.kwargs["name"], "oai-5g-smf")
+        self.assertEqual(
+            [(port.name, port.port, port.protocol) for port in n4_call.kwargs["ports"]],
+            [("oai-smf", 8805, "UDP")],
+        )
+        self.assertEqual(n4_call.kwargs["service_type"], "ClusterIP")
+        self.assertIsNone(n4_call.kwargs["external_traffic_policy"])
+        self.assertEqual(sbi_call.kwargs["name"], "oai-5g-smf-sbi")
+        self.assertEqual(
+            [(port.name, port.port, port.protocol) for port in sbi_call.kwargs["ports"]],
+            [("http1", 80, "TCP"), ("http2", 9090, "TCP")],
+        )
+        self.assertEqual(sbi_call.kwargs["selector"], {"app.kubernetes.io/name": "oai-5g-smf"})
+
+    def test_given_n4_service_config_when_config_changed_then_n4_service_policies_are_applied(
+        self,
+    ):
+        self.harness.set_leader(True)
+
+        self.harness.update_config(
+            {
+                "n4-service-type": "LoadBalancer",
+                "n4-external-traffic-policy": "Local",
+                "n4-session-affinity-timeout": 600,
+            }
+        )
+
+        n4_call = self.patch_kubernetes_client.return_value.apply_service.call_args_list[-2]
+        self.assertEqual(n4_call.kwargs["service_type"], "LoadBalancer")
+        self.assertEqual(n4_call.kwargs["external_traffic_policy"], "Local")
+        self.assertEqual(n4_call.kwargs["session_affinity_timeout"], 600)
+
+    def test_given_local_traffic_policy_with_cluster_ip_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        self.harness.set_leader(True)
+        self.patch_kubernetes_client.reset_mock()
+
+        self.harness.update_config({"n4-external-traffic-policy": "Local"})
+
+        self.patch_kubernetes_client.return_value.apply_service.assert_not_called()
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus(
+                "n4-external-traffic-policy Local requires a NodePort or LoadBalancer "
+                "n4-service-type"
+            ),
+        )
+
+    def test_given_non_leader_when_install_then_kubernetes_api_is_not_called(self):
+        self.harness.set_leader(False)
+
+        self.harness.charm.on.install.emit()
+        self.harness.update_config({"restart-batch-size": 2})
+
+        self.patch_kubernetes_client.assert_not_called()
 
     def _create_amf_relation_with_valid_data(self):
         relation_id = self.harness.add_relation("fiveg-amf", "amf")
@@ -99,6 +178,10 @@ class TestCharm(unittest.TestCase):
     def test_given_nrf_relation_contains_nrf_info_when_nrf_relation_joined_then_config_file_is_pushed(  # noqa: E501
         self, mock_push
     ):
+        pushed_contents = []
+        mock_push.side_effect = lambda path, source, make_dirs: pushed_contents.append(
+            source.read()
+        )
         self.harness.set_can_connect(container="smf", val=True)
         (
             amf_ipv4_address,
@@ -124,9 +207,12 @@ class TestCharm(unittest.TestCase):
             udm_fqdn,
         ) = self._create_udm_relation_with_valid_data()
 
-        mock_push.assert_called_with(
-            path="/openair-smf/etc/smf.conf",
-            source="################################################################################\n"  # noqa: E501, W505
+        kwargs = mock_push.call_args.kwargs
+        self.assertEqual(kwargs["path"], "/openair-smf/etc/smf.conf")
+        self.assertTrue(kwargs["make_dirs"])
+        self.assertEqual(
+            pushed_contents[-1].decode(),
+            "################################################################################\n"  # noqa: E501, W505
             "# Licensed to the OpenAirInterface (OAI) Software Alliance under one or more\n"
             "# contributor license agreements.  See the NOTICE file distributed with\n"
             "# this work for additional information regarding copyright ownership.\n"
@@ -148,7 +234,7 @@ class TestCharm(unittest.TestCase):
             "################################################################################\n\n"  # noqa: E501, W505
             "SMF =\n"
             "{\n"
-            '    FQDN          = "oai-5g-smf.None.svc.cluster.local";\n'
+            '    FQDN          = "oai-5g-smf-sbi.None.svc.cluster.local";\n'
             "    INSTANCE      = 0;         # 0 is the default\n"
             '    PID_DIRECTORY = "/var/run";  # /var/run is the default\n\n'
             "    INTERFACES :\n"
@@ -257,6 +343,1366 @@ class TestCharm(unittest.TestCase):
         self.harness.container_pebble_ready("smf")
         updated_plan = self.harness.get_container_pebble_plan("smf").to_dict()
         self.assertEqual(expected_plan, updated_plan)
+        self.assertEqual(
+            self.harness.charm._pebble_layer["checks"],
+            {
+                "smf-sbi": {
+                    "override": "replace",
+                    "level": "ready",
+                    "period": "5s",
+                    "tcp": {"port": 80},
+                }
+            },
+        )
+        service = self.harness.model.unit.get_container("smf").get_service("smf")
+        self.assertTrue(service.is_running())
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    @patch("pfcp.probe")
+    def test_given_upf_relation_when_probe_n4_action_then_results_are_set_per_upf(
+        self, patch_probe
+    ):
+        self._create_upf_relation_with_valid_data()
+        patch_probe.return_value = pfcp.ProbeResult(address="1.2.3.4", sent=2, rtts=[0.001])
+        event = Mock(params={"iterations": 2, "timeout": 1})
+
+        self.harness.charm._on_probe_n4_action(event=event)
+
+        patch_probe.assert_called_with(address="1.2.3.4", iterations=2, timeout=1.0, deadline=None)
+        event.set_results.assert_called_with(
+            {
+                "upf-0": {
+                    "address": "1.2.3.4",
+                    "sent": "2",
+                    "received": "1",
+                    "loss-percent": "50.0",
+                    "rtt-p50-ms": "1.000",
+                    "rtt-p90-ms": "1.000",
+                    "rtt-p99-ms": "1.000",
+                }
+            }
+        )
+
+    @patch("ops.model.Container.get_checks")
+    @patch("pfcp.probe")
+    def test_given_unanswered_upf_when_update_status_then_status_is_waiting_until_it_answers(
+        self, patch_probe, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self.harness.update_config({"probe-n4-on-update-status": True})
+        self._create_all_relations_with_valid_data()
+        patch_probe.return_value = pfcp.ProbeResult(address="1.2.3.4", sent=3)
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertIsNotNone(patch_probe.call_args.kwargs["deadline"])
+        self.assertEqual(
+            self.harness.model.unit.status,
+            WaitingStatus("No PFCP Heartbeat Response from UPFs: 1.2.3.4"),
+        )
+
+        patch_probe.return_value = pfcp.ProbeResult(address="1.2.3.4", sent=3, rtts=[0.001])
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_no_upf_relation_when_probe_n4_action_then_action_fails(self):
+        event = Mock(params={"iterations": 2, "timeout": 1})
+
+        self.harness.charm._on_probe_n4_action(event=event)
+
+        event.fail.assert_called_with("No UPF IPv4 address available in relation data")
+
+    @patch("ops.model.Container.push")
+    def test_given_relations_are_set_when_config_changed_then_reconcile_phases_are_traced(
+        self, patch_push
+    ):
+        patch_push.side_effect = lambda path, source, **kwargs: source.read()
+        self.harness.set_can_connect(container="smf", val=True)
+        self._create_amf_relation_with_valid_data()
+        self._create_upf_relation_with_valid_data()
+        self._create_nrf_relation_with_valid_data()
+        self._create_udm_relation_with_valid_data()
+        SPAN_EXPORTER.clear()
+
+        self.harness.update_config({"dnn-0-ni": "internet"})
+
+        spans = SPAN_EXPORTER.get_finished_spans()
+        root = spans[-1]
+        self.assertEqual(root.name, "ConfigChangedEvent")
+        self.assertEqual(
+            [span.name for span in spans[:-1]],
+            [
+                "relation-data-read",
+                "relation-data-read",
+                "relation-data-read",
+                "relation-data-read",
+                "template-render",
+                "pebble-push",
+                "pebble-layer-update",
+                "pebble-restart",
+            ],
+        )
+        self.assertTrue(all(span.parent.span_id == root.context.span_id for span in spans[:-1]))
+        render, push = spans[4], spans[5]
+        self.assertGreater(render.end_time, push.start_time)
+        self.assertLessEqual(render.end_time, push.end_time)
+        self.assertIn("busy_ms", render.attributes)
+
+    @patch("tracing.set_otlp_endpoint")
+    def test_given_tracing_relation_contains_endpoint_when_configure_tracing_then_otlp_endpoint_is_set(  # noqa: E501
+        self, patch_set_otlp_endpoint
+    ):
+        relation_id = self.harness.add_relation("tracing", "collector")
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="collector",
+            key_values={"endpoint": "http://collector:4318"},
+        )
+
+        self.harness.charm._configure_tracing()
+
+        patch_set_otlp_endpoint.assert_called_with("http://collector:4318")
+
+    def _create_all_relations_with_valid_data(self):
+        self.harness.set_can_connect(container="smf", val=True)
+        self._create_amf_relation_with_valid_data()
+        self._create_upf_relation_with_valid_data()
+        self._create_nrf_relation_with_valid_data()
+        self._create_udm_relation_with_valid_data()
+
+    def _pull(self, path):
+        return self.harness.model.unit.get_container("smf").pull(path).read()
+
+    def test_given_charm_when_built_then_interface_libraries_observe_relation_changed(self):
+        observers = {
+            (observer_path, event_kind)
+            for observer_path, _, _, event_kind in self.harness.framework._observers
+        }
+
+        for relation_name in ("fiveg-amf", "fiveg-upf", "fiveg-nrf", "fiveg-udm"):
+            self.assertTrue(
+                any(
+                    observer_path.endswith(f"[{relation_name}]")
+                    and event_kind == f"{relation_name.replace('-', '_')}_relation_changed"
+                    for observer_path, event_kind in observers
+                ),
+                relation_name,
+            )
+
+    def test_given_dispatch_span_when_spans_start_then_they_are_children_of_dispatch(self):
+        with tracing.root_span("dispatch"):
+            with tracing.span("relation-data-read"):
+                pass
+
+        child, root = SPAN_EXPORTER.get_finished_spans()
+        self.assertEqual(root.name, "dispatch")
+        self.assertEqual(child.parent.span_id, root.context.span_id)
+
+    def test_given_manual_apply_policy_when_config_changed_then_changes_are_staged(self):
+        self._create_all_relations_with_valid_data()
+        running_config = self._pull("/openair-smf/etc/smf.conf")
+
+        self.harness.update_config({"apply-policy": "manual", "dnn-0-ni": "internet"})
+
+        self.assertEqual(self._pull("/openair-smf/etc/smf.conf"), running_config)
+        self.assertIn('DNN_NI = "internet"', self._pull("/openair-smf/etc/smf.conf.pending"))
+        self.assertEqual(
+            self.harness.model.unit.status,
+            ActiveStatus("Config changes pending, run the apply-config action to apply them"),
+        )
+
+    def test_given_staged_changes_when_apply_config_action_then_changes_are_applied(self):
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"apply-policy": "manual", "dnn-0-ni": "internet"})
+        event = Mock(params={"dry-run": False})
+
+        self.harness.charm._on_apply_config_action(event=event)
+
+        self.assertIn('DNN_NI = "internet"', self._pull("/openair-smf/etc/smf.conf"))
+        container = self.harness.model.unit.get_container("smf")
+        self.assertFalse(container.exists("/openair-smf/etc/smf.conf.pending"))
+        results = event.set_results.call_args[0][0]
+        self.assertTrue(results["applied"])
+        self.assertIn('+      {DNN_NI = "internet"', results["diff"])
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_staged_changes_reverted_when_config_changed_then_staged_config_is_discarded(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"apply-policy": "manual", "dnn-0-ni": "internet"})
+
+        self.harness.update_config({"dnn-0-ni": "oai.ipv4"})
+
+        container = self.harness.model.unit.get_container("smf")
+        self.assertFalse(container.exists("/openair-smf/etc/smf.conf.pending"))
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_manual_apply_policy_when_only_workload_service_changes_then_change_is_staged_until_applied(  # noqa: E501
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"apply-policy": "manual"})
+
+        self.harness.update_config({"log-level": "off"})
+
+        plan = self.harness.get_container_pebble_plan("smf")
+        self.assertTrue(plan.services["smf"].command.endswith(" -o"))
+        self.assertEqual(
+            self.harness.model.unit.status,
+            ActiveStatus("Config changes pending, run the apply-config action to apply them"),
+        )
+        event = Mock(params={"dry-run": False})
+        self.harness.charm._on_apply_config_action(event=event)
+        results = event.set_results.call_args[0][0]
+        self.assertTrue(results["applied"])
+        self.assertIn(
+            "-command: /openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf -o", results["diff"]
+        )
+        plan = self.harness.get_container_pebble_plan("smf")
+        self.assertEqual(
+            plan.services["smf"].command, "/openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf"
+        )
+        self.harness.update_config({"log-level": "off"})
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_window_apply_policy_and_window_open_when_update_status_then_changes_are_applied(  # noqa: E501
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        with patch.object(
+            Oai5GSMFOperatorCharm, "_apply_window_is_open", new_callable=PropertyMock
+        ) as patch_window_is_open:
+            patch_window_is_open.return_value = False
+            self.harness.update_config({"apply-policy": "window", "dnn-0-ni": "internet"})
+            self.assertNotIn('DNN_NI = "internet"', self._pull("/openair-smf/etc/smf.conf"))
+
+            patch_window_is_open.return_value = True
+            self.harness.charm.on.update_status.emit()
+
+        self.assertIn('DNN_NI = "internet"', self._pull("/openair-smf/etc/smf.conf"))
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_invalid_apply_window_when_config_changed_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"apply-policy": "window", "apply-window": "tonight"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("Invalid apply-window, expected a UTC time range like 02:00-04:00"),
+        )
+
+    def _create_peer_relation(self, *remote_units):
+        relation_id = self.harness.add_relation("replicas", "oai-5g-smf")
+        for remote_unit in remote_units:
+            self.harness.add_relation_unit(relation_id=relation_id, remote_unit_name=remote_unit)
+        return relation_id
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_leader_with_peers_when_config_changed_then_workload_restarts_under_lock_without_waiting_for_checks(  # noqa: E501
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self.harness.set_leader(True)
+        relation_id = self._create_peer_relation("oai-5g-smf/1")
+
+        with patch("time.sleep") as patch_sleep:
+            self._create_all_relations_with_valid_data()
+
+        patch_sleep.assert_not_called()
         service = self.harness.model.unit.get_container("smf").get_service("smf")
         self.assertTrue(service.is_running())
+        unit_data = self.harness.get_relation_data(relation_id, "oai-5g-smf/0")
+        self.assertIn("restart-requested", unit_data)
+        self.assertEqual(
+            self.harness.model.unit.status,
+            MaintenanceStatus(
+                "Waiting for workload health checks to release rolling restart lock"
+            ),
+        )
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_restarted_workload_passing_checks_when_update_status_then_lock_is_released(
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self.harness.set_leader(True)
+        relation_id = self._create_peer_relation("oai-5g-smf/1")
+        self._create_all_relations_with_valid_data()
+        self.harness.charm._stored.restarted_at -= HEALTH_CHECK_PERIOD
+
+        self.harness.charm.on.update_status.emit()
+
+        unit_data = self.harness.get_relation_data(relation_id, "oai-5g-smf/0")
+        self.assertNotIn("restart-requested", unit_data)
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_lock_held_by_other_unit_when_config_changed_then_workload_is_not_restarted(
+        self,
+    ):
+        relation_id = self._create_peer_relation("oai-5g-smf/1")
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="oai-5g-smf",
+            key_values={"restart-granted": '["oai-5g-smf/1"]'},
+        )
+
+        self._create_all_relations_with_valid_data()
+
+        self.assertEqual(self.harness.get_container_pebble_plan("smf").to_dict(), {})
+        unit_data = self.harness.get_relation_data(relation_id, "oai-5g-smf/0")
+        self.assertIn("restart-requested", unit_data)
+        self.assertEqual(
+            self.harness.model.unit.status, MaintenanceStatus("Waiting for rolling restart lock")
+        )
+
+    def test_given_leader_and_units_requesting_restart_when_peer_relation_changed_then_lock_is_granted_to_batch(  # noqa: E501
+        self,
+    ):
+        self.harness.set_leader(True)
+        self.harness.update_config({"restart-batch-size": 2})
+        relation_id = self._create_peer_relation("oai-5g-smf/1", "oai-5g-smf/2", "oai-5g-smf/3")
+        for unit in ("oai-5g-smf/1", "oai-5g-smf/2", "oai-5g-smf/3"):
+            self.harness.update_relation_data(
+                relation_id=relation_id, app_or_unit=unit, key_values={"restart-requested": "1"}
+            )
+
+        app_data = self.harness.get_relation_data(relation_id, "oai-5g-smf")
+        self.assertEqual(app_data["restart-granted"], '["oai-5g-smf/1", "oai-5g-smf/2"]')
+
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="oai-5g-smf/1",
+            key_values={"restart-requested": ""},
+        )
+
+        app_data = self.harness.get_relation_data(relation_id, "oai-5g-smf")
+        self.assertEqual(app_data["restart-granted"], '["oai-5g-smf/2", "oai-5g-smf/3"]')
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_leader_releasing_its_lock_when_units_wait_then_lock_is_granted_to_next_unit(
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self.harness.set_leader(True)
+        relation_id = self._create_peer_relation("oai-5g-smf/1", "oai-5g-smf/2")
+        for unit in ("oai-5g-smf/1", "oai-5g-smf/2"):
+            self.harness.update_relation_data(
+                relation_id=relation_id, app_or_unit=unit, key_values={"restart-requested": "1"}
+            )
+        self._create_all_relations_with_valid_data()
+        app_data = self.harness.get_relation_data(relation_id, "oai-5g-smf")
+        self.assertEqual(app_data["restart-granted"], '["oai-5g-smf/1"]')
+
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="oai-5g-smf/1",
+            key_values={"restart-requested": ""},
+        )
+        self.assertEqual(app_data["restart-granted"], '["oai-5g-smf/0"]')
+        self.harness.charm._stored.restarted_at -= HEALTH_CHECK_PERIOD
+
+        self.harness.charm.on.update_status.emit()
+
+        unit_data = self.harness.get_relation_data(relation_id, "oai-5g-smf/0")
+        self.assertNotIn("restart-requested", unit_data)
+        self.assertEqual(app_data["restart-granted"], '["oai-5g-smf/2"]')
+
+    @patch("kubernetes_client.KubernetesClient")
+    def test_given_configmap_delivery_when_config_changed_then_config_is_applied_to_config_map_and_mounted(  # noqa: E501
+        self, patch_kubernetes_client
+    ):
+        container = self.harness.model.unit.get_container("smf")
+        client = patch_kubernetes_client.return_value
+        client.apply_config_map_entry.side_effect = lambda name, key, content, annotations: (
+            container.push(f"/openair-smf/etc-configmap/{key}", content, make_dirs=True)
+        )
+        self.harness.set_leader(True)
+        self.harness.update_config({"config-delivery": "configmap"})
+
+        self._create_all_relations_with_valid_data()
+
+        kwargs = client.apply_config_map_entry.call_args.kwargs
+        self.assertEqual(kwargs["name"], "oai-5g-smf-config")
+        self.assertEqual(kwargs["key"], "smf-0.conf")
+        self.assertEqual(
+            kwargs["annotations"],
+            {"oai-5g-smf/config-hash-0": hashlib.sha256(kwargs["content"].encode()).hexdigest()},
+        )
+        kwargs = client.patch_workload_resources.call_args.kwargs
+        self.assertEqual(kwargs["config_map_name"], "oai-5g-smf-config")
+        self.assertEqual(kwargs["config_map_mount_path"], "/openair-smf/etc-configmap")
+        self.assertEqual(
+            self.harness.get_container_pebble_plan("smf").services["smf"].command,
+            "/openair-smf/bin/oai_smf -c /openair-smf/etc-configmap/smf-0.conf -o",
+        )
+        self.assertFalse(container.exists("/openair-smf/etc/smf.conf"))
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    @patch("kubernetes_client.KubernetesClient")
+    def test_given_configmap_not_synced_when_config_changed_then_status_is_waiting(
+        self, patch_kubernetes_client
+    ):
+        self.harness.update_config({"config-delivery": "configmap"})
+
+        self._create_all_relations_with_valid_data()
+
+        patch_kubernetes_client.return_value.apply_config_map_entry.assert_called()
+        self.assertEqual(self.harness.get_container_pebble_plan("smf").to_dict(), {})
+        self.assertEqual(
+            self.harness.model.unit.status,
+            WaitingStatus("Waiting for ConfigMap to be synced in workload"),
+        )
+
+    @patch("kubernetes_client.KubernetesClient")
+    def test_given_configmap_synced_after_hook_when_deferred_event_is_reemitted_then_workload_starts(  # noqa: E501
+        self, patch_kubernetes_client
+    ):
+        client = patch_kubernetes_client.return_value
+        self.harness.update_config({"config-delivery": "configmap"})
+        with patch("time.sleep") as patch_sleep:
+            self._create_all_relations_with_valid_data()
+        patch_sleep.assert_not_called()
+        content = client.apply_config_map_entry.call_args.kwargs["content"]
+        self.harness.model.unit.get_container("smf").push(
+            "/openair-smf/etc-configmap/smf-0.conf", content, make_dirs=True
+        )
+        client.apply_config_map_entry.reset_mock()
+
+        self.harness.framework.reemit()
+
+        client.apply_config_map_entry.assert_not_called()
+        self.assertIn("smf", self.harness.get_container_pebble_plan("smf").services)
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_local_subscriptions_resource_when_config_changed_then_unique_subscriptions_are_rendered(  # noqa: E501
+        self,
+    ):
+        self.harness.add_resource(
+            "local-subscriptions",
+            "sst,sd,dnn,qos_5qi\n"
+            "1,0x000001,iot,5\n"
+            "1,1,IOT,9\n"
+            "1,1,oai.ipv4,9\n"
+            "2,0x000002,video,\n",
+        )
+
+        self._create_all_relations_with_valid_data()
+
+        config = self._pull("/openair-smf/etc/smf.conf")
+        self.assertEqual(config.count('DNN = "iot"'), 1)
+        self.assertEqual(config.count('DNN = "IOT"'), 0)
+        self.assertEqual(config.count('DNN = "oai.ipv4"'), 1)
+        self.assertIn(
+            '{ NSSAI_SST = 2, NSSAI_SD = "0x000002", DNN = "video", DEFAULT_SESSION_TYPE = "IPv4"',
+            config,
+        )
+        self.assertIn('SESSION_AMBR_DL = "22Mbps"}\n        );', config)
+
+    def test_given_unchanged_local_subscriptions_when_upgrade_charm_then_config_is_not_applied(
+        self,
+    ):
+        self.harness.add_resource("local-subscriptions", '{"sst": 1, "dnn": "iot"}\n')
+        self._create_all_relations_with_valid_data()
+
+        with patch.object(Oai5GSMFOperatorCharm, "_apply_config") as patch_apply_config:
+            self.harness.charm.on.upgrade_charm.emit()
+            resource_path = self.harness.model.resources.fetch("local-subscriptions")
+            resource_path.write_text('{"sst": 1, "dnn": "video"}\n')
+            self.harness.charm.on.upgrade_charm.emit()
+
+        patch_apply_config.assert_called_once()
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_invalid_local_subscriptions_when_config_changed_then_status_is_blocked(self):
+        self.harness.add_resource("local-subscriptions", "sst,dnn\n1,iot\n300,video\n")
+
+        self._create_all_relations_with_valid_data()
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus(
+                "Invalid local-subscriptions resource: Invalid subscription on line 3: "
+                "sst must be an integer between 0 and 255"
+            ),
+        )
+
+    def test_given_workload_not_planned_when_pre_commit_then_update_status_has_no_work(self):
+        self.harness.set_can_connect(container="smf", val=True)
+
+        self.harness.framework.on.pre_commit.emit()
+
+        self.assertFalse(self.harness.charm._stored.update_status_has_work)
+
+    def test_given_changes_waiting_for_apply_window_when_pre_commit_then_update_status_has_work(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        with patch.object(
+            Oai5GSMFOperatorCharm, "_apply_window_is_open", new_callable=PropertyMock
+        ) as patch_window_is_open:
+            patch_window_is_open.return_value = False
+            self.harness.update_config({"apply-policy": "window", "dnn-0-ni": "internet"})
+
+        self.harness.framework.on.pre_commit.emit()
+
+        self.assertTrue(self.harness.charm._stored.update_status_has_work)
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_healthy_workload_when_pre_commit_then_update_status_has_no_work_and_health_is_stored(  # noqa: E501
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self._create_all_relations_with_valid_data()
+
+        self.harness.framework.on.pre_commit.emit()
+
+        self.assertFalse(self.harness.charm._stored.update_status_has_work)
+        workload_health = json.loads(self.harness.charm._stored.workload_health)
+        self.assertEqual(workload_health["socket"], "/charm/containers/smf/pebble.socket")
+        self.assertEqual(workload_health["services"], {"smf": "active"})
+        self.assertEqual(workload_health["checks"], {"smf-sbi": "up"})
+        self.assertEqual(list(workload_health["files"]), ["/openair-smf/etc/smf.conf"])
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_failing_health_check_when_pre_commit_then_update_status_has_work(
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.DOWN)}
+        self._create_all_relations_with_valid_data()
+
+        self.harness.framework.on.pre_commit.emit()
+
+        self.assertTrue(self.harness.charm._stored.update_status_has_work)
+        self.assertEqual(self.harness.charm._stored.workload_health, "")
+
+    def test_given_charm_when_pre_commit_then_observed_hooks_are_stored(self):
+        self.harness.framework.on.pre_commit.emit()
+
+        observed_hooks = json.loads(self.harness.charm._stored.observed_hooks)
+        self.assertIn("update-status", observed_hooks)
+        self.assertIn("fiveg-amf-relation-broken", observed_hooks)
+        self.assertNotIn("smf-pebble-ready", observed_hooks)
+        self.assertNotIn("apply-config-action", observed_hooks)
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_healthy_workload_when_update_status_then_config_is_not_rendered(
+        self, patch_get_checks
+    ):
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self._create_all_relations_with_valid_data()
+
+        with patch.object(Oai5GSMFOperatorCharm, "_render_config") as patch_render_config:
+            self.harness.charm.on.update_status.emit()
+
+        patch_render_config.assert_not_called()
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    @patch("ops.model.Container.get_checks")
+    def test_given_failing_checks_when_update_status_then_status_is_waiting_until_they_pass(
+        self, patch_get_checks
+    ):
+        self._create_all_relations_with_valid_data()
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.DOWN)}
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            WaitingStatus("Workload health checks failing: smf-sbi"),
+        )
+        patch_get_checks.return_value = {"smf-sbi": Mock(status=CheckStatus.UP)}
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    def test_given_stopped_service_when_update_status_then_service_is_started_without_render(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        container = self.harness.model.unit.get_container("smf")
+        container.stop("smf")
+
+        with patch.object(Oai5GSMFOperatorCharm, "_render_config") as patch_render_config:
+            self.harness.charm.on.update_status.emit()
+
+        patch_render_config.assert_not_called()
+        self.assertTrue(container.get_service("smf").is_running())
+        self.assertEqual(
+            self.harness.model.unit.status, MaintenanceStatus("Workload service was not running")
+        )
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    def test_given_config_file_changed_in_workload_when_update_status_then_config_is_reconciled(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        container = self.harness.model.unit.get_container("smf")
+        running_config = self._pull("/openair-smf/etc/smf.conf")
+        container.push("/openair-smf/etc/smf.conf", "tampered")
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self._pull("/openair-smf/etc/smf.conf"), running_config)
+
+    def test_given_guaranteed_qos_when_config_changed_then_limits_equal_requests_are_patched(self):
+        self.harness.set_leader(True)
+
+        self.harness.update_config(
+            {
+                "cpu-request": "4",
+                "memory-request": "2Gi",
+                "guaranteed-qos": True,
+                "hugepages-1gi": "2Gi",
+                "node-selector": "topology.kubernetes.io/zone=zone-a, cpu=dedicated",
+            }
+        )
+
+        kwargs = (
+            self.patch_kubernetes_client.return_value.patch_workload_resources.call_args.kwargs
+        )
+        self.assertEqual(kwargs["statefulset_name"], "oai-5g-smf")
+        self.assertEqual(kwargs["container_name"], "smf")
+        expected_resources = {"cpu": "4", "memory": "2Gi", "hugepages-1Gi": "2Gi"}
+        self.assertEqual(kwargs["requests"], expected_resources)
+        self.assertEqual(kwargs["limits"], expected_resources)
+        self.assertEqual(kwargs["other_containers_resources"], {"cpu": "500m", "memory": "512Mi"})
+        self.assertEqual(
+            kwargs["node_selector"],
+            {"topology.kubernetes.io/zone": "zone-a", "cpu": "dedicated"},
+        )
+
+    def test_given_guaranteed_qos_without_requests_when_config_changed_then_status_is_blocked(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+        self.harness.set_leader(True)
+        self.patch_kubernetes_client.reset_mock()
+
+        self.harness.update_config({"cpu-request": "2", "guaranteed-qos": True})
+
+        self.patch_kubernetes_client.return_value.patch_workload_resources.assert_not_called()
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("guaranteed-qos requires cpu-request and memory-request"),
+        )
+
+    def test_given_sysctls_when_config_changed_then_sysctls_are_patched(self):
+        self.harness.set_leader(True)
+
+        self.harness.update_config(
+            {"sysctls": "net.core.rmem_max=8388608, net.ipv4.ip_local_port_range=1024  65535"}
+        )
+
+        kwargs = (
+            self.patch_kubernetes_client.return_value.patch_workload_resources.call_args.kwargs
+        )
+        self.assertEqual(kwargs["sysctls"], {"net.ipv4.ip_local_port_range": "1024 65535"})
+
+    def test_given_node_level_sysctl_when_config_changed_then_sysctl_is_not_patched(self):
+        self._create_all_relations_with_valid_data()
+        self.harness.set_leader(True)
+        self.patch_kubernetes_client.reset_mock()
+
+        self.harness.update_config({"sysctls": "vm.swappiness=10"})
+
+        kwargs = (
+            self.patch_kubernetes_client.return_value.patch_workload_resources.call_args.kwargs
+        )
+        self.assertEqual(kwargs["sysctls"], {})
+        self.assertNotIsInstance(self.harness.model.unit.status, BlockedStatus)
+
+    def test_given_rlimits_when_config_changed_then_workload_command_raises_them(self):
+        self.harness.update_config({"rlimits": "nofile=65536,nproc=unlimited"})
+        self._create_all_relations_with_valid_data()
+
+        plan = self.harness.get_container_pebble_plan("smf").to_dict()
+
+        self.assertEqual(
+            plan["services"]["smf"]["command"],
+            "/bin/sh -c 'ulimit -n 65536 && ulimit -u unlimited && exec "
+            "/openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf -o'",
+        )
+
+    @patch("ops.model.Container.exec")
+    def test_given_tuning_applied_when_verify_tuning_action_then_values_are_reported(
+        self, patch_exec
+    ):
+        self.harness.update_config(
+            {"sysctls": "net.core.rmem_max=8388608", "rlimits": "nofile=65536"}
+        )
+        self.harness.set_can_connect(container="smf", val=True)
+        sysctl_process, limits_process = Mock(), Mock()
+        sysctl_process.wait_output.return_value = ("8388608\n", "")
+        limits_process.wait_output.return_value = (
+            "Limit                     Soft Limit           Hard Limit           Units\n"
+            "Max processes             unlimited            unlimited            processes\n"
+            "Max open files            65536                65536                files\n",
+            "",
+        )
+        patch_exec.side_effect = [sysctl_process, limits_process]
+        event = Mock()
+
+        self.harness.charm._on_verify_tuning_action(event=event)
+
+        self.assertEqual(
+            patch_exec.call_args_list[0].args[0], ["cat", "/proc/sys/net/core/rmem_max"]
+        )
+        event.set_results.assert_called_with(
+            {
+                "setting-0": {
+                    "name": "net.core.rmem_max",
+                    "expected": "8388608",
+                    "applied": "8388608",
+                    "set-on": "node",
+                },
+                "setting-1": {"name": "nofile", "expected": "65536", "applied": "65536"},
+                "mismatches": "0",
+            }
+        )
+        event.fail.assert_not_called()
+
+    @patch("ops.model.Container.exec")
+    def test_given_sysctl_not_applied_when_verify_tuning_action_then_action_fails(
+        self, patch_exec
+    ):
+        self.harness.update_config({"sysctls": "net.core.rmem_max=8388608"})
+        self.harness.set_can_connect(container="smf", val=True)
+        patch_exec.return_value.wait_output.return_value = ("212992\n", "")
+        event = Mock()
+
+        self.harness.charm._on_verify_tuning_action(event=event)
+
+        event.fail.assert_called_with("Not applied: net.core.rmem_max=8388608")
+
+    def test_given_jemalloc_in_image_when_config_changed_then_layer_preloads_it(self):
+        self.harness.set_can_connect(container="smf", val=True)
+        container = self.harness.model.unit.get_container("smf")
+        container.push("/usr/lib/x86_64-linux-gnu/libjemalloc.so.2", "", make_dirs=True)
+        self.harness.update_config(
+            {
+                "allocator": "jemalloc",
+                "malloc-arena-max": 2,
+                "workload-environment": "LD_PRELOAD=/lib/libtrace.so, TZ=UTC",
+            }
+        )
+        self._create_all_relations_with_valid_data()
+
+        plan = self.harness.get_container_pebble_plan("smf").to_dict()
+
+        self.assertEqual(
+            plan["services"]["smf"]["environment"],
+            {
+                "LD_PRELOAD": "/usr/lib/x86_64-linux-gnu/libjemalloc.so.2:/lib/libtrace.so",
+                "MALLOC_ARENA_MAX": "2",
+                "TZ": "UTC",
+            },
+        )
+
+    def test_given_tcmalloc_not_in_image_when_config_changed_then_status_is_blocked(self):
+        self.harness.update_config({"allocator": "tcmalloc"})
+
+        self._create_all_relations_with_valid_data()
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("tcmalloc not found in the workload container"),
+        )
+        self.assertEqual(self.harness.get_container_pebble_plan("smf").to_dict(), {})
+
+    def test_given_cpu_affinity_and_rlimits_when_config_changed_then_command_is_pinned(self):
+        self.harness.set_can_connect(container="smf", val=True)
+        container = self.harness.model.unit.get_container("smf")
+        container.push("/usr/bin/taskset", "", make_dirs=True)
+        self.harness.update_config({"cpu-affinity": "2-3", "rlimits": "nofile=65536"})
+        self._create_all_relations_with_valid_data()
+
+        plan = self.harness.get_container_pebble_plan("smf").to_dict()
+
+        self.assertEqual(
+            plan["services"]["smf"]["command"],
+            "/bin/sh -c 'ulimit -n 65536 && exec /usr/bin/taskset -c 2-3 "
+            "/openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf -o'",
+        )
+
+    def test_given_reversed_cpu_range_when_config_changed_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"cpu-affinity": "3-1"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("Invalid cpu-affinity: reversed CPU range 3-1"),
+        )
+
+    def test_given_session_counts_when_capacity_report_action_then_utilization_is_reported(
+        self,
+    ):
+        event = Mock(params={"sessions": "oai.ipv4=30", "growth-per-hour": 3})
+
+        self.harness.charm._on_capacity_report_action(event=event)
+
+        results = event.set_results.call_args.args[0]
+        self.assertEqual(
+            results["dnn-0"],
+            {
+                "dnn": "oai.ipv4",
+                "slice": "1/1",
+                "pdu-session-type": "IPv4",
+                "ipv4-capacity": "39",
+                "ipv6-capacity": "1",
+                "session-capacity": "39",
+                "sessions": "30",
+                "utilization-percent": "76.9",
+                "hours-to-exhaustion": "3.0",
+            },
+        )
+        self.assertNotIn("sessions", results["dnn-1"])
+        self.assertEqual(results["slice-1-1023"], {"session-capacity": "40"})
+        self.assertNotIn("warnings", results)
+
+    def test_given_overlapping_ranges_when_capacity_report_action_then_warning_is_reported(self):
+        self.harness.update_config({"dnn-1-ipv4-range": "12.1.1.30 - 12.1.1.80"})
+        event = Mock(params={"sessions": "", "growth-per-hour": 0})
+
+        self.harness.charm._on_capacity_report_action(event=event)
+
+        results = event.set_results.call_args.args[0]
+        self.assertEqual(results["warnings"], "IPv4 ranges of oai.ipv4 and default overlap")
+
+    def test_given_malformed_range_when_capacity_report_action_then_action_fails(self):
+        self.harness.update_config({"dnn-0-ipv4-range": "12.1.1.2"})
+        event = Mock(params={"sessions": "", "growth-per-hour": 0})
+
+        self.harness.charm._on_capacity_report_action(event=event)
+
+        event.fail.assert_called_with(
+            "Invalid DNN pool or session counts: expected first - last, got '12.1.1.2'"
+        )
+
+    def test_given_log_level_off_when_config_changed_then_workload_logs_nothing(self):
+        self.harness.update_config({"log-level": "off", "log-rate-limit": 100})
+        self._create_all_relations_with_valid_data()
+
+        plan = self.harness.get_container_pebble_plan("smf").to_dict()
+
+        self.assertEqual(
+            plan["services"]["smf"]["command"],
+            "/openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf",
+        )
+
+    def test_given_log_level_info_when_config_changed_then_logs_are_piped_through_filter(self):
+        self.harness.update_config({"log-level": "info", "log-rate-limit": 500})
+        self._create_all_relations_with_valid_data()
+
+        command = self.harness.get_container_pebble_plan("smf").to_dict()["services"]["smf"][
+            "command"
+        ]
+
+        self.assertTrue(
+            command.startswith(
+                "/bin/sh -c 'exec /openair-smf/bin/oai_smf -c /openair-smf/etc/smf.conf -o "
+                "2>&1 | awk "
+            )
+        )
+        self.assertIn("minimum = 3; cap = 500;", command)
+
+    def test_given_invalid_log_level_when_config_changed_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"log-level": "verbose"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus(
+                "Invalid log-level 'verbose', expected one of trace, debug, info, warning, "
+                "error, critical, off"
+            ),
+        )
+
+    @patch("ops.model.Container.add_layer")
+    def test_given_logging_relation_when_relation_changed_then_logs_are_forwarded_to_loki(
+        self, patch_add_layer
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        relation_id = self.harness.add_relation("logging", "loki")
+        self.harness.add_relation_unit(relation_id, "loki/0")
+
+        self.harness.update_relation_data(
+            relation_id, "loki/0", {"endpoint": '{"url": "http://loki-0:3100/loki/api/v1/push"}'}
+        )
+
+        label, layer = patch_add_layer.call_args.args
+        self.assertEqual(label, "smf-logging")
+        self.assertEqual(
+            yaml.safe_load(layer)["log-targets"],
+            {
+                "loki-loki-0": {
+                    "override": "replace",
+                    "type": "loki",
+                    "location": "http://loki-0:3100/loki/api/v1/push",
+                    "services": ["smf"],
+                    "labels": {
+                        "juju_model": self.harness.model.name,
+                        "juju_application": "oai-5g-smf",
+                        "juju_unit": "oai-5g-smf/0",
+                    },
+                }
+            },
+        )
+
+    @patch("ops.model.Container.add_layer")
+    def test_given_logging_relation_removed_when_relation_broken_then_target_forwards_nothing(
+        self, patch_add_layer
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        relation_id = self.harness.add_relation("logging", "loki")
+        self.harness.add_relation_unit(relation_id, "loki/0")
+        self.harness.update_relation_data(
+            relation_id, "loki/0", {"endpoint": '{"url": "http://loki-0:3100/loki/api/v1/push"}'}
+        )
+
+        self.harness.remove_relation(relation_id)
+
+        _, layer = patch_add_layer.call_args.args
+        self.assertEqual(yaml.safe_load(layer)["log-targets"]["loki-loki-0"]["services"], [])
+
+    def test_given_session_metrics_port_and_python_when_config_changed_then_helper_is_started(
+        self,
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        container = self.harness.model.unit.get_container("smf")
+        container.push("/usr/bin/python3", "", make_dirs=True)
+
+        self.harness.update_config({"session-metrics-port": 9464})
+
+        service = self.harness.get_container_pebble_plan("smf").to_dict()["services"][
+            "smf-session-metrics"
+        ]
+        self.assertEqual(
+            service["command"],
+            "/bin/sh -c '/charm/bin/pebble logs --follow -n 0 smf | exec /usr/bin/python3 "
+            "/opt/smf-charm/session_metrics.py --port 9464'",
+        )
+        self.assertEqual(service["startup"], "enabled")
+        self.assertEqual(
+            service["environment"], {"PEBBLE_SOCKET": "/charm/container/pebble.socket"}
+        )
+        self.assertIn("class SessionMetrics", self._pull("/opt/smf-charm/session_metrics.py"))
+        self.assertTrue(container.get_service("smf-session-metrics").is_running())
+
+    def test_given_session_metrics_enabled_when_port_unset_then_helper_is_stopped(self):
+        self.harness.set_can_connect(container="smf", val=True)
+        container = self.harness.model.unit.get_container("smf")
+        container.push("/usr/bin/python3", "", make_dirs=True)
+        self.harness.update_config({"session-metrics-port": 9464})
+
+        self.harness.update_config({"session-metrics-port": 0})
+
+        plan = self.harness.get_container_pebble_plan("smf").to_dict()
+        self.assertEqual(plan["services"]["smf-session-metrics"]["startup"], "disabled")
+        self.assertFalse(container.get_service("smf-session-metrics").is_running())
+
+    def test_given_no_python_in_image_when_session_metrics_port_set_then_status_is_blocked(self):
+        self.harness.update_config({"session-metrics-port": 9464})
+
+        self._create_all_relations_with_valid_data()
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("python3 not found in the workload container"),
+        )
+        self.assertNotIn(
+            "smf-session-metrics",
+            self.harness.get_container_pebble_plan("smf").to_dict().get("services", {}),
+        )
+
+    def test_given_session_metrics_port_and_warning_log_level_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"session-metrics-port": 9464, "log-level": "warning"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("session-metrics-port requires log-level info or lower"),
+        )
+
+    @patch("ops.model.Container.exec")
+    def test_given_perf_fails_when_profile_workload_action_then_next_profiler_is_used(
+        self, patch_exec
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        container = self.harness.model.unit.get_container("smf")
+        container.push("/usr/bin/perf", "", make_dirs=True)
+        container.push("/usr/bin/gdb", "", make_dirs=True)
+        pid_process, perf_process, gdb_process = Mock(), Mock(), Mock()
+        pid_process.wait_output.return_value = ("12\n", "")
+        perf_process.wait_output.side_effect = ExecError(["/bin/sh"], 1, "", "not permitted")
+        gdb_process.wait_output.return_value = (
+            'Thread 1 (Thread 0x7f (LWP 12) "oai_smf"):\n#0  0x00007f in __poll ()\n--\n'
+            'Thread 1 (Thread 0x7f (LWP 12) "oai_smf"):\n#0  0x00007f in __poll ()\n--\n',
+            "",
+        )
+        patch_exec.side_effect = [pid_process, perf_process, gdb_process]
+        event = Mock(params={"duration": 2, "frequency": 99, "profiler": "auto"})
+
+        self.harness.charm._on_profile_workload_action(event=event)
+
+        self.assertEqual(patch_exec.call_args_list[2].kwargs["timeout"], 32)
+        results = event.set_results.call_args[0][0]
+        self.assertEqual(results["profiler"], "gdb")
+        self.assertEqual(results["samples"], "2")
+        self.assertEqual(results["top-stacks"], "oai_smf;oai_smf;__poll 2\n")
+        self.assertEqual(results["warnings"], "perf failed")
+        self.assertEqual(self._pull(results["path"]), "oai_smf;oai_smf;__poll 2\n")
+
+    @patch("ops.model.Container.exec")
+    def test_given_no_profiler_in_image_when_profile_workload_action_then_proc_is_sampled(
+        self, patch_exec
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        pid_process, proc_process = Mock(), Mock()
+        pid_process.wait_output.return_value = ("12\n", "")
+        proc_process.wait_output.return_value = ("oai_smf;do_epoll_wait\n--\n", "")
+        patch_exec.side_effect = [pid_process, proc_process]
+        event = Mock(params={"duration": 1, "frequency": 99, "profiler": "auto"})
+
+        self.harness.charm._on_profile_workload_action(event=event)
+
+        self.assertIn("/proc/12/task/*", patch_exec.call_args_list[1].args[0][2])
+        results = event.set_results.call_args[0][0]
+        self.assertEqual(results["profiler"], "proc")
+        self.assertEqual(results["top-stacks"], "oai_smf;oai_smf;[kernel] do_epoll_wait 1\n")
+
+    def test_given_requested_profiler_not_in_image_when_profile_workload_action_then_action_fails(  # noqa: E501
+        self,
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        event = Mock(params={"duration": 1, "frequency": 99, "profiler": "perf"})
+
+        self.harness.charm._on_profile_workload_action(event=event)
+
+        event.fail.assert_called_with("perf not found in the workload container")
+
+    def test_given_two_upf_applications_when_config_changed_then_config_is_rendered(self):
+        self._create_all_relations_with_valid_data()
+        relation_id = self.harness.add_relation("fiveg-upf", "upf-b")
+        self.harness.add_relation_unit(relation_id=relation_id, remote_unit_name="upf-b/0")
+
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="upf-b",
+            key_values={"upf_ipv4_address": "1.2.3.9", "upf_fqdn": "upf-b.example.com"},
+        )
+
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def _create_amf_set_relation(self):
+        amfs = [
+            {"ipv4_address": "1.2.3.9", "fqdn": "amf-1", "port": 80, "api_version": "v1"},
+            {"ipv4_address": "1.2.3.8", "fqdn": "amf-0", "port": 80, "api_version": "v1"},
+        ]
+        relation_id = self.harness.add_relation("fiveg-amf", "amf-set")
+        self.harness.add_relation_unit(relation_id=relation_id, remote_unit_name="amf-set/0")
+        self.harness.update_relation_data(
+            relation_id, "amf-set", {"fiveg_amf": json.dumps({"version": 1, "amfs": amfs})}
+        )
+
+    def test_given_amf_set_and_spread_selection_when_config_changed_then_units_take_amfs_in_turn(
+        self,
+    ):
+        self._create_amf_set_relation()
+        self._create_all_relations_with_valid_data()
+
+        self.assertIn('IPV4_ADDRESS = "1.2.3.4"', self._pull("/openair-smf/etc/smf.conf"))
+
+        with patch(
+            "charm.Oai5GSMFOperatorCharm._unit_number", new_callable=PropertyMock
+        ) as patch_unit_number:
+            patch_unit_number.return_value = "1"
+            self.harness.update_config({"dnn-0-ni": "internet"})
+
+        self.assertIn('IPV4_ADDRESS = "1.2.3.8"', self._pull("/openair-smf/etc/smf.conf"))
+
+    def test_given_amf_set_and_first_selection_when_config_changed_then_first_amf_is_rendered(
+        self,
+    ):
+        self.harness.update_config({"amf-selection": "first"})
+        self._create_amf_set_relation()
+
+        self._create_all_relations_with_valid_data()
+
+        self.assertIn('IPV4_ADDRESS = "1.2.3.9"', self._pull("/openair-smf/etc/smf.conf"))
+
+    def test_given_amf_set_when_amf_unit_departs_then_its_amf_is_no_longer_rendered(self):
+        self.harness.update_config({"amf-selection": "first"})
+        relation_id = self.harness.add_relation("fiveg-amf", "amf-set")
+        for unit_number, ipv4_address in enumerate(("1.2.3.8", "1.2.3.9")):
+            amfs = [{"ipv4_address": ipv4_address, "fqdn": "amf", "port": 80, "api_version": "v1"}]
+            self.harness.add_relation_unit(relation_id, f"amf-set/{unit_number}")
+            self.harness.update_relation_data(
+                relation_id,
+                f"amf-set/{unit_number}",
+                {"fiveg_amf": json.dumps({"version": 1, "amfs": amfs})},
+            )
+        self._create_all_relations_with_valid_data()
+        self.assertIn('IPV4_ADDRESS = "1.2.3.8"', self._pull("/openair-smf/etc/smf.conf"))
+
+        self.harness.remove_relation_unit(relation_id, "amf-set/0")
+
+        self.assertIn('IPV4_ADDRESS = "1.2.3.9"', self._pull("/openair-smf/etc/smf.conf"))
+
+    def test_given_upf_relation_removed_when_relation_broken_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.remove_relation(self.harness.model.get_relation("fiveg-upf").id)
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("Waiting for relation to UPF to be created"),
+        )
+
+    def test_given_nrf_discovery_and_only_nrf_relation_when_config_changed_then_config_is_rendered(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config({"nf-discovery": "nrf"})
+        self.harness.set_can_connect(container="smf", val=True)
+
+        self._create_nrf_relation_with_valid_data()
+
+        config = self._pull("/openair-smf/etc/smf.conf")
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+        self.assertIn('FQDN         = "localhost"           # YOUR AMF FQDN CONFIG HERE', config)
+        self.assertIn('FQDN         = "nrf.example.com"', config)
+        self.assertIn("UPF_LIST = (\n    );", config)
+
+    def test_given_nrf_discovery_and_no_nrf_relation_when_config_changed_then_status_is_blocked(
+        self,
+    ):
+        self.harness.set_can_connect(container="smf", val=True)
+        self._create_amf_relation_with_valid_data()
+
+        self.harness.update_config({"nf-discovery": "nrf"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("Waiting for relation to NRF to be created"),
+        )
+
+    @patch("ops.model.Container.restart")
+    def test_given_nrf_discovery_when_amf_hint_address_changes_then_workload_is_not_restarted(
+        self, patch_restart
+    ):
+        self.harness.update_config({"nf-discovery": "nrf"})
+        self._create_all_relations_with_valid_data()
+        config = self._pull("/openair-smf/etc/smf.conf")
+        patch_restart.reset_mock()
+        relation_id = self.harness.model.get_relation("fiveg-amf").id
+
+        self.harness.update_relation_data(relation_id, "amf", {"amf_ipv4_address": "1.2.3.99"})
+
+        self.assertEqual(self._pull("/openair-smf/etc/smf.conf"), config)
+        patch_restart.assert_not_called()
+
+    @patch("ops.model.Container.restart")
+    def test_given_static_discovery_when_amf_address_changes_then_config_is_rendered_again(
+        self, patch_restart
+    ):
+        self._create_all_relations_with_valid_data()
+        patch_restart.reset_mock()
+        relation_id = self.harness.model.get_relation("fiveg-amf").id
+
+        self.harness.update_relation_data(relation_id, "amf", {"amf_ipv4_address": "1.2.3.99"})
+
+        self.assertIn('IPV4_ADDRESS = "1.2.3.99"', self._pull("/openair-smf/etc/smf.conf"))
+        patch_restart.assert_called()
+
+    @patch("charm.Oai5GSMFOperatorCharm._pod_ipv4_address", "10.1.0.11")
+    @patch("nf_profile.update_profile")
+    @patch("nf_profile.find_profile")
+    def test_given_nf_capacity_and_priority_when_config_changed_then_profile_is_updated_in_nrf(
+        self, patch_find_profile, patch_update_profile
+    ):
+        patch_find_profile.return_value = {"nfInstanceId": "smf-1", "capacity": 100, "priority": 1}
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"nf-capacity": "auto", "cpu-limit": "2", "nf-priority": "5"})
+
+        patch_find_profile.assert_called_with(
+            "http://1.2.3.4:81/nnrf-nfm/v1", "SMF", "10.1.0.11", 2
+        )
+        patch_update_profile.assert_called_once_with(
+            "http://1.2.3.4:81/nnrf-nfm/v1",
+            "smf-1",
+            [
+                {"op": "replace", "path": "/capacity", "value": 200},
+                {"op": "replace", "path": "/priority", "value": 5},
+            ],
+            2,
+        )
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    @patch("charm.Oai5GSMFOperatorCharm._pod_ipv4_address", "10.1.0.11")
+    @patch("nf_profile.update_profile")
+    @patch("nf_profile.find_profile")
+    def test_given_unreachable_nrf_when_update_status_then_status_is_active(
+        self, patch_find_profile, patch_update_profile
+    ):
+        patch_find_profile.side_effect = nf_profile.NRFError("GET failed")
+        self.harness.update_config({"nf-capacity": "300"})
+        self._create_all_relations_with_valid_data()
+
+        self.harness.framework.on.pre_commit.emit()
+        self.harness.charm.on.update_status.emit()
+
+        self.assertTrue(self.harness.charm._stored.update_status_has_work)
+        patch_update_profile.assert_not_called()
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+    def test_given_auto_nf_capacity_without_cpu_config_when_nf_capacity_then_workload_cpu_quota_is_used(  # noqa: E501
+        self,
+    ):
+        self.harness.set_can_connect("smf", True)
+        self.harness.update_config({"nf-capacity": "auto"})
+
+        self.assertEqual(self.harness.charm._nf_capacity, 100)
+
+        self.harness.model.unit.get_container("smf").push(
+            "/sys/fs/cgroup/cpu.max", "150000 100000\n", make_dirs=True
+        )
+        self.assertEqual(self.harness.charm._nf_capacity, 150)
+
+    @patch("nf_profile.find_profile")
+    def test_given_nf_profile_not_set_when_config_changed_then_nrf_is_not_queried(
+        self, patch_find_profile
+    ):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"nf-capacity": "", "nf-priority": ""})
+
+        patch_find_profile.assert_not_called()
+
+    def test_given_invalid_nf_priority_when_config_changed_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"nf-priority": "70000"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus(
+                "Invalid nf-capacity or nf-priority: expected an integer from 0 to 65535, "
+                "got '70000'"
+            ),
+        )
+
+    def test_given_upf_list_when_config_changed_then_listed_upfs_are_rendered_in_order_with_network_instances(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config(
+            {
+                "upf-list": "upf-b.example.com:access.oai.org:core.oai.org,"
+                "upf.example.com:access.oai.org:core.oai.org"
+            }
+        )
+        self._create_all_relations_with_valid_data()
+        relation_id = self.harness.add_relation("fiveg-upf", "upf-b")
+        self.harness.add_relation_unit(relation_id=relation_id, remote_unit_name="upf-b/0")
+
+        self.harness.update_relation_data(
+            relation_id=relation_id,
+            app_or_unit="upf-b",
+            key_values={"upf_ipv4_address": "1.2.3.9", "upf_fqdn": "upf-b.example.com"},
+        )
+
+        config = self._pull("/openair-smf/etc/smf.conf")
         self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+        self.assertIn('USE_NETWORK_INSTANCE    = "yes"', config)
+        self.assertIn(
+            "    UPF_LIST = (\n"
+            '         {IPV4_ADDRESS = "1.2.3.9" ; FQDN = "upf-b.example.com"; NWI_LIST = ({DOMAIN_ACCESS  = "access.oai.org", DOMAIN_CORE = "core.oai.org"})},   # YOUR UPF CONFIG HERE\n'  # noqa: E501, W505
+            '         {IPV4_ADDRESS = "1.2.3.4" ; FQDN = "upf.example.com"; NWI_LIST = ({DOMAIN_ACCESS  = "access.oai.org", DOMAIN_CORE = "core.oai.org"})}   # YOUR UPF CONFIG HERE\n'  # noqa: E501, W505
+            "    );",
+            config,
+        )
+
+    def test_given_upf_list_without_related_upf_when_config_changed_then_status_is_waiting(
+        self,
+    ):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"upf-list": "upf-b.example.com"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            WaitingStatus("Waiting for a UPF of upf-list to be available in relation data"),
+        )
+
+    def test_given_invalid_upf_list_when_config_changed_then_status_is_blocked(self):
+        self._create_all_relations_with_valid_data()
+
+        self.harness.update_config({"upf-list": "oai=upf.example.com"})
+
+        self.assertEqual(
+            self.harness.model.unit.status,
+            BlockedStatus("Invalid upf-list: invalid UPF in 'oai=upf.example.com'"),
+        )
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    @patch("charm.Oai5GSMFOperatorCharm._pod_ipv4_address", "10.1.0.11")
+    @patch("nf_profile.update_profile")
+    @patch("nf_profile.find_profile")
+    def test_given_nf_capacity_made_invalid_when_update_status_then_nrf_is_not_updated(
+        self, patch_find_profile, patch_update_profile
+    ):
+        patch_find_profile.return_value = {"nfInstanceId": "smf-1", "ipv4Addresses": ["10.1.0.11"]}
+        self.harness.update_config({"nf-capacity": "300"})
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"nf-capacity": "abc"})
+        patch_find_profile.reset_mock()
+
+        self.harness.charm.on.update_status.emit()
+
+        patch_find_profile.assert_not_called()
+        patch_update_profile.assert_not_called()
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    @patch("charm.Oai5GSMFOperatorCharm._pod_ipv4_address", "10.1.0.11")
+    @patch("nf_profile.update_profile", Mock())
+    @patch("nf_profile.get_profile")
+    @patch("nf_profile.find_profile")
+    def test_given_instance_found_when_update_status_then_only_its_profile_is_read(
+        self, patch_find_profile, patch_get_profile
+    ):
+        profile = {"nfInstanceId": "smf-1", "ipv4Addresses": ["10.1.0.11"], "capacity": 300}
+        patch_find_profile.return_value = patch_get_profile.return_value = profile
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"nf-capacity": "300"})
+        patch_find_profile.reset_mock()
+
+        self.harness.charm.on.update_status.emit()
+
+        patch_get_profile.assert_called_once_with("http://1.2.3.4:81/nnrf-nfm/v1", "smf-1", 2)
+        patch_find_profile.assert_not_called()
+
+    @patch("ops.model.Container.get_checks", Mock(return_value={}))
+    @patch("charm.Oai5GSMFOperatorCharm._pod_ipv4_address", "10.1.0.11")
+    @patch("nf_profile.update_profile", Mock())
+    @patch("nf_profile.get_profile")
+    @patch("nf_profile.find_profile")
+    def test_given_instance_no_longer_registered_when_update_status_then_instances_are_listed_again(  # noqa: E501
+        self, patch_find_profile, patch_get_profile
+    ):
+        patch_find_profile.return_value = {"nfInstanceId": "smf-1", "ipv4Addresses": ["10.1.0.11"]}
+        patch_get_profile.return_value = None
+        self._create_all_relations_with_valid_data()
+        self.harness.update_config({"nf-capacity": "300"})
+        patch_find_profile.return_value = {"nfInstanceId": "smf-2", "ipv4Addresses": ["10.1.0.11"]}
+
+        self.harness.charm.on.update_status.emit()
+
+        patch_get_profile.assert_called_once_with("http://1.2.3.4:81/nnrf-nfm/v1", "smf-1", 2)
+        self.assertEqual(self.harness.charm._stored.nf_instance_id, "smf-2")
@@ -0,0 +1,29 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import subprocess
+import sys
+import unittest
+
+
+class TestColdStart(unittest.TestCase):
+    def test_given_update_status_when_dispatched_then_heavy_packages_are_not_imported(self):
+        process = subprocess.run(
+            [
+                sys.executable,
+                "tests/benchmark/cold_start.py",
+                "--event",
+                "update-status",
+                "--event",
+                "config-changed",
+                "--json",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        results = {result["event"]: result for result in json.loads(process.stdout)}
+        self.assertEqual(results["update-status"]["heavy-imports"], [])
+        self.assertIn("jinja2", results["config-changed"]["heavy-imports"])
@@ -0,0 +1,57 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import hashlib
+import tracemalloc
+import unittest
+
+from jinja2 import Environment
+
+from config_stream import ConfigStream
+
+TEMPLATE = (
+    "SESSION_MANAGEMENT_SUBSCRIPTION_LIST = (\n"
+    "{% for entry in entries %}"
+    '  {NSSAI_SST = {{ entry }}; DNN = "dnn-{{ entry }}"; SESSION_AMBR_UL = "20Mbps"},\n'
+    "{% endfor %}"
+    ");\n"
+)
+
+
+def _peak_memory_when_streamed(number_of_entries):
+    template = Environment().from_string(TEMPLATE)
+    tracemalloc.start()
+    try:
+        stream = ConfigStream(template.generate(entries=range(number_of_entries)))
+        while stream.read(65536):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+class TestConfigStream(unittest.TestCase):
+    def test_given_chunks_when_read_in_small_sizes_then_content_and_digest_are_complete(self):
+        stream = ConfigStream(["abc", "", "défg", "h" * 10])
+
+        content = b""
+        while data := stream.read(4):
+            content += data
+
+        expected = "abcdéfg".encode() + b"h" * 10
+        self.assertEqual(content, expected)
+        self.assertEqual(stream.size, len(expected))
+        self.assertEqual(stream.hexdigest(), hashlib.sha256(expected).hexdigest())
+
+    def test_given_unread_chunks_when_hexdigest_then_digest_covers_whole_content(self):
+        stream = ConfigStream(["abc", "def"])
+
+        self.assertEqual(stream.hexdigest(), hashlib.sha256(b"abcdef").hexdigest())
+        self.assertEqual(stream.read(), b"")
+
+    def test_given_growing_template_lists_when_streamed_then_peak_memory_stays_flat(self):
+        small_peak = _peak_memory_when_streamed(5_000)
+        large_peak = _peak_memory_when_streamed(50_000)
+
+        self.assertLess(large_peak, 2 * small_peak)
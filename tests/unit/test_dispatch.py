@@ -0,0 +1,173 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import socketserver
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from ops.storage import SQLiteStorage
+
+from dispatch import STORED_STATE_HANDLE, needs_dispatch
+
+OBSERVED_HOOKS = ["config-changed", "fiveg-amf-relation-changed", "update-status"]
+PEBBLE_STATE = {
+    "services": [{"name": "smf", "startup": "enabled", "current": "active"}],
+    "checks": [{"name": "smf-sbi", "level": "ready", "status": "up", "failures": 0}],
+    "files": [
+        {
+            "path": "/openair-smf/etc/smf.conf",
+            "name": "smf.conf",
+            "type": "file",
+            "size": 6703,
+            "last-modified": "2022-08-10T09:49:35.123456789+02:00",
+        }
+    ],
+}
+
+
+class _PebbleHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        url = urlparse(self.path)
+        resource = url.path.rsplit("/", 1)[1]
+        names = parse_qs(url.query).get("names", [""])[0].split(",")
+        result = [
+            item
+            for item in self.server.state[resource]  # type: ignore[attr-defined]
+            if resource == "files" or item["name"] in names
+        ]
+        body = json.dumps({"type": "sync", "status-code": 200, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return "pebble"
+
+    def log_message(self, *args):
+        pass
+
+
+class _PebbleServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TestDispatch(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_file = Path(directory.name) / ".unit-state.db"
+        self.socket_path = str(Path(directory.name) / "pebble.socket")
+        self.workload_health = {
+            "socket": self.socket_path,
+            "services": {"smf": "active"},
+            "checks": {"smf-sbi": "up"},
+            "files": {"/openair-smf/etc/smf.conf": [6703, 1660117775]},
+        }
+
+    def _create_state(
+        self, update_status_has_work=False, deferred=False, workload_health="", **stored
+    ):
+        storage = SQLiteStorage(self.state_file)
+        storage.save_snapshot(
+            STORED_STATE_HANDLE,
+            {
+                "observed_hooks": json.dumps(OBSERVED_HOOKS),
+                "update_status_has_work": update_status_has_work,
+                "workload_health": workload_health,
+                **stored,
+            },
+        )
+        if deferred:
+            storage.save_notice(
+                "Oai5GSMFOperatorCharm/on/config_changed[1]",
+                "Oai5GSMFOperatorCharm",
+                "_on_config_changed",
+            )
+        storage.commit()
+        storage.close()
+
+    def _start_pebble(self, state):
+        server = _PebbleServer(self.socket_path, _PebbleHandler)
+        server.state = state  # type: ignore[attr-defined]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def test_given_no_state_when_needs_dispatch_then_hook_is_dispatched(self):
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_idle_unit_when_needs_dispatch_then_update_status_is_skipped(self):
+        self._create_state(update_status_has_work=False)
+
+        self.assertFalse(needs_dispatch("hooks/update-status", self.state_file))
+        self.assertTrue(needs_dispatch("hooks/config-changed", self.state_file))
+        self.assertTrue(needs_dispatch("actions/apply-config", self.state_file))
+
+    def test_given_update_status_has_work_when_needs_dispatch_then_update_status_is_dispatched(
+        self,
+    ):
+        self._create_state(update_status_has_work=True)
+
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_unobserved_hook_when_needs_dispatch_then_hook_is_skipped(self):
+        self._create_state()
+
+        self.assertFalse(needs_dispatch("hooks/fiveg-amf-relation-joined", self.state_file))
+        self.assertFalse(needs_dispatch("hooks/smf-pebble-ready", self.state_file))
+        self.assertTrue(needs_dispatch("hooks/upgrade-charm", self.state_file))
+
+    def test_given_state_without_observed_hooks_when_needs_dispatch_then_hook_is_dispatched(
+        self,
+    ):
+        storage = SQLiteStorage(self.state_file)
+        storage.save_snapshot(STORED_STATE_HANDLE, {"update_status_has_work": False})
+        storage.commit()
+        storage.close()
+
+        self.assertTrue(needs_dispatch("hooks/smf-pebble-ready", self.state_file))
+
+    def test_given_deferred_event_when_needs_dispatch_then_unobserved_hook_is_dispatched(self):
+        self._create_state(deferred=True)
+
+        self.assertTrue(needs_dispatch("hooks/leader-elected", self.state_file))
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_unchanged_workload_health_when_needs_dispatch_then_update_status_is_skipped(
+        self,
+    ):
+        self._start_pebble(PEBBLE_STATE)
+        self._create_state(workload_health=json.dumps(self.workload_health))
+
+        self.assertFalse(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_failing_check_when_needs_dispatch_then_update_status_is_dispatched(self):
+        self._start_pebble(
+            {**PEBBLE_STATE, "checks": [{"name": "smf-sbi", "level": "ready", "status": "down"}]}
+        )
+        self._create_state(workload_health=json.dumps(self.workload_health))
+
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_modified_config_file_when_needs_dispatch_then_update_status_is_dispatched(
+        self,
+    ):
+        config_file = {**PEBBLE_STATE["files"][0], "last-modified": "2022-08-10T10:00:00Z"}
+        self._start_pebble({**PEBBLE_STATE, "files": [config_file]})
+        self._create_state(workload_health=json.dumps(self.workload_health))
+
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
+
+    def test_given_unreachable_pebble_when_needs_dispatch_then_update_status_is_dispatched(
+        self,
+    ):
+        self._create_state(workload_health=json.dumps(self.workload_health))
+
+        self.assertTrue(needs_dispatch("hooks/update-status", self.state_file))
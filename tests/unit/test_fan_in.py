@@ -0,0 +1,56 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import subprocess
+import sys
+import unittest
+
+FAN_INS = [20, 100, 300]
+# 1 for a linear growth, 2 for a quadratic one
+MAX_GROWTH_EXPONENT = 1.5
+
+
+class TestFanIn(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        process = subprocess.run(
+            [
+                sys.executable,
+                "tests/benchmark/fan_in.py",
+                *[argument for fan_in in FAN_INS for argument in ("--fan-in", str(fan_in))],
+                "--json",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        cls.reports = {report["layout"]: report for report in json.loads(process.stdout)}
+
+    def test_given_hundreds_of_related_applications_when_relation_changed_then_growth_is_linear(
+        self,
+    ):
+        growth = self.reports["applications"]["growth"]
+
+        for metric in ("hook-ms", "relation-gets", "peak-kib"):
+            with self.subTest(metric=metric):
+                self.assertLessEqual(growth[metric], MAX_GROWTH_EXPONENT)
+
+    def test_given_hundreds_of_related_units_when_relation_changed_then_growth_is_linear(self):
+        growth = self.reports["units"]["growth"]
+
+        for metric in ("hook-ms", "relation-gets", "peak-kib"):
+            with self.subTest(metric=metric):
+                self.assertLessEqual(growth[metric], MAX_GROWTH_EXPONENT)
+
+    def test_given_related_applications_when_relation_changed_then_their_data_is_read_once(self):
+        for result in self.reports["applications"]["results"]:
+            with self.subTest(fan_in=result["fan-in"]):
+                # The application data of each provider, and the unit data of each AMF
+                self.assertLessEqual(result["relation-gets"], 4 * result["fan-in"] + 1)
+
+    def test_given_related_units_when_relation_changed_then_only_amf_unit_data_is_read(self):
+        for result in self.reports["units"]["results"]:
+            with self.subTest(fan_in=result["fan-in"]):
+                # The application data of each provider, and the unit data of the AMF set
+                self.assertEqual(result["relation-gets"], result["fan-in"] + 4)
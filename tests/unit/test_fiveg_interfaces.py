@@ -0,0 +1,224 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import unittest
+from unittest.mock import patch
+
+import ops.testing
+from charms.oai_5g_amf.v0.fiveg_amf import FiveGAMFRequires as FiveGAMFRequiresV0
+from charms.oai_5g_amf.v1 import fiveg_amf
+from charms.oai_5g_amf.v1.fiveg_amf import (
+    AMFInformation,
+    FiveGAMFProvides,
+    FiveGAMFRequires,
+)
+from charms.oai_5g_upf.v1.fiveg_upf import FiveGUPFRequires, UPFInformation
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+METADATA = """
+name: interfaces
+requires:
+  fiveg-amf:
+    interface: fiveg-amf
+  fiveg-upf:
+    interface: fiveg-upf
+provides:
+  amf:
+    interface: fiveg-amf
+"""
+
+
+class InterfacesCharm(CharmBase):
+    def __init__(self, *args):
+        """Init."""
+        super().__init__(*args)
+        self.amf_requires = FiveGAMFRequires(self, "fiveg-amf")
+        self.upf_requires = FiveGUPFRequires(self, "fiveg-upf")
+        self.amf_provides = FiveGAMFProvides(self, "amf")
+
+
+class V0RequirerCharm(CharmBase):
+    def __init__(self, *args):
+        """Init."""
+        super().__init__(*args)
+        self.amf_requires = FiveGAMFRequiresV0(self, "fiveg-amf")
+        self.available_amfs = []
+        self.framework.observe(self.amf_requires.on.amf_available, self._on_amf_available)
+
+    def _on_amf_available(self, event):
+        self.available_amfs.append(
+            (event.amf_ipv4_address, event.amf_fqdn, event.amf_port, event.amf_api_version)
+        )
+
+
+class TestFiveGInterfaces(unittest.TestCase):
+    def setUp(self):
+        ops.testing.SIMULATE_CAN_CONNECT = True
+        self.addCleanup(setattr, ops.testing, "SIMULATE_CAN_CONNECT", False)
+        self.harness = Harness(InterfacesCharm, meta=METADATA)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+    def _add_relation(self, relation_name, remote_app, data):
+        relation_id = self.harness.add_relation(relation_name, remote_app)
+        self.harness.add_relation_unit(relation_id, f"{remote_app}/0")
+        self.harness.update_relation_data(relation_id, remote_app, data)
+        return relation_id
+
+    def test_given_v1_document_with_several_upfs_when_upfs_then_all_upfs_are_returned(self):
+        document = {
+            "version": 1,
+            "upfs": [
+                {"ipv4_address": "1.2.3.4", "fqdn": "upf-0.example.com"},
+                {"ipv4_address": "1.2.3.5", "fqdn": "upf-1.example.com"},
+            ],
+        }
+        self._add_relation("fiveg-upf", "upf", {"fiveg_upf": json.dumps(document)})
+
+        self.assertEqual(
+            self.harness.charm.upf_requires.upfs,
+            [
+                UPFInformation(ipv4_address="1.2.3.4", fqdn="upf-0.example.com"),
+                UPFInformation(ipv4_address="1.2.3.5", fqdn="upf-1.example.com"),
+            ],
+        )
+
+    def test_given_v0_keys_when_amfs_then_single_amf_is_returned(self):
+        self._add_relation(
+            "fiveg-amf",
+            "amf",
+            {
+                "amf_ipv4_address": "1.2.3.4",
+                "amf_fqdn": "amf.example.com",
+                "amf_port": "80",
+                "amf_api_version": "v1",
+            },
+        )
+
+        self.assertEqual(
+            self.harness.charm.amf_requires.amfs,
+            [
+                AMFInformation(
+                    ipv4_address="1.2.3.4", fqdn="amf.example.com", port=80, api_version="v1"
+                )
+            ],
+        )
+
+    def test_given_document_not_matching_schema_when_amfs_then_no_amf_is_returned(self):
+        document = {
+            "version": 1,
+            "amfs": [
+                {
+                    "ipv4_address": "1.2.3.4",
+                    "fqdn": "amf.example.com",
+                    "port": "80",
+                    "api_version": "v1",
+                }
+            ],
+        }
+
+        with self.assertLogs(fiveg_amf.logger, "WARNING") as logs:
+            self._add_relation("fiveg-amf", "amf", {"fiveg_amf": json.dumps(document)})
+
+        self.assertEqual(self.harness.charm.amf_requires.amfs, [])
+        self.assertIn("$.amfs[0].port must be of type integer", logs.output[0])
+
+    def test_given_relation_changed_when_amfs_then_document_is_parsed_once(self):
+        document = {
+            "version": 1,
+            "amfs": [{"ipv4_address": "1.2.3.4", "fqdn": "amf", "port": 80, "api_version": "v1"}],
+        }
+
+        with patch.object(fiveg_amf, "parse", wraps=fiveg_amf.parse) as patch_parse:
+            self._add_relation("fiveg-amf", "amf", {"fiveg_amf": json.dumps(document)})
+            self.harness.charm.amf_requires.amfs
+            self.harness.charm.amf_requires.amf
+
+        patch_parse.assert_called_once()
+
+    def test_given_v0_keys_and_no_v0_write_when_set_amf_information_then_single_key_replaces_them(  # noqa: E501
+        self,
+    ):
+        self.harness.set_leader(True)
+        relation_id = self._add_relation("amf", "smf", {})
+        self.harness.update_relation_data(relation_id, "interfaces", {"amf_port": "80"})
+        amfs = [
+            AMFInformation(ipv4_address="1.2.3.4", fqdn="amf-0", port=80, api_version="v1"),
+            AMFInformation(ipv4_address="1.2.3.5", fqdn="amf-1", port=80, api_version="v1"),
+        ]
+
+        self.harness.charm.amf_provides.set_amf_information(
+            amfs=amfs, relation_id=relation_id, write_v0=False
+        )
+
+        data = self.harness.get_relation_data(relation_id, "interfaces")
+        self.assertEqual(list(data), ["fiveg_amf"])
+        self.assertEqual(fiveg_amf.parse(data), amfs)
+
+    def test_given_amf_set_units_when_amfs_then_unit_amfs_are_gathered_without_duplicates(
+        self,
+    ):
+        amf_0 = {"ipv4_address": "1.2.3.4", "fqdn": "amf-0", "port": 80, "api_version": "v1"}
+        amf_1 = {"ipv4_address": "1.2.3.5", "fqdn": "amf-1", "port": 80, "api_version": "v1"}
+        relation_id = self._add_relation(
+            "fiveg-amf", "amf", {"fiveg_amf": json.dumps({"version": 1, "amfs": [amf_0]})}
+        )
+        self.harness.add_relation_unit(relation_id, "amf/1")
+
+        self.harness.update_relation_data(
+            relation_id, "amf/0", {"fiveg_amf": json.dumps({"version": 1, "amfs": [amf_0]})}
+        )
+        self.harness.update_relation_data(
+            relation_id, "amf/1", {"fiveg_amf": json.dumps({"version": 1, "amfs": [amf_1]})}
+        )
+
+        self.assertEqual(
+            self.harness.charm.amf_requires.amfs,
+            [AMFInformation(**amf_0), AMFInformation(**amf_1)],
+        )
+
+    def test_given_invalid_unit_document_when_amfs_then_other_amfs_are_returned(self):
+        amf = {"ipv4_address": "1.2.3.4", "fqdn": "amf-0", "port": 80, "api_version": "v1"}
+        relation_id = self._add_relation(
+            "fiveg-amf", "amf", {"fiveg_amf": json.dumps({"version": 1, "amfs": [amf]})}
+        )
+
+        with self.assertLogs(fiveg_amf.logger, "WARNING") as logs:
+            self.harness.update_relation_data(relation_id, "amf/0", {"fiveg_amf": "{"})
+
+        self.assertEqual(self.harness.charm.amf_requires.amfs, [AMFInformation(**amf)])
+        self.assertIn("Invalid AMF data from amf/0", logs.output[0])
+
+    def test_given_unit_amf_when_set_unit_amf_information_then_unit_databag_is_set(self):
+        relation_id = self._add_relation("amf", "smf", {})
+        amf = AMFInformation(ipv4_address="1.2.3.4", fqdn="amf-0", port=80, api_version="v1")
+
+        self.harness.charm.amf_provides.set_unit_amf_information(amf=amf, relation_id=relation_id)
+
+        data = self.harness.get_relation_data(relation_id, "interfaces/0")
+        self.assertEqual(fiveg_amf.parse(data), [amf])
+
+    def test_given_v1_provider_when_v0_requirer_reads_relation_data_then_first_amf_is_available(  # noqa: E501
+        self,
+    ):
+        self.harness.set_leader(True)
+        relation_id = self._add_relation("amf", "smf", {})
+        amfs = [
+            AMFInformation(ipv4_address="1.2.3.4", fqdn="amf-0", port=80, api_version="v1"),
+            AMFInformation(ipv4_address="1.2.3.5", fqdn="amf-1", port=80, api_version="v1"),
+        ]
+        self.harness.charm.amf_provides.set_amf_information(amfs=amfs, relation_id=relation_id)
+        provider_data = dict(self.harness.get_relation_data(relation_id, "interfaces"))
+        v0_harness = Harness(V0RequirerCharm, meta=METADATA)
+        self.addCleanup(v0_harness.cleanup)
+        v0_harness.begin()
+
+        v0_relation_id = v0_harness.add_relation("fiveg-amf", "amf")
+        v0_harness.add_relation_unit(v0_relation_id, "amf/0")
+        v0_harness.update_relation_data(v0_relation_id, "amf", provider_data)
+
+        self.assertEqual(v0_harness.charm.available_amfs, [("1.2.3.4", "amf-0", "80", "v1")])
+        self.assertEqual(v0_harness.charm.amf_requires.amf_ipv4_address, "1.2.3.4")
+        self.assertEqual(fiveg_amf.parse(provider_data), amfs)
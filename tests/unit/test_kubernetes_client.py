@@ -0,0 +1,436 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import Mock, patch
+
+from lightkube import ApiError
+from lightkube.models.apps_v1 import StatefulSetSpec
+from lightkube.models.core_v1 import (
+    ConfigMapVolumeSource,
+    Container,
+    PodSecurityContext,
+    PodSpec,
+    PodTemplateSpec,
+    ResourceRequirements,
+    ServicePort,
+    ServiceSpec,
+    Sysctl,
+    Volume,
+    VolumeMount,
+)
+from lightkube.models.meta_v1 import LabelSelector, ManagedFieldsEntry, ObjectMeta
+from lightkube.resources.apps_v1 import StatefulSet
+from lightkube.resources.core_v1 import Service
+from lightkube.types import PatchType
+
+from kubernetes_client import KubernetesClient, KubernetesClientError
+
+
+def _statefulset_with_resources(
+    resources,
+    node_selector=None,
+    annotations=None,
+    sysctls=None,
+    volumes=None,
+    volume_mounts=None,
+):
+    return StatefulSet(
+        metadata=ObjectMeta(annotations=annotations),
+        spec=StatefulSetSpec(
+            selector=LabelSelector(),
+            serviceName="smf",
+            template=PodTemplateSpec(
+                spec=PodSpec(
+                    containers=[
+                        Container(name="smf", resources=resources, volumeMounts=volume_mounts)
+                    ],
+                    nodeSelector=node_selector,
+                    securityContext=PodSecurityContext(sysctls=sysctls),
+                    volumes=volumes,
+                )
+            ),
+        ),
+    )
+
+
+PORTS = [
+    ServicePort(name="oai-smf", port=8805, protocol="UDP", targetPort=8805),
+    ServicePort(name="http1", port=80, protocol="TCP", targetPort=80),
+]
+
+
+def _service(ports, service_type="ClusterIP", external_traffic_policy=None, owned_fields=None):
+    managed_fields = [
+        ManagedFieldsEntry(manager="juju", operation="Update", fieldsV1={"f:spec": {}}),
+    ]
+    if owned_fields is not None:
+        managed_fields.append(
+            ManagedFieldsEntry(
+                manager="smf-0", operation="Apply", fieldsV1={"f:spec": owned_fields}
+            )
+        )
+    return Service(
+        metadata=ObjectMeta(managedFields=managed_fields),
+        spec=ServiceSpec(
+            ports=ports,
+            type=service_type,
+            clusterIP="10.0.0.1",
+            externalTrafficPolicy=external_traffic_policy,
+            sessionAffinity="None",
+        ),
+    )
+
+
+def _owned_ports(ports):
+    return {
+        "f:ports": {
+            f'k:{{"port":{port.port},"protocol":"{port.protocol}"}}': {".": {}} for port in ports
+        }
+    }
+
+
+class TestKubernetesClient(unittest.TestCase):
+    @patch("kubernetes_client.Client")
+    def setUp(self, patch_client):
+        self.lightkube_client = patch_client.return_value
+        self.client = KubernetesClient(namespace="model", field_manager="smf-0")
+
+    def test_given_entry_when_apply_config_map_entry_then_config_map_is_server_side_applied(self):
+        self.client.apply_config_map_entry(
+            name="smf-config", key="smf-0.conf", content="abc", annotations={"a/b": "c"}
+        )
+
+        config_map = self.lightkube_client.apply.call_args.args[0]
+        self.assertEqual(config_map.metadata.name, "smf-config")
+        self.assertEqual(config_map.metadata.annotations, {"a/b": "c"})
+        self.assertEqual(config_map.data, {"smf-0.conf": "abc"})
+        self.assertEqual(self.lightkube_client.apply.call_args.kwargs["force"], True)
+
+    def test_given_api_forbidden_when_apply_config_map_entry_then_error_is_raised(self):
+        self.lightkube_client.apply.side_effect = ApiError(
+            response=Mock(json=Mock(return_value={"code": 403, "message": "forbidden"}))
+        )
+
+        with self.assertRaises(KubernetesClientError) as context:
+            self.client.apply_config_map_entry(
+                name="smf-config", key="smf-0.conf", content="abc", annotations={}
+            )
+
+        self.assertIn("juju trust", str(context.exception))
+
+    def test_given_config_map_mounted_when_patch_workload_resources_then_statefulset_is_not_patched(  # noqa: E501
+        self,
+    ):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(),
+            volumes=[Volume(name="cm", configMap=ConfigMapVolumeSource(name="smf-config"))],
+            volume_mounts=[VolumeMount(name="cm", mountPath="/etc-cm")],
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={},
+            limits={},
+            node_selector={},
+            config_map_name="smf-config",
+            config_map_mount_path="/etc-cm",
+        )
+
+        self.assertFalse(patched)
+        self.lightkube_client.patch.assert_not_called()
+
+    def test_given_config_map_not_mounted_when_patch_workload_resources_then_volume_and_mount_are_patched(  # noqa: E501
+        self,
+    ):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(),
+            volumes=[Volume(name="cm", configMap=ConfigMapVolumeSource(name="other-config"))],
+            volume_mounts=[VolumeMount(name="cm", mountPath="/etc-cm")],
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={},
+            limits={},
+            node_selector={},
+            config_map_name="smf-config",
+            config_map_mount_path="/etc-cm",
+        )
+
+        self.assertTrue(patched)
+        args, kwargs = self.lightkube_client.patch.call_args
+        self.assertEqual(kwargs["patch_type"], PatchType.STRATEGIC)
+        pod_spec = args[2]["spec"]["template"]["spec"]
+        self.assertEqual(
+            pod_spec["volumes"], [{"name": "smf-config", "configMap": {"name": "smf-config"}}]
+        )
+        self.assertEqual(
+            pod_spec["containers"][0]["volumeMounts"],
+            [{"name": "smf-config", "mountPath": "/etc-cm"}],
+        )
+
+    def test_given_service_spec_matches_when_apply_service_then_service_is_not_applied(self):
+        self.lightkube_client.get.return_value = _service(
+            [
+                ServicePort(name="http1", port=80, protocol="TCP", targetPort=80, nodePort=3),
+                ServicePort(name="oai-smf", port=8805, protocol="UDP", targetPort=8805),
+            ]
+        )
+
+        self.assertFalse(self.client.apply_service(name="smf", ports=PORTS))
+
+        self.lightkube_client.apply.assert_not_called()
+
+    def test_given_service_type_differs_when_apply_service_then_service_is_server_side_applied(
+        self,
+    ):
+        self.lightkube_client.get.return_value = _service(PORTS)
+
+        self.assertTrue(
+            self.client.apply_service(name="smf", ports=PORTS, service_type="NodePort")
+        )
+
+        service = self.lightkube_client.apply.call_args.args[0]
+        self.assertEqual(service.spec.type, "NodePort")
+        self.assertEqual(service.spec.ports, PORTS)
+        self.assertEqual(self.lightkube_client.apply.call_args.kwargs["field_manager"], "smf-0")
+        self.assertEqual(self.lightkube_client.apply.call_args.kwargs["force"], True)
+        self.lightkube_client.patch.assert_not_called()
+
+    def test_given_protocol_differs_when_apply_service_then_service_is_applied(self):
+        self.lightkube_client.get.return_value = _service(
+            [
+                ServicePort(name="oai-smf", port=8805, protocol="TCP", targetPort=8805),
+                ServicePort(name="http1", port=80, protocol="TCP", targetPort=80),
+            ]
+        )
+
+        self.assertTrue(self.client.apply_service(name="smf", ports=PORTS))
+
+    def test_given_placeholder_port_of_other_manager_when_apply_service_then_service_is_not_applied(  # noqa: E501
+        self,
+    ):
+        placeholder = ServicePort(name="placeholder", port=65535, protocol="TCP")
+        self.lightkube_client.get.return_value = _service(
+            [placeholder, *PORTS], owned_fields=_owned_ports(PORTS)
+        )
+
+        self.assertFalse(self.client.apply_service(name="smf", ports=PORTS))
+
+        self.lightkube_client.apply.assert_not_called()
+        self.lightkube_client.patch.assert_not_called()
+
+    def test_given_stale_owned_port_when_apply_service_then_service_is_applied(self):
+        stale_port = ServicePort(name="http1", port=8080, protocol="TCP", targetPort=8080)
+        self.lightkube_client.get.return_value = _service(
+            [*PORTS, stale_port], owned_fields=_owned_ports([*PORTS, stale_port])
+        )
+
+        self.assertTrue(self.client.apply_service(name="smf", ports=PORTS))
+
+        self.assertEqual(self.lightkube_client.apply.call_args.args[0].spec.ports, PORTS)
+
+    def test_given_stale_owned_field_when_apply_service_then_service_is_applied(self):
+        self.lightkube_client.get.return_value = _service(
+            PORTS,
+            external_traffic_policy="Local",
+            owned_fields={"f:externalTrafficPolicy": {}, **_owned_ports(PORTS)},
+        )
+
+        self.assertTrue(self.client.apply_service(name="smf", ports=PORTS))
+
+        spec = self.lightkube_client.apply.call_args.args[0].spec
+        self.assertIsNone(spec.externalTrafficPolicy)
+
+    def test_given_field_of_other_manager_when_apply_service_then_service_is_not_applied(self):
+        self.lightkube_client.get.return_value = _service(
+            PORTS, external_traffic_policy="Cluster", owned_fields=_owned_ports(PORTS)
+        )
+
+        self.assertFalse(self.client.apply_service(name="smf", ports=PORTS))
+
+    def test_given_service_not_found_when_apply_service_then_service_is_created(self):
+        self.lightkube_client.get.side_effect = ApiError(
+            response=Mock(json=Mock(return_value={"code": 404, "message": "not found"}))
+        )
+
+        self.assertTrue(self.client.apply_service(name="smf-sbi", ports=PORTS))
+
+        self.lightkube_client.apply.assert_called_once()
+
+    def test_given_session_affinity_timeout_when_apply_service_then_client_ip_affinity_is_applied(
+        self,
+    ):
+        self.lightkube_client.get.return_value = _service(PORTS)
+
+        self.client.apply_service(
+            name="smf",
+            ports=PORTS,
+            service_type="LoadBalancer",
+            external_traffic_policy="Local",
+            session_affinity_timeout=600,
+        )
+
+        spec = self.lightkube_client.apply.call_args.args[0].spec
+        self.assertEqual(spec.externalTrafficPolicy, "Local")
+        self.assertEqual(spec.sessionAffinity, "ClientIP")
+        self.assertEqual(spec.sessionAffinityConfig.clientIP.timeoutSeconds, 600)
+
+    def test_given_resources_match_in_other_notation_when_patch_workload_resources_then_statefulset_is_not_patched(  # noqa: E501
+        self,
+    ):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(
+                requests={"cpu": "2", "memory": "1Gi"}, limits={"cpu": "2", "memory": "1Gi"}
+            ),
+            node_selector={"zone": "a", "kubernetes.io/os": "linux"},
+            annotations={"smf-0/node-selector-keys": '["zone"]'},
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={"cpu": "2000m", "memory": "1024Mi"},
+            limits={"cpu": "2", "memory": "1Gi"},
+            node_selector={"zone": "a"},
+        )
+
+        self.assertFalse(patched)
+        self.lightkube_client.patch.assert_not_called()
+
+    def test_given_resources_differ_when_patch_workload_resources_then_statefulset_is_patched(
+        self,
+    ):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(limits={"cpu": "1"}),
+            node_selector={"zone": "a", "kubernetes.io/os": "linux"},
+            annotations={"smf-0/node-selector-keys": '["zone"]'},
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={"cpu": "2"},
+            limits={"cpu": "2"},
+            node_selector={"rack": "r1"},
+        )
+
+        self.assertTrue(patched)
+        args, kwargs = self.lightkube_client.patch.call_args
+        self.assertEqual(kwargs["patch_type"], PatchType.STRATEGIC)
+        self.assertEqual(
+            args[2]["metadata"]["annotations"], {"smf-0/node-selector-keys": '["rack"]'}
+        )
+        pod_spec = args[2]["spec"]["template"]["spec"]
+        self.assertEqual(pod_spec["nodeSelector"], {"zone": None, "rack": "r1"})
+        self.assertEqual(
+            pod_spec["containers"][0]["resources"]["limits"],
+            {"cpu": "2", "memory": None, "hugepages-2Mi": None, "hugepages-1Gi": None},
+        )
+
+    def test_given_other_containers_resources_when_patch_workload_resources_then_every_container_has_limits_equal_to_requests(  # noqa: E501
+        self,
+    ):
+        statefulset = _statefulset_with_resources(ResourceRequirements())
+        pod_spec = statefulset.spec.template.spec  # type: ignore[union-attr]
+        pod_spec.containers.append(Container(name="charm"))  # type: ignore[union-attr]
+        pod_spec.initContainers = [Container(name="charm-init")]  # type: ignore[union-attr]
+        self.lightkube_client.get.return_value = statefulset
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={"cpu": "2", "memory": "1Gi"},
+            limits={"cpu": "2", "memory": "1Gi"},
+            node_selector={},
+            other_containers_resources={"cpu": "500m", "memory": "512Mi"},
+        )
+
+        self.assertTrue(patched)
+        template = self.lightkube_client.patch.call_args.args[2]["spec"]["template"]["spec"]
+        containers = template["containers"] + template["initContainers"]
+        self.assertEqual(
+            [container["name"] for container in containers], ["smf", "charm", "charm-init"]
+        )
+        for container in containers:
+            resources = container["resources"]
+            self.assertEqual(resources["limits"], resources["requests"])
+            self.assertIsNotNone(resources["limits"]["cpu"])
+            self.assertIsNotNone(resources["limits"]["memory"])
+
+    def test_given_other_containers_resources_match_when_patch_workload_resources_then_statefulset_is_not_patched(  # noqa: E501
+        self,
+    ):
+        resources = ResourceRequirements(
+            requests={"cpu": "500m", "memory": "512Mi"}, limits={"cpu": "0.5", "memory": "512Mi"}
+        )
+        statefulset = _statefulset_with_resources(ResourceRequirements())
+        pod_spec = statefulset.spec.template.spec  # type: ignore[union-attr]
+        pod_spec.containers.append(  # type: ignore[union-attr]
+            Container(name="charm", resources=resources)
+        )
+        pod_spec.initContainers = [  # type: ignore[union-attr]
+            Container(name="charm-init", resources=resources)
+        ]
+        self.lightkube_client.get.return_value = statefulset
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={},
+            limits={},
+            node_selector={},
+            other_containers_resources={"cpu": "500m", "memory": "512Mi"},
+        )
+
+        self.assertFalse(patched)
+
+    def test_given_sysctls_match_when_patch_workload_resources_then_statefulset_is_not_patched(
+        self,
+    ):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(),
+            sysctls=[Sysctl(name="net.core.rmem_max", value="8388608")],
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={},
+            limits={},
+            node_selector={},
+            sysctls={"net.core.rmem_max": "8388608"},
+        )
+
+        self.assertFalse(patched)
+        self.lightkube_client.patch.assert_not_called()
+
+    def test_given_sysctls_differ_when_patch_workload_resources_then_sysctls_are_replaced(self):
+        self.lightkube_client.get.return_value = _statefulset_with_resources(
+            ResourceRequirements(),
+            sysctls=[Sysctl(name="net.ipv4.ip_local_port_range", value="1024 65535")],
+        )
+
+        patched = self.client.patch_workload_resources(
+            statefulset_name="smf",
+            container_name="smf",
+            requests={},
+            limits={},
+            node_selector={},
+            sysctls={"net.core.wmem_max": "8388608", "net.core.rmem_max": "8388608"},
+        )
+
+        self.assertTrue(patched)
+        args, _ = self.lightkube_client.patch.call_args
+        self.assertEqual(
+            args[2]["spec"]["template"]["spec"]["securityContext"],
+            {
+                "sysctls": [
+                    {"name": "net.core.rmem_max", "value": "8388608"},
+                    {"name": "net.core.wmem_max", "value": "8388608"},
+                ]
+            },
+        )
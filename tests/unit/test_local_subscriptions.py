@@ -0,0 +1,67 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import tempfile
+import unittest
+
+from local_subscriptions import (
+    SubscriptionImportError,
+    read_subscriptions,
+    unique_subscriptions,
+)
+
+
+class TestLocalSubscriptions(unittest.TestCase):
+    def _write(self, content):
+        file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        self.addCleanup(file.close)
+        file.write(content)
+        file.flush()
+        return file.name
+
+    def test_given_csv_file_when_read_subscriptions_then_defaults_are_filled_in(self):
+        path = self._write("sst,dnn,session_ambr_ul\n1,internet,100Mbps\n")
+
+        subscriptions = list(read_subscriptions(path))
+
+        self.assertEqual(len(subscriptions), 1)
+        self.assertEqual(subscriptions[0]["sd"], "0xFFFFFF")
+        self.assertEqual(subscriptions[0]["session_ambr_ul"], "100Mbps")
+        self.assertEqual(subscriptions[0]["session_ambr_dl"], "22Mbps")
+
+    def test_given_json_lines_file_when_read_subscriptions_then_subscriptions_are_read(self):
+        path = self._write('{"sst": 1, "dnn": "internet"}\n\n{"sst": 2, "dnn": "ims"}\n')
+
+        subscriptions = list(read_subscriptions(path))
+
+        self.assertEqual(
+            [subscription["dnn"] for subscription in subscriptions], ["internet", "ims"]
+        )
+
+    def test_given_unknown_field_when_read_subscriptions_then_error_gives_line(self):
+        path = self._write('{"sst": 1, "dnn": "internet"}\n{"sst": 1, "apn": "ims"}\n')
+
+        with self.assertRaisesRegex(SubscriptionImportError, "line 2: unknown fields apn"):
+            list(read_subscriptions(path))
+
+    def test_given_duplicate_keys_when_unique_subscriptions_then_first_one_is_kept(self):
+        path = self._write(
+            "sst,sd,dnn,qos_5qi\n1,0xFFFFFF,internet,5\n01,ffffff,Internet,9\n1,1,internet,9\n"
+        )
+
+        subscriptions = list(
+            unique_subscriptions(
+                read_subscriptions(path), excluded_keys=[("1", "000001", "internet")]
+            )
+        )
+
+        self.assertEqual(len(subscriptions), 1)
+        self.assertEqual(subscriptions[0]["qos_5qi"], "5")
+
+    def test_given_large_file_when_unique_subscriptions_then_subscriptions_are_streamed(self):
+        path = self._write("sst,dnn\n" + "".join(f"1,dnn-{index}\n" for index in range(10_000)))
+
+        subscriptions = unique_subscriptions(read_subscriptions(path))
+
+        self.assertEqual(next(subscriptions)["dnn"], "dnn-0")
+        self.assertEqual(sum(1 for _ in subscriptions), 9_999)
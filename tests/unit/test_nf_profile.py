@@ -0,0 +1,143 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import nf_profile
+
+SMF_PROFILES = {
+    "smf-0": {"nfInstanceId": "smf-0", "nfType": "SMF", "ipv4Addresses": ["10.1.0.10"]},
+    "smf-1": {
+        "nfInstanceId": "smf-1",
+        "nfType": "SMF",
+        "ipv4Addresses": ["10.1.0.11"],
+        "capacity": 100,
+        "priority": 1,
+    },
+}
+
+
+class _NRFHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # noqa: N802
+        if self.path.startswith("/nnrf-nfm/v1/nf-instances?"):
+            base = f"http://{self.headers['Host']}/nnrf-nfm/v1/nf-instances"
+            items = [{"href": f"{base}/{instance_id}"} for instance_id in SMF_PROFILES]
+            self._reply(200, {"_links": {"item": items}})
+        elif (instance_id := self.path.rsplit("/", 1)[1]) in SMF_PROFILES:
+            self._reply(200, SMF_PROFILES[instance_id])
+        else:
+            self._reply(404, {"status": 404, "cause": "RESOURCE_URI_STRUCTURE_NOT_FOUND"})
+
+    def do_PATCH(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.patches.append(  # type: ignore[attr-defined]
+            (self.path, self.headers["Content-Type"], json.loads(body))
+        )
+        self.send_response(204)
+        self.end_headers()
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestNFProfile(unittest.TestCase):
+    def test_given_weights_when_parse_weight_then_out_of_range_values_are_rejected(self):
+        self.assertEqual(nf_profile.parse_weight("0", 65535), 0)
+        self.assertEqual(nf_profile.parse_weight("65535", 65535), 65535)
+        for value in ("-1", "65536", "1.5", "high"):
+            with self.assertRaises(ValueError):
+                nf_profile.parse_weight(value, 65535)
+
+    def test_given_cpu_allocations_when_auto_capacity_then_capacity_is_100_per_cpu(self):
+        self.assertEqual(nf_profile.auto_capacity(nf_profile.cpu_millicores("2")), 200)
+        self.assertEqual(nf_profile.auto_capacity(nf_profile.cpu_millicores("1.5")), 150)
+        self.assertEqual(nf_profile.auto_capacity(nf_profile.cpu_millicores("500m")), 50)
+        self.assertEqual(nf_profile.auto_capacity(nf_profile.cpu_millicores("1m")), 1)
+        self.assertEqual(nf_profile.auto_capacity(1000 * nf_profile.cpu_list_size("0-3,8")), 500)
+        with self.assertRaises(ValueError):
+            nf_profile.cpu_millicores("1k")
+
+    def test_given_cgroup_cpu_max_when_cgroup_cpu_millicores_then_quota_is_returned(self):
+        self.assertEqual(nf_profile.cgroup_cpu_millicores("200000 100000\n"), 2000)
+        self.assertEqual(nf_profile.cgroup_cpu_millicores("50000 100000"), 500)
+        self.assertIsNone(nf_profile.cgroup_cpu_millicores("max 100000\n"))
+        with self.assertRaises(ValueError):
+            nf_profile.cgroup_cpu_millicores("200000 0")
+
+    def test_given_session_metrics_when_load_then_load_is_share_of_session_capacity(self):
+        metrics = "smf_pdu_sessions_pending 2\nsmf_pdu_sessions_active 253\n"
+
+        active_sessions = nf_profile.parse_active_sessions(metrics)
+
+        self.assertEqual(active_sessions, 253)
+        self.assertEqual(nf_profile.load(253, 253), 100)
+        self.assertEqual(nf_profile.load(50, 253), 20)
+        self.assertEqual(nf_profile.load(0, 0), 100)
+        self.assertIsNone(nf_profile.parse_active_sessions("smf_pdu_sessions_pending 2\n"))
+
+    def test_given_profile_when_profile_operations_then_only_differing_values_are_patched(self):
+        profile = {"capacity": 100, "priority": 1}
+
+        operations = nf_profile.profile_operations(profile, 200, 1, 30)
+
+        self.assertEqual(
+            operations,
+            [
+                {"op": "replace", "path": "/capacity", "value": 200},
+                {"op": "add", "path": "/load", "value": 30},
+            ],
+        )
+        self.assertEqual(nf_profile.profile_operations(profile, 100, 1, None), [])
+
+
+class TestNRF(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _NRFHandler)
+        self.server.patches = []  # type: ignore[attr-defined]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        address, port = self.server.server_address[:2]
+        self.nrf_url = f"http://{address}:{port}/nnrf-nfm/v1"
+
+    def test_given_registered_instances_when_find_profile_then_profile_with_address_is_returned(
+        self,
+    ):
+        profile = nf_profile.find_profile(self.nrf_url, "SMF", "10.1.0.11", 2)
+
+        self.assertEqual(profile, SMF_PROFILES["smf-1"])
+        self.assertIsNone(nf_profile.find_profile(self.nrf_url, "SMF", "10.1.0.12", 2))
+
+    def test_given_instance_id_when_get_profile_then_profile_is_returned_or_none_if_unknown(
+        self,
+    ):
+        self.assertEqual(nf_profile.get_profile(self.nrf_url, "smf-1", 2), SMF_PROFILES["smf-1"])
+        self.assertIsNone(nf_profile.get_profile(self.nrf_url, "smf-2", 2))
+
+    def test_given_operations_when_update_profile_then_json_patch_is_sent(self):
+        operations = [{"op": "replace", "path": "/capacity", "value": 200}]
+
+        nf_profile.update_profile(self.nrf_url, "smf-1", operations, 2)
+
+        self.assertEqual(
+            self.server.patches,  # type: ignore[attr-defined]
+            [("/nnrf-nfm/v1/nf-instances/smf-1", "application/json-patch+json", operations)],
+        )
+
+    def test_given_unreachable_nrf_when_find_profile_then_nrf_error_is_raised(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        with self.assertRaises(nf_profile.NRFError):
+            nf_profile.find_profile(self.nrf_url, "SMF", "10.1.0.11", 2)
@@ -0,0 +1,93 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import socket
+import struct
+import threading
+import time
+import unittest
+
+import pfcp
+
+
+class FakeUPF(threading.Thread):
+    """Answers PFCP Heartbeat Requests on a local UDP socket."""
+
+    def __init__(self, drop_sequence_numbers=()):
+        """Binds the fake UPF on an ephemeral local port."""
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.drop_sequence_numbers = drop_sequence_numbers
+
+    def run(self):
+        while True:
+            try:
+                message, address = self.sock.recvfrom(2048)
+            except OSError:
+                return
+            (sequence_and_spare,) = struct.unpack("!I", message[4:8])
+            if sequence_and_spare >> 8 in self.drop_sequence_numbers:
+                continue
+            response = bytes([message[0], pfcp.HEARTBEAT_RESPONSE]) + message[2:]
+            self.sock.sendto(response, address)
+
+    def stop(self):
+        self.sock.close()
+
+
+class TestPFCP(unittest.TestCase):
+    def test_given_sequence_number_when_build_heartbeat_request_then_message_is_encoded(self):
+        message = pfcp.build_heartbeat_request(sequence_number=5, recovery_time_stamp=1234)
+
+        self.assertEqual(message, bytes.fromhex("2001000c" "00000500" "00600004000004d2"))
+
+    def test_given_heartbeat_request_when_parse_heartbeat_response_then_none_is_returned(self):
+        message = pfcp.build_heartbeat_request(sequence_number=5, recovery_time_stamp=1234)
+
+        self.assertIsNone(pfcp.parse_heartbeat_response(message))
+
+    def test_given_samples_when_percentile_then_nearest_rank_is_returned(self):
+        samples = [float(value) for value in range(1, 101)]
+
+        self.assertEqual(pfcp.percentile(samples, 50), 50.0)
+        self.assertEqual(pfcp.percentile(samples, 99), 99.0)
+        self.assertIsNone(pfcp.percentile([], 50))
+
+    def test_given_upf_answers_when_probe_then_rtts_are_reported(self):
+        upf = FakeUPF()
+        upf.start()
+        self.addCleanup(upf.stop)
+
+        result = pfcp.probe("127.0.0.1", iterations=5, timeout=1, port=upf.port, interval=0)
+
+        self.assertEqual(result.sent, 5)
+        self.assertEqual(result.received, 5)
+        self.assertEqual(result.summary()["loss-percent"], "0.0")
+
+    def test_given_upf_drops_requests_when_probe_then_loss_is_reported(self):
+        upf = FakeUPF(drop_sequence_numbers=(2, 4))
+        upf.start()
+        self.addCleanup(upf.stop)
+
+        result = pfcp.probe("127.0.0.1", iterations=4, timeout=0.2, port=upf.port, interval=0)
+
+        self.assertEqual(result.received, 2)
+        self.assertEqual(result.summary()["loss-percent"], "50.0")
+
+    def test_given_deadline_passed_when_probe_then_no_request_is_sent(self):
+        upf = FakeUPF()
+        upf.start()
+        self.addCleanup(upf.stop)
+
+        result = pfcp.probe(
+            "127.0.0.1",
+            iterations=5,
+            timeout=1,
+            port=upf.port,
+            interval=0,
+            deadline=time.monotonic(),
+        )
+
+        self.assertEqual(result.sent, 0)
@@ -0,0 +1,118 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import os
+import subprocess
+import unittest
+
+import profiling
+
+PERF_OUTPUT = """\
+oai_smf
+\t    7f8a1b2c3d4e __poll+0x4e
+\t    55d5c0a1b2c3 smf_app::handle_itti_msg+0x23
+\t    55d5c0a1b000 start_thread
+
+smf_n4
+\t    7f8a1b2c3d4e __poll+0x4e
+\t    55d5c0a1b000 start_thread
+
+"""
+EU_STACK_OUTPUT = """\
+PID 12 - process
+TID 12:
+#0  0x00007f8a1b2c3d4e __poll
+#1  0x000055d5c0a1b2c3 smf_app::handle_itti_msg
+TID 13:
+#0  0x00007f8a1b2c3d4e
+--
+"""
+GDB_OUTPUT = """\
+Thread 2 (Thread 0x7f8a1b2c3700 (LWP 13) "smf_n4"):
+#0  0x00007f8a1b2c3d4e in __poll (fds=0x1, nfds=1) at poll.c:29
+#1  smf_n4::read_loop () at smf_n4.cpp:12
+
+Thread 1 (Thread 0x7f8a1b2c3740 (LWP 12)):
+#0  0x00007f8a1b2c3d4e in __poll (fds=0x1, nfds=1) at poll.c:29
+--
+"""
+
+
+class TestProfiling(unittest.TestCase):
+    def test_given_perf_output_when_parse_samples_then_stacks_go_from_root_to_leaf(self):
+        stacks = profiling.parse_samples("perf", PERF_OUTPUT, "oai_smf")
+
+        self.assertEqual(
+            stacks,
+            [
+                ["oai_smf", "oai_smf", "start_thread", "smf_app::handle_itti_msg", "__poll"],
+                ["oai_smf", "smf_n4", "start_thread", "__poll"],
+            ],
+        )
+
+    def test_given_eu_stack_output_when_parse_samples_then_each_thread_is_a_stack(self):
+        stacks = profiling.parse_samples("eu-stack", EU_STACK_OUTPUT, "oai_smf")
+
+        self.assertEqual(
+            stacks,
+            [["oai_smf", "smf_app::handle_itti_msg", "__poll"], ["oai_smf", "[unknown]"]],
+        )
+
+    def test_given_gdb_output_when_parse_samples_then_thread_names_are_root_frames(self):
+        stacks = profiling.parse_samples("gdb", GDB_OUTPUT, "oai_smf")
+
+        self.assertEqual(
+            stacks,
+            [["oai_smf", "smf_n4", "smf_n4::read_loop", "__poll"], ["oai_smf", "__poll"]],
+        )
+
+    def test_given_proc_output_when_parse_samples_then_wait_channels_are_leaves(self):
+        stacks = profiling.parse_samples(
+            "proc", "oai_smf;do_epoll_wait\nsmf_n4;0\n--\n", "oai_smf"
+        )
+
+        self.assertEqual(
+            stacks,
+            [["oai_smf", "oai_smf", "[kernel] do_epoll_wait"], ["oai_smf", "smf_n4", "[running]"]],
+        )
+
+    def test_given_stacks_when_fold_then_collapsed_lines_are_sorted_by_count(self):
+        folded = profiling.fold([["a", "b"], ["a", "c;d"], ["a", "b"]])
+
+        self.assertEqual(profiling.collapsed(folded), "a;b 2\na;c:d 1\n")
+
+    def test_given_gdb_when_profiler_script_then_sampling_is_looped_at_capped_frequency(self):
+        script = profiling.profiler_script("gdb", "/usr/bin/gdb", "12", 2, 99, "/tmp/perf.data")
+
+        self.assertTrue(script.startswith("i=0; while [ $i -lt 20 ]; do /usr/bin/gdb -p 12 "))
+        self.assertIn("echo --; sleep 0.1;", script)
+
+    def test_given_perf_when_profiler_script_then_perf_records_at_requested_frequency(self):
+        script = profiling.profiler_script("perf", "/usr/bin/perf", "12", 5, 99, "/tmp/p.data")
+
+        self.assertTrue(
+            script.startswith("/usr/bin/perf record -q -F 99 -g -p 12 -o /tmp/p.data -- sleep 5")
+        )
+
+    def test_given_running_process_when_proc_fallback_then_its_threads_are_sampled(self):
+        script = profiling.profiler_script("proc", "", str(os.getpid()), 1, 2, "")
+
+        output = subprocess.run(
+            ["/bin/sh", "-c", script], capture_output=True, text=True, check=True
+        ).stdout
+
+        stacks = profiling.parse_samples("proc", output, "python")
+        self.assertGreaterEqual(len(stacks), 2)
+        self.assertTrue(all(len(stack) == 3 for stack in stacks))
+
+    def test_given_process_name_when_pid_script_then_pid_is_printed(self):
+        with open(f"/proc/{os.getpid()}/comm") as f:
+            name = f.read().strip()
+
+        output = subprocess.run(
+            ["/bin/sh", "-c", profiling.PID_SCRIPT.format(name=name)],
+            capture_output=True,
+            text=True,
+        ).stdout
+
+        self.assertTrue(output.strip().isdigit())
@@ -0,0 +1,162 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import io
+import unittest
+import urllib.request
+
+import session_metrics
+from session_metrics import Histogram, SessionMetrics
+
+REQUEST = (
+    "[2022-11-10T10:21:33.000000] [smf] [smf_app] [info] Handle a PDU Session Create SM "
+    "Context Request, SUPI imsi-208950000000031, PDU Session ID 1"
+)
+ACCEPT = (
+    "[2022-11-10T10:21:33.040000] [smf] [smf_n1] [info] PDU Session Establishment Accept, "
+    "SUPI imsi-208950000000031, PDU Session ID 1"
+)
+REJECT = (
+    "[2022-11-10T10:21:33.100000] [smf] [smf_n1] [info] PDU Session Establishment Reject, "
+    "SUPI imsi-208950000000031, PDU Session ID 1, cause INSUFFICIENT_RESOURCES"
+)
+RELEASE = (
+    "[2022-11-10T10:21:40.000000] [smf] [smf_app] [info] PDU Session Release Command, "
+    "SUPI imsi-208950000000031, PDU Session ID 1"
+)
+
+
+class TestSessionMetrics(unittest.TestCase):
+    def test_given_request_and_accept_when_process_line_then_latency_is_observed(self):
+        metrics = SessionMetrics()
+
+        metrics.process_line(REQUEST)
+        metrics.process_line(ACCEPT)
+
+        self.assertEqual(metrics.setup_latency.count, 1)
+        self.assertAlmostEqual(metrics.setup_latency.sum, 0.04, places=6)
+        self.assertEqual(metrics.setup_latency.counts[2], 1)
+        self.assertEqual(len(metrics.active), 1)
+        self.assertEqual(len(metrics.pending), 0)
+
+    def test_given_pebble_logs_prefix_when_process_line_then_session_is_correlated(self):
+        metrics = SessionMetrics()
+
+        metrics.process_line("2022-11-10T10:21:33.000Z [smf] " + REQUEST)
+        metrics.process_line("2022-11-10T10:21:33.041Z [smf] " + ACCEPT)
+
+        self.assertEqual(metrics.setup_latency.count, 1)
+
+    def test_given_reject_when_process_line_then_failure_is_counted_by_cause(self):
+        metrics = SessionMetrics()
+
+        metrics.process_line(REQUEST)
+        metrics.process_line(REJECT)
+
+        self.assertEqual(metrics.failures, {"INSUFFICIENT_RESOURCES": 1})
+        self.assertEqual(metrics.setup_latency.count, 0)
+
+    def test_given_established_session_when_release_then_release_is_counted(self):
+        metrics = SessionMetrics()
+        metrics.process_line(REQUEST)
+        metrics.process_line(ACCEPT)
+
+        metrics.process_line(RELEASE)
+
+        self.assertEqual(metrics.releases, 1)
+        self.assertEqual(len(metrics.active), 0)
+
+    def test_given_accept_without_request_when_process_line_then_nothing_is_observed(self):
+        metrics = SessionMetrics()
+
+        metrics.process_line(ACCEPT)
+
+        self.assertEqual(metrics.setup_latency.count, 0)
+        self.assertEqual(len(metrics.active), 0)
+
+    def test_given_more_pending_sessions_than_maximum_when_request_then_oldest_time_out(self):
+        metrics = SessionMetrics(max_pending=2)
+
+        for pdu_session_id in range(1, 5):
+            metrics.process_line(REQUEST.replace("ID 1", f"ID {pdu_session_id}"))
+
+        self.assertEqual(
+            list(metrics.pending), [("imsi-208950000000031", "3"), ("imsi-208950000000031", "4")]
+        )
+        self.assertEqual(metrics.failures, {"timeout": 2})
+
+    def test_given_pending_session_older_than_timeout_when_next_line_then_it_times_out(self):
+        metrics = SessionMetrics(pending_timeout=5)
+        metrics.process_line(REQUEST)
+
+        metrics.process_line(RELEASE.replace("ID 1", "ID 2"))
+
+        self.assertEqual(len(metrics.pending), 0)
+        self.assertEqual(metrics.failures, {"timeout": 1})
+
+    def test_given_more_causes_than_maximum_when_reject_then_others_are_counted_as_other(self):
+        metrics = SessionMetrics(max_causes=1)
+
+        for cause in ("A", "B", "C"):
+            metrics.process_line(REQUEST)
+            metrics.process_line(REJECT.replace("INSUFFICIENT_RESOURCES", cause))
+
+        self.assertEqual(metrics.failures, {"A": 1, "other": 2})
+
+    def test_given_unrelated_line_when_process_line_then_metrics_are_unchanged(self):
+        metrics = SessionMetrics()
+
+        metrics.process_line("[2022-11-10T10:21:33.000000] [smf] [smf_app] [info] Started")
+
+        self.assertEqual(metrics.render().count("} 0\n"), 11)
+
+    def test_given_session_when_render_then_metrics_are_in_prometheus_text_format(self):
+        metrics = SessionMetrics()
+        metrics.process_line(REQUEST)
+        metrics.process_line(ACCEPT)
+        metrics.process_line(REQUEST.replace("ID 1", "ID 2"))
+        metrics.process_line(REJECT.replace("ID 1", "ID 2"))
+
+        text = metrics.render()
+
+        self.assertIn("# TYPE smf_pdu_session_setup_seconds histogram\n", text)
+        self.assertIn('smf_pdu_session_setup_seconds_bucket{le="0.025"} 0\n', text)
+        self.assertIn('smf_pdu_session_setup_seconds_bucket{le="0.05"} 1\n', text)
+        self.assertIn('smf_pdu_session_setup_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("smf_pdu_session_setup_seconds_count 1\n", text)
+        self.assertNotIn("window", text)
+        self.assertIn(
+            'smf_pdu_session_setup_failures_total{cause="INSUFFICIENT_RESOURCES"} 1\n', text
+        )
+        self.assertIn("smf_pdu_sessions_active 1\n", text)
+
+    def test_given_stream_when_consume_and_serve_then_metrics_are_served_over_http(self):
+        metrics = SessionMetrics()
+        session_metrics.consume(io.StringIO(f"{REQUEST}\n{ACCEPT}\n"), metrics)
+        server = session_metrics.serve(metrics, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as r:
+            text = r.read().decode()
+
+        self.assertIn("smf_pdu_session_setup_seconds_count 1\n", text)
+
+
+class TestHistograms(unittest.TestCase):
+    def test_given_values_when_observe_then_buckets_are_cumulative_when_rendered(self):
+        histogram = Histogram(buckets=(1.0, 2.0))
+
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+
+        self.assertEqual(
+            histogram.render("latency"),
+            [
+                'latency_bucket{le="1.0"} 1',
+                'latency_bucket{le="2.0"} 3',
+                'latency_bucket{le="+Inf"} 4',
+                "latency_sum 6.5",
+                "latency_count 4",
+            ],
+        )
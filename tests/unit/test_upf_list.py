@@ -0,0 +1,68 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import unittest
+
+import upf_list
+
+UPFS = [
+    {"ipv4_address": "10.0.0.1", "fqdn": "upf-core.example.com"},
+    {"ipv4_address": "10.0.0.2", "fqdn": "upf-edge.example.com"},
+    {"ipv4_address": "10.0.0.3", "fqdn": "upf-spare.example.com"},
+]
+
+
+class TestUPFList(unittest.TestCase):
+    def test_given_entries_when_parse_entries_then_upfs_and_network_instances_are_parsed(self):
+        entries = upf_list.parse_entries(
+            "upf-edge.example.com:access.edge:core.edge, 10.0.0.1:access.oai.org:core.oai.org"
+        )
+
+        self.assertEqual(
+            entries,
+            [
+                upf_list.Entry("upf-edge.example.com", "access.edge", "core.edge"),
+                upf_list.Entry("10.0.0.1", "access.oai.org", "core.oai.org"),
+            ],
+        )
+
+    def test_given_invalid_entries_when_parse_entries_then_value_error_is_raised(self):
+        for value in (
+            "internet=upf-core.example.com",
+            "upf-core.example.com:access.oai.org",
+            "upf-core.example.com:access.oai.org:core.oai.org,upf-edge",
+            "upf-core,upf-core",
+        ):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                upf_list.parse_entries(value)
+
+    def test_given_entries_when_upf_list_then_related_upfs_are_listed_in_entry_order(self):
+        entries = upf_list.parse_entries(
+            "upf-edge.example.com:access.edge:core.edge,upf-gone:access:core,10.0.0.1:access:core"
+        )
+
+        upfs = upf_list.upf_list(entries, UPFS)
+
+        self.assertEqual(
+            upfs,
+            [
+                {**UPFS[1], "domain_access": "access.edge", "domain_core": "core.edge"},
+                {**UPFS[0], "domain_access": "access", "domain_core": "core"},
+            ],
+        )
+
+    def test_given_no_entries_when_upf_list_then_first_upf_is_listed_without_network_instance(
+        self,
+    ):
+        upfs = upf_list.upf_list([], UPFS)
+
+        self.assertEqual(upfs, [{**UPFS[0], "domain_access": "random", "domain_core": "random"}])
+        self.assertEqual(upf_list.upf_list([], []), [])
+
+    def test_given_entries_when_related_upfs_then_only_related_upfs_are_returned(self):
+        entries = upf_list.parse_entries("upf-far,upf-core.example.com,10.0.0.2")
+
+        self.assertEqual(
+            upf_list.related_upfs(entries, UPFS), ["upf-core.example.com", "10.0.0.2"]
+        )
+        self.assertEqual(upf_list.related_upfs(entries[:1], UPFS), [])
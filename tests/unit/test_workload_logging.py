@@ -0,0 +1,86 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import json
+import subprocess
+import threading
+import unittest
+import urllib.request
+
+from loki_stand_in import LokiStandIn
+
+import workload_logging
+
+
+def _log_lines(levels):
+    return "".join(
+        f"[2022-11-10T10:21:33.123456] [smf] [smf_app] [{level}] message {index}\n"
+        for index, level in enumerate(levels)
+    )
+
+
+def _run_filter(command, logs):
+    return subprocess.run(
+        ["/bin/sh", "-c", command], input=logs, capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+
+
+class TestWorkloadLogging(unittest.TestCase):
+    def test_given_debug_level_without_rate_limit_when_log_filter_then_no_filter_is_returned(
+        self,
+    ):
+        self.assertEqual(workload_logging.log_filter("debug", 0), "")
+
+    def test_given_warning_level_when_log_filter_then_lower_levels_are_dropped(self):
+        command = workload_logging.log_filter("warning", 0)
+
+        lines = _run_filter(command, _log_lines(["debug", "info", "warning", "error"]) + "raw\n")
+
+        self.assertEqual(
+            lines,
+            [
+                "[2022-11-10T10:21:33.123456] [smf] [smf_app] [warning] message 2",
+                "[2022-11-10T10:21:33.123456] [smf] [smf_app] [error] message 3",
+                "raw",
+            ],
+        )
+
+    def test_given_rate_limit_when_log_filter_then_lines_over_the_limit_are_counted(self):
+        command = workload_logging.log_filter("debug", 10)
+
+        lines = _run_filter(command, _log_lines(["info"] * 100))
+
+        dropped = sum(
+            int(line.split()[2]) for line in lines if line.startswith("[log-filter] dropped")
+        )
+        kept = [line for line in lines if not line.startswith("[log-filter]")]
+        self.assertLessEqual(len(kept), 20)
+        self.assertEqual(len(kept) + dropped, 100)
+
+
+class TestLokiStandIn(unittest.TestCase):
+    def setUp(self):
+        self.server = LokiStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_given_push_request_when_posted_then_lines_are_recorded_with_labels(self):
+        payload = {
+            "streams": [
+                {
+                    "stream": {"juju_unit": "oai-5g-smf/0"},
+                    "values": [["1668075693123456000", "message 0"]],
+                }
+            ]
+        }
+        request = urllib.request.Request(
+            self.server.url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.status, 204)
+
+        self.assertEqual(self.server.entries, [({"juju_unit": "oai-5g-smf/0"}, "message 0")])
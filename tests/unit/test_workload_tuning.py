@@ -0,0 +1,86 @@
+# Copyright 2022 Guillaume Belanger
+# See LICENSE file for licensing details.
+
+import unittest
+
+import workload_tuning
+
+
+class TestWorkloadTuning(unittest.TestCase):
+    def test_given_settings_when_parse_settings_then_values_are_returned_by_name(self):
+        settings = workload_tuning.parse_settings(
+            " net.core.rmem_max=8388608,,net.ipv4.tcp_rmem=4096  87380 6291456 "
+        )
+
+        self.assertEqual(
+            settings,
+            {"net.core.rmem_max": "8388608", "net.ipv4.tcp_rmem": "4096 87380 6291456"},
+        )
+
+    def test_given_setting_without_value_when_parse_settings_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            workload_tuning.parse_settings("net.core.rmem_max")
+
+    def test_given_malformed_sysctl_name_when_validate_sysctls_then_value_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, "invalid sysctl name 'net..core'"):
+            workload_tuning.validate_sysctls({"net..core": "1"})
+
+    def test_given_sysctls_when_pod_sysctls_then_only_per_pod_sysctls_are_returned(self):
+        sysctls = workload_tuning.pod_sysctls(
+            {
+                "net.core.rmem_max": "8388608",
+                "net.core.wmem_max": "8388608",
+                "net.ipv4.ip_local_port_range": "1024 65535",
+                "kernel.shm_rmid_forced": "1",
+                "kernel.pid_max": "4194304",
+            }
+        )
+
+        self.assertEqual(
+            sysctls,
+            {"net.ipv4.ip_local_port_range": "1024 65535", "kernel.shm_rmid_forced": "1"},
+        )
+
+    def test_given_unknown_rlimit_when_validate_rlimits_then_value_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, "unknown rlimit 'stack'"):
+            workload_tuning.validate_rlimits({"stack": "8192"})
+
+    def test_given_zero_rlimit_when_validate_rlimits_then_value_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, "nofile must be a positive integer"):
+            workload_tuning.validate_rlimits({"nofile": "0"})
+
+    def test_given_no_rlimits_nor_filter_when_shell_command_then_command_is_unchanged(self):
+        self.assertEqual(workload_tuning.shell_command("/bin/smf -o", {}), "/bin/smf -o")
+
+    def test_given_output_filter_when_shell_command_then_output_is_piped_to_it(self):
+        self.assertEqual(
+            workload_tuning.shell_command("/bin/smf -o", {}, output_filter="cat"),
+            "/bin/sh -c 'exec /bin/smf -o 2>&1 | cat'",
+        )
+
+    def test_given_limits_file_when_parse_limits_then_soft_limits_are_returned(self):
+        limits = workload_tuning.parse_limits(
+            "Limit                     Soft Limit           Hard Limit           Units\n"
+            "Max cpu time              unlimited            unlimited            seconds\n"
+            "Max processes             4096                 8192                 processes\n"
+            "Max open files            1024                 1048576              files\n"
+        )
+
+        self.assertEqual(limits, {"nofile": "1024", "nproc": "4096"})
+
+    def test_given_cpu_list_when_validate_cpu_affinity_then_no_error_is_raised(self):
+        workload_tuning.validate_cpu_affinity("0-3,8,10-11")
+
+    def test_given_malformed_cpu_list_when_validate_cpu_affinity_then_value_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, "expected a CPU list"):
+            workload_tuning.validate_cpu_affinity("0x3")
+
+    def test_given_invalid_name_when_validate_environment_then_value_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, "invalid environment variable name '1A'"):
+            workload_tuning.validate_environment({"1A": "b"})
+
+    def test_given_tcmalloc_when_allocator_library_paths_then_minimal_library_comes_first(self):
+        paths = workload_tuning.allocator_library_paths("tcmalloc")
+
+        self.assertEqual(paths[0], "/usr/lib/x86_64-linux-gnu/libtcmalloc_minimal.so.4")
+        self.assertEqual(paths[-1], "/usr/local/lib/libtcmalloc.so.4")